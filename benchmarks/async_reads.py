@@ -0,0 +1,167 @@
+"""
+Compare sync and async read views served over ASGI at high concurrency.
+
+Starts uvicorn on bookmyevent's ASGI application with both variants of
+EventView.get and BookingListView.get mounted, then holds `--connections`
+keep-alive connections open against each variant in turn. The events mix
+replays cacheable event detail and listing pages; the bookings mix replays
+authenticated booking lists, which always hit the database.
+
+Needs uvicorn (`pip install uvicorn`).
+
+    python -m benchmarks.async_reads --connections 1000 --duration 30
+"""
+import argparse
+import asyncio
+import multiprocessing
+import random
+import re
+import socket
+import sys
+import threading
+import time
+
+from benchmarks import common
+
+urlpatterns = []
+
+_CONTENT_LENGTH = re.compile(rb'content-length:\s*(\d+)', re.IGNORECASE)
+
+
+def mount():
+    from django.urls import path
+    from users.views import AsyncBookingListView, AsyncEventView, BookingListView, EventView
+
+    urlpatterns[:] = [
+        path('sync/events/', EventView.as_view()),
+        path('sync/events/<int:event_id>/', EventView.as_view()),
+        path('sync/my-bookings/', BookingListView.as_view()),
+        path('async/events/', AsyncEventView.as_view()),
+        path('async/events/<int:event_id>/', AsyncEventView.as_view()),
+        path('async/my-bookings/', AsyncBookingListView.as_view()),
+    ]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def client(port, workload, deadline, latencies, statuses):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        while time.monotonic() < deadline:
+            request = random.choice(workload)
+            started = time.perf_counter()
+            writer.write(request)
+            head = await reader.readuntil(b'\r\n\r\n')
+            await reader.readexactly(int(_CONTENT_LENGTH.search(head).group(1)))
+            if time.monotonic() > deadline:
+                # Requests still in flight at the deadline don't count
+                break
+            latencies.append(time.perf_counter() - started)
+            status = int(head.split(b' ', 2)[1])
+            statuses[status] = statuses.get(status, 0) + 1
+    except (ConnectionError, asyncio.IncompleteReadError):
+        statuses['dropped'] = statuses.get('dropped', 0) + 1
+    finally:
+        writer.close()
+
+
+async def load(port, workload, connections, duration):
+    latencies, statuses = [], {}
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(client(port, workload, deadline, latencies, statuses) for _ in range(connections)))
+    return latencies, statuses
+
+
+def run_load(*args):
+    # Runs in its own process so the client doesn't compete with the server for the GIL
+    return asyncio.run(load(*args))
+
+
+def build_workloads(prefix, event_ids, tokens):
+    cities = ['bengaluru', 'chennai', 'delhi', 'mumbai']
+
+    def request(path, token=None):
+        auth = f'Authorization: Bearer {token}\r\n' if token else ''
+        return f'GET /{prefix}/{path} HTTP/1.1\r\nHost: testserver\r\n{auth}\r\n'.encode()
+
+    events = [request(f'events/{event_id}/') for event_id in event_ids]
+    for city in cities:
+        events.append(request(f'events/?location={city}'))
+        events.append(request(f'events/?location={city}&page_size=50'))
+    bookings = [request('my-bookings/', token) for token in tokens]
+    bookings += [request('my-bookings/?expand=event', token) for token in tokens]
+    return {'events': events, 'bookings': bookings}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=50)
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit('This benchmark needs uvicorn: pip install uvicorn')
+
+    common.setup()
+
+    from django.conf import settings
+    from django.core.cache import cache
+    from rest_framework_simplejwt.tokens import AccessToken
+    from users.models import Booking, Event
+    from benchmarks.event_pagination import seed_events
+    from bookmyevent.asgi import application
+
+    settings.ROOT_URLCONF = __name__
+    mount()
+
+    seed_events(common.make_user('bench-manager', role='event_manager'), args.events)
+    event_ids = list(Event.objects.values_list('id', flat=True)[:200])
+    tokens = []
+    for index in range(args.users):
+        user = common.make_user(f'bench-user-{index}')
+        Booking.objects.bulk_create([
+            Booking(user=user, event_id=random.choice(event_ids), number_of_tickets=1, price_per_ticket=500)
+            for _ in range(30)
+        ])
+        tokens.append(str(AccessToken.for_user(user)))
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(
+        application, host='127.0.0.1', port=port, lifespan='off', log_level='warning', backlog=4096,
+    ))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    rows = []
+    clients = multiprocessing.get_context('spawn').Pool(1)
+    for name in ('events', 'bookings'):
+        for prefix in ('sync', 'async'):
+            cache.clear()
+            workload = build_workloads(prefix, event_ids, tokens)[name]
+            latencies, statuses = clients.apply(run_load, (port, workload, args.connections, args.duration))
+            label = f'{name} {prefix}'
+            rows += [
+                (label, '%.0f req/s, p50 %.0f ms, p99 %.0f ms' % (
+                    len(latencies) / args.duration,
+                    common.percentile(latencies, 50) * 1000,
+                    common.percentile(latencies, 99) * 1000,
+                )),
+                (f'{label} responses', ', '.join(f'{status}: {count}' for status, count in sorted(statuses.items(), key=str))),
+            ]
+
+    clients.close()
+    server.should_exit = True
+    common.report(f'Read endpoints over ASGI ({args.connections} connections, {args.duration:g}s each)', rows)
+
+
+if __name__ == '__main__':
+    main()
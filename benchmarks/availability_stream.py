@@ -0,0 +1,191 @@
+"""
+Measure live availability streams: the poll traffic they replace, how
+quickly a change reaches every subscriber, and what an idle subscriber costs.
+
+Starts uvicorn on bookmyevent's ASGI application and opens `--subscribers`
+streams from a separate process, each following one of `--events` events.
+It then sells tickets at `--bookings-per-second` for `--duration` seconds,
+counting the messages the streams deliver against the requests clients
+polling event details would have made, both every `--poll-interval`
+seconds and as often as the streams push (AVAILABILITY_STREAM_INTERVAL),
+which is what matching their freshness takes. It finally books one ticket on every event at once to time the fan-out.
+
+Needs uvicorn (`pip install uvicorn`).
+
+    python -m benchmarks.availability_stream --subscribers 5000 --duration 30
+"""
+import argparse
+import asyncio
+import multiprocessing
+import random
+import sys
+import threading
+import time
+
+from benchmarks import common
+from benchmarks.async_reads import free_port
+
+
+class Subscriber:
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+        self.last = None
+
+
+async def subscribe(port, path, subscriber, connected):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: testserver\r\n\r\n'.encode())
+    await reader.readuntil(b'\r\n\r\n')
+    try:
+        while True:
+            # Chunk framing lands at the start of each read; counting
+            # event lines is enough
+            message = await reader.readuntil(b'\n\n')
+            if b'event: availability' in message:
+                if not connected.done():
+                    connected.set_result(None)
+                    continue
+                subscriber.messages += 1
+                subscriber.bytes += len(message)
+                subscriber.last = time.monotonic()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_clients(port, paths, conn):
+    loop = asyncio.get_running_loop()
+    subscribers = [Subscriber() for _ in paths]
+    tasks = []
+    # Connect in batches so the listen backlog never overflows
+    for start in range(0, len(paths), 500):
+        connected = [loop.create_future() for _ in paths[start:start + 500]]
+        for path, subscriber, future in zip(paths[start:start + 500], subscribers[start:start + 500], connected):
+            tasks.append(asyncio.create_task(subscribe(port, path, subscriber, future)))
+        await asyncio.gather(*connected)
+    conn.send('ready')
+
+    while True:
+        command = await loop.run_in_executor(None, conn.recv)
+        if command == 'reset':
+            for subscriber in subscribers:
+                subscriber.messages = subscriber.bytes = 0
+                subscriber.last = None
+            conn.send('ok')
+        elif command == 'report':
+            conn.send([(subscriber.messages, subscriber.bytes, subscriber.last) for subscriber in subscribers])
+        else:
+            for task in tasks:
+                task.cancel()
+            conn.send('closed')
+            return
+
+
+def run_clients(port, paths, conn):
+    # Runs in its own process so the clients don't compete with the server for the GIL
+    asyncio.run(serve_clients(port, paths, conn))
+
+
+def rss_kb():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--subscribers', type=int, default=5000)
+    parser.add_argument('--events', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--bookings-per-second', type=float, default=50.0)
+    parser.add_argument('--poll-interval', type=float, default=2.0)
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit('This benchmark needs uvicorn: pip install uvicorn')
+
+    common.setup()
+
+    from django.conf import settings
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+    from users.models import Event
+    from users.reservations import reserve_tickets
+    from bookmyevent.asgi import application
+
+    manager = common.make_user('bench-manager', role='event_manager')
+    buyer = common.make_user('bench-buyer')
+    events = [common.make_event(manager, title=f'On sale {index}', available_tickets=10 ** 6) for index in range(args.events)]
+    url = reverse('event-availability')
+    paths = [f'{url}?events={events[index % len(events)].id}' for index in range(args.subscribers)]
+    detail_bytes = len(APIClient().get(reverse('mod-event', args=[events[0].id])).content)
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(
+        application, host='127.0.0.1', port=port, lifespan='off', log_level='warning', backlog=4096,
+    ))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    rss_before = rss_kb()
+    conn, client_conn = multiprocessing.Pipe()
+    clients = multiprocessing.get_context('spawn').Process(target=run_clients, args=(port, paths, client_conn))
+    clients.start()
+    with common.Timer() as connect:
+        conn.recv()
+    rss_after = rss_kb()
+
+    # Sell tickets at a steady rate across the events
+    conn.send('reset')
+    conn.recv()
+    bookings = 0
+    started = time.monotonic()
+    while time.monotonic() - started < args.duration:
+        reserve_tickets(buyer, random.choice(events), 1)
+        bookings += 1
+        time.sleep(max(0.0, started + bookings / args.bookings_per_second - time.monotonic()))
+    time.sleep(settings.AVAILABILITY_STREAM_INTERVAL * 2)
+    conn.send('report')
+    report = conn.recv()
+    messages = sum(count for count, _, _ in report)
+    stream_bytes = sum(size for _, size, _ in report)
+    polls = args.subscribers * args.duration / args.poll_interval
+    fresh_polls = args.subscribers * args.duration / settings.AVAILABILITY_STREAM_INTERVAL
+
+    # One change on every event at once; time until each stream reports it
+    conn.send('reset')
+    conn.recv()
+    changed_at = time.monotonic()
+    for event in Event.objects.filter(id__in=[event.id for event in events]):
+        reserve_tickets(buyer, event, 1)
+    time.sleep(settings.AVAILABILITY_STREAM_INTERVAL * 4 + 1)
+    conn.send('report')
+    delays = [(last - changed_at) * 1000 for _, _, last in conn.recv() if last is not None]
+
+    conn.send('stop')
+    conn.recv()
+    clients.join()
+    server.should_exit = True
+
+    common.report(f'Availability streams ({args.subscribers} subscribers, {args.events} events, {args.bookings_per_second:g} bookings/s for {args.duration:g}s)', [
+        ('connect + snapshot', '%.1f s' % connect.elapsed),
+        ('server memory per subscriber', '~%.1f KB' % ((rss_after - rss_before) / args.subscribers)),
+        ('bookings', bookings),
+        ('stream messages', '%d (%.1f MB)' % (messages, stream_bytes / 2 ** 20)),
+        (f'poll requests every {args.poll_interval:g}s', '%.0f (%.1f MB)' % (polls, polls * detail_bytes / 2 ** 20)),
+        (f'poll requests every {settings.AVAILABILITY_STREAM_INTERVAL:g}s', '%.0f (%.1f MB)' % (fresh_polls, fresh_polls * detail_bytes / 2 ** 20)),
+        ('requests removed at equal freshness', '%.1f%%' % (100 * (1 - messages / fresh_polls))),
+        ('fan-out reached', f'{len(delays)}/{args.subscribers}'),
+        ('fan-out p50', '%.0f ms' % common.percentile(delays, 50)),
+        ('fan-out p99', '%.0f ms' % common.percentile(delays, 99)),
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Compare one book-tickets/batch/ request against the same items booked one by one.
+
+Each checkout books `--items` different events: once as that many
+book-ticket/ requests, once as a single all-or-nothing batch request.
+Reports queries and latency per checkout for each.
+
+    python -m benchmarks.batch_booking --items 50 --checkouts 100
+"""
+import argparse
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=50)
+    parser.add_argument('--checkouts', type=int, default=100)
+    args = parser.parse_args()
+
+    common.setup()
+
+    from django.db import connection
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from users.views import BatchBookTicketView, BookTicketView
+
+    manager = common.make_user('bench-manager', role='event_manager')
+    user = common.make_user('bench-corporate')
+    events = [common.make_event(manager, available_tickets=10 ** 6) for _ in range(args.items)]
+    factory = APIRequestFactory()
+    single, batch = BookTicketView.as_view(), BatchBookTicketView.as_view()
+
+    def one_by_one():
+        for event in events:
+            request = factory.post('/users/book-ticket/', {'event_id': event.id, 'number_of_tickets': 2}, format='json')
+            force_authenticate(request, user=user)
+            assert single(request).status_code == 201
+
+    def batched():
+        items = [{'event_id': event.id, 'number_of_tickets': 2} for event in events]
+        request = factory.post('/users/book-tickets/batch/', {'items': items}, format='json')
+        force_authenticate(request, user=user)
+        assert batch(request).status_code == 201
+
+    executed = []
+
+    def count(execute, sql, params, many, context):
+        executed.append(sql)
+        return execute(sql, params, many, context)
+
+    results = {}
+    for name, checkout in (('individual calls', one_by_one), ('batch request', batched)):
+        latencies = []
+        executed.clear()
+        with connection.execute_wrapper(count):
+            for _ in range(args.checkouts):
+                with common.Timer() as timer:
+                    checkout()
+                latencies.append(timer.elapsed * 1000)
+        results[name] = (len(executed) / args.checkouts, latencies)
+
+    rows = []
+    for name, (queries, latencies) in results.items():
+        rows += [
+            (f'{name} queries', '%.1f per checkout' % queries),
+            (f'{name} p50', '%.1f ms' % common.percentile(latencies, 50)),
+            (f'{name} p99', '%.1f ms' % common.percentile(latencies, 99)),
+        ]
+    single_ms = common.percentile(results['individual calls'][1], 50)
+    batch_ms = common.percentile(results['batch request'][1], 50)
+    rows.append(('speedup at p50', '%.1fx' % (single_ms / batch_ms)))
+    common.report(f'Batch booking ({args.items} items per checkout, {args.checkouts} checkouts)', rows)
+
+
+if __name__ == '__main__':
+    main()
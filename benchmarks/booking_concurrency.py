@@ -0,0 +1,99 @@
+"""
+Fire thousands of parallel bookings at a single event through BookTicketView.
+
+Reports throughput, p50/p99 latency and the oversell count, which must be 0.
+Pass --legacy to run the old read-modify-write booking logic for comparison.
+
+    python -m benchmarks.booking_concurrency --requests 2000 --threads 32
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import common
+
+
+def legacy_book(request):
+    """The pre-reservation-engine BookTicketView logic, kept for comparison."""
+    from rest_framework import status
+    from rest_framework.response import Response
+    from users.models import Event, Booking
+
+    number_of_tickets = int(request.data.get('number_of_tickets'))
+    event = Event.objects.get(id=request.data.get('event_id'))
+    if number_of_tickets > event.available_tickets:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+    Booking.objects.create(user=request.user, event=event, number_of_tickets=number_of_tickets,
+                           price_per_ticket=event.price, payment_amount=event.price * number_of_tickets)
+    event.available_tickets -= number_of_tickets
+    event.save()
+    return Response(status=status.HTTP_201_CREATED)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--tickets', type=int, default=500, help='initial event inventory')
+    parser.add_argument('--per-booking', type=int, default=1)
+    parser.add_argument('--legacy', action='store_true')
+    args = parser.parse_args()
+
+    common.setup()
+
+    from django.db import connection
+    from django.db.models import Sum
+    from rest_framework.decorators import api_view, permission_classes
+    from rest_framework.permissions import IsAuthenticated
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from users.models import Event, Booking
+    from users.views import BookTicketView
+
+    user = common.make_user('bench')
+    manager = common.make_user('bench-manager', role='event_manager')
+    event = common.make_event(manager, available_tickets=args.tickets)
+
+    if args.legacy:
+        view = api_view(['POST'])(permission_classes([IsAuthenticated])(legacy_book))
+    else:
+        view = BookTicketView.as_view()
+    factory = APIRequestFactory()
+    payload = {'event_id': event.id, 'number_of_tickets': args.per_booking}
+
+    def book(_):
+        request = factory.post('/users/book-ticket/', payload, format='json')
+        force_authenticate(request, user=user)
+        with common.Timer() as timer:
+            try:
+                status_code = view(request).status_code
+            except Exception:
+                status_code = 500
+        connection.close()
+        return status_code, timer.elapsed
+
+    with common.Timer() as total:
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            results = list(pool.map(book, range(args.requests)))
+
+    latencies = [elapsed for _, elapsed in results]
+    event.refresh_from_db()
+    booked = Booking.objects.filter(event=event).aggregate(total=Sum('number_of_tickets'))['total'] or 0
+    # Tickets handed out that were never taken from inventory (lost updates / overselling)
+    oversell = max(0, booked + event.available_tickets - args.tickets)
+
+    common.report('Booking concurrency (%s)' % ('legacy' if args.legacy else 'reservation engine'), [
+        ('requests', args.requests),
+        ('threads', args.threads),
+        ('created', sum(1 for code, _ in results if code == 201)),
+        ('sold out', sum(1 for code, _ in results if code == 400)),
+        ('errors', sum(1 for code, _ in results if code >= 500)),
+        ('throughput', '%.0f req/s' % (args.requests / total.elapsed)),
+        ('p50 latency', '%.2f ms' % (common.percentile(latencies, 50) * 1000)),
+        ('p99 latency', '%.2f ms' % (common.percentile(latencies, 99) * 1000)),
+        ('tickets booked', booked),
+        ('tickets left', event.available_tickets),
+        ('oversell', oversell),
+    ])
+
+
+if __name__ == '__main__':
+    main()
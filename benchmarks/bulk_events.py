@@ -0,0 +1,122 @@
+"""
+Benchmark bulk event import and export on a large file.
+
+Writes a `--rows` row CSV or JSON Lines file, imports it through
+bulk.import_events (as `manage.py import_events` does), stopping once
+halfway to time the resume, then exports every event back out. Peak memory
+is reported to show it stays flat however large the file is.
+
+    python -m benchmarks.bulk_events --rows 1000000 --format csv
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import tempfile
+
+from benchmarks import common
+
+
+class Interrupted(Exception):
+    pass
+
+
+def write_file(path, format, rows, rng):
+    cities = ['bengaluru', 'hyderabad', 'chennai', 'delhi', 'mumbai', 'pune', 'kolkata', 'jaipur']
+    categories = ['music', 'sports', 'theatre', 'dance']
+    fields = ['title', 'description', 'price', 'category', 'date', 'time', 'location', 'payment_options', 'available_tickets']
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=fields) if format == 'csv' else None
+        if writer:
+            writer.writeheader()
+        for index in range(rows):
+            row = {
+                'title': f'Imported event {index}',
+                'description': 'An imported event, with "quotes", commas and\na second line.',
+                'price': f'{rng.randrange(100, 5000)}.00',
+                'category': rng.choice(categories),
+                'date': f'2025-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}',
+                'time': f'{rng.randrange(10, 23):02d}:00:00',
+                'location': rng.choice(cities),
+                'payment_options': 'card, upi',
+                'available_tickets': rng.randrange(50, 5000),
+            }
+            if writer:
+                writer.writerow(row)
+            else:
+                file.write(json.dumps(row) + '\n')
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    common.setup()
+
+    from users import bulk
+    from users.models import Event, ImportCheckpoint
+
+    manager = common.make_user('bench-manager', role='event_manager')
+    directory = tempfile.mkdtemp(prefix='bookmyevent-bulk-')
+    source = os.path.join(directory, f'events.{args.format}')
+    with common.Timer() as writing:
+        write_file(source, args.format, args.rows, random.Random(42))
+    print(f'Wrote {args.rows} rows ({os.path.getsize(source) / 2 ** 20:.0f} MB) in {writing.elapsed:.1f} s')
+    rss_start = peak_rss_mb()
+
+    def stop_halfway(rows, imported, rejected):
+        if rows >= args.rows // 2:
+            raise Interrupted()
+
+    checkpoint = 'benchmark'
+    with open(source, newline='') as file, common.Timer() as first_half:
+        try:
+            bulk.import_events(file, args.format, manager, checkpoint=checkpoint, batch_size=args.batch_size, progress=stop_halfway)
+        except Interrupted:
+            pass
+    done = ImportCheckpoint.objects.get(name=checkpoint).rows_done
+
+    with open(source, newline='') as file, common.Timer() as second_half:
+        imported, rejected = bulk.import_events(file, args.format, manager, checkpoint=checkpoint, resume=True, batch_size=args.batch_size)
+    rss_import = peak_rss_mb()
+    total = Event.objects.count()
+
+    exports = []
+    for format in ('csv', 'jsonl'):
+        target = os.path.join(directory, f'export.{format}')
+        with open(target, 'w', newline='') as file, common.Timer() as timer:
+            exported = bulk.export_events(file, format)
+        exports.append((format, exported, timer.elapsed, os.path.getsize(target)))
+        os.remove(target)
+    rss_export = peak_rss_mb()
+    os.remove(source)
+    os.rmdir(directory)
+
+    rows = [
+        ('events in table', f'{total} (expected {args.rows})'),
+        ('first run', '%d rows in %.1f s (%.0f rows/s), then interrupted' % (done, first_half.elapsed, done / first_half.elapsed)),
+        ('resumed run', '%d rows in %.1f s (%.0f rows/s), %d rejected' % (
+            imported, second_half.elapsed, imported / second_half.elapsed, rejected)),
+        ('import overall', '%.0f rows/s' % (args.rows / (first_half.elapsed + second_half.elapsed))),
+    ]
+    rows += [
+        (f'export {format}', '%d rows in %.1f s (%.0f rows/s, %.0f MB)' % (count, elapsed, count / elapsed, size / 2 ** 20))
+        for format, count, elapsed, size in exports
+    ]
+    rows += [
+        ('peak memory', '%.0f MB before, %.0f MB after import, %.0f MB after export' % (rss_start, rss_import, rss_export)),
+    ]
+    common.report(f'Bulk events ({args.rows} {args.format} rows, batches of {args.batch_size})', rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Every benchmark runs against a throwaway database so it never touches
+db.sqlite3: a temporary SQLite file, or with DB_ENGINE=postgresql a fresh
+test database on the configured server. Run them from the repository
+root, e.g.
+
+    python -m benchmarks.booking_concurrency
+"""
+import atexit
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import django
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def remove_sqlite(path):
+    # In WAL mode the log and shared memory files sit alongside the database
+    for name in (path, f'{path}-wal', f'{path}-shm'):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def setup(db_timeout=30):
+    """Configure Django against a fresh, migrated temporary database."""
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bookmyevent.settings')
+
+    from django.conf import settings
+
+    # Requests built with APIRequestFactory come from 'testserver', as under the test runner
+    settings.ALLOWED_HOSTS = ['testserver']
+    # A handful of users drive each benchmark, far past what rate limits let a client do
+    settings.THROTTLE_RATES = {}
+    database = settings.DATABASES['default']
+    if database['ENGINE'] == 'django.db.backends.postgresql':
+        django.setup()
+        from django.db import connection
+        name = database['NAME']
+        atexit.register(lambda: connection.creation.destroy_test_db(name, verbosity=0))
+        return connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+    db_file = tempfile.NamedTemporaryFile(prefix='bookmyevent-bench-', suffix='.sqlite3', delete=False)
+    db_file.close()
+    atexit.register(remove_sqlite, db_file.name)
+    database['NAME'] = db_file.name
+    database.setdefault('OPTIONS', {})['timeout'] = db_timeout
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return db_file.name
+
+
+def make_user(username, role='user'):
+    from users.models import User
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com', password='benchpassword', role=role
+    )
+
+
+def make_event(created_by, available_tickets=100, **fields):
+    from users.models import Event
+    values = {
+        'title': 'Benchmark Concert',
+        'description': 'A benchmark event.',
+        'date': '2024-12-15',
+        'time': '18:00:00',
+        'location': 'bengaluru',
+        'category': 'music',
+        'payment_options': 'card',
+        'price': 500,
+    }
+    values.update(fields)
+    return Event.objects.create(created_by=created_by, available_tickets=available_tickets, **values)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of `samples` (any iterable of numbers)."""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+class Timer:
+    """Context manager recording wall-clock seconds in `elapsed`."""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+
+
+def report(title, rows):
+    """Print `rows` (a list of (label, value) pairs) under `title`."""
+    print(f'\n{title}')
+    print('-' * len(title))
+    width = max(len(label) for label, _ in rows)
+    for label, value in rows:
+        print(f'{label.ljust(width)}  {value}')
@@ -0,0 +1,101 @@
+"""
+Booking write throughput on the configured database, stock against tuned.
+
+Concurrent clients book and pay through BookTicketView and MakePaymentView,
+with connections opened and closed around each request as Django's request
+handling does. The backend is chosen with DB_ENGINE as in settings:
+
+- sqlite: Django's defaults (rollback journal, deferred transactions, 5 s
+  timeout, a connection per request) against the settings profile (WAL,
+  IMMEDIATE transactions, pragmas, persistent connections).
+- postgresql: a connection per request (CONN_MAX_AGE=0) against
+  persistent connections (the settings profile).
+
+    python -m benchmarks.database_backends --threads 16 --requests 2000
+    DB_ENGINE=postgresql DB_NAME=bookmyevent python -m benchmarks.database_backends
+"""
+import argparse
+import copy
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--events', type=int, default=20)
+    args = parser.parse_args()
+
+    common.setup()
+
+    from django.db import close_old_connections, connection, connections
+    from django.db.models import Sum
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from users.models import Booking, Event
+    from users.views import BookTicketView, MakePaymentView
+
+    # New connections in every thread read this dict, so swapping its contents switches profile
+    database = connections.settings['default']
+    tuned = copy.deepcopy(database)
+    if connection.vendor == 'sqlite':
+        stock = {**tuned, 'CONN_MAX_AGE': 0, 'OPTIONS': {'timeout': 5, 'pragmas': {'journal_mode': 'DELETE'}}}
+    else:
+        stock = {**tuned, 'CONN_MAX_AGE': 0}
+    profiles = [('stock', stock), ('tuned', tuned)]
+
+    manager = common.make_user('bench-manager', role='event_manager')
+    users = [common.make_user(f'bench-user-{index}') for index in range(args.threads)]
+    factory = APIRequestFactory()
+    book, pay = BookTicketView.as_view(), MakePaymentView.as_view()
+
+    def request(view, user, path, payload):
+        # Django opens and closes connections around each request the same way
+        close_old_connections()
+        http_request = factory.post(path, payload, format='json')
+        force_authenticate(http_request, user=user)
+        try:
+            response = view(http_request)
+        except Exception:
+            return 500, None
+        finally:
+            close_old_connections()
+        return response.status_code, response.data
+
+    def checkout(index):
+        user, rng = users[index % args.threads], random.Random(index)
+        with common.Timer() as timer:
+            status_code, data = request(book, user, '/users/book-ticket/', {'event_id': rng.choice(events).id, 'number_of_tickets': 1})
+            if status_code == 201:
+                status_code, _ = request(pay, user, '/users/make-payment/', {'booking_id': data['booking_id'], 'payment_method': 'card'})
+        return status_code, timer.elapsed
+
+    rows = []
+    for name, profile in profiles:
+        connection.close()
+        database.clear()
+        database.update(profile)
+        events = [common.make_event(manager, available_tickets=10 ** 6) for _ in range(args.events)]
+        connection.close()
+
+        with common.Timer() as total, ThreadPoolExecutor(max_workers=args.threads) as pool:
+            results = list(pool.map(checkout, range(args.requests)))
+
+        latencies = [elapsed * 1000 for status_code, elapsed in results if status_code < 500]
+        booked = Booking.objects.filter(event__in=events).aggregate(total=Sum('number_of_tickets'))['total'] or 0
+        left = sum(Event.objects.filter(id__in=[event.id for event in events]).values_list('available_tickets', flat=True))
+        rows += [
+            (f'{name} checkouts/s', '%.0f (book + pay)' % (sum(1 for status_code, _ in results if status_code < 500) / total.elapsed)),
+            (f'{name} p50', '%.1f ms' % common.percentile(latencies, 50) if latencies else '-'),
+            (f'{name} p99', '%.1f ms' % common.percentile(latencies, 99) if latencies else '-'),
+            (f'{name} errors', '%d of %d' % (sum(1 for status_code, _ in results if status_code >= 500), args.requests)),
+            (f'{name} oversell', booked + left - 10 ** 6 * args.events),
+        ]
+
+    common.report(f'Booking writes on {connection.vendor} ({args.threads} threads, {args.requests} checkouts)', rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Compare EventView.get requests per second with the read-through cache on and off.
+
+Replays a browse mix of detail pages and filtered listing pages; the cache
+is switched off by swapping in Django's DummyCache.
+
+    python -m benchmarks.event_cache --events 2000 --requests 5000
+"""
+import argparse
+import random
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--hot', type=int, default=200, help='number of distinct events browsed')
+    args = parser.parse_args()
+
+    common.setup()
+
+    from django.test import override_settings
+    from rest_framework.test import APIRequestFactory
+    from users import caching
+    from users.models import Event
+    from users.views import EventView
+    from benchmarks.event_pagination import seed_events
+
+    seed_events(common.make_user('bench-manager', role='event_manager'), args.events)
+    event_ids = list(Event.objects.values_list('id', flat=True)[:args.hot])
+    cities = [code for code, _ in Event.CITY_CHOICES]
+    categories = [code for code, _ in Event.CATEGORY_CHOICES]
+
+    rng = random.Random(42)
+    workload = []
+    for _ in range(args.requests):
+        if rng.random() < 0.5:
+            workload.append((rng.choice(event_ids), {}))
+        else:
+            workload.append((None, {'location': rng.choice(cities), 'category': rng.choice(categories)}))
+
+    view = EventView.as_view()
+    factory = APIRequestFactory()
+
+    def replay():
+        with common.Timer() as timer:
+            for event_id, params in workload:
+                url = f'/users/events/{event_id}/' if event_id else '/users/events/'
+                view(factory.get(url, params), event_id=event_id)
+        return args.requests / timer.elapsed
+
+    with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+        uncached = replay()
+
+    before = caching.stats()
+    cached = replay()
+    after = caching.stats()
+
+    common.report(f'EventView.get throughput ({args.requests} requests)', [
+        ('uncached', '%.0f req/s' % uncached),
+        ('cached', '%.0f req/s' % cached),
+        ('speedup', '%.1fx' % (cached / uncached)),
+        ('cache hits', after['hits'] - before['hits']),
+        ('cache misses', after['misses'] - before['misses']),
+    ])
+
+
+if __name__ == '__main__':
+    main()
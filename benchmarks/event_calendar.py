@@ -0,0 +1,98 @@
+"""
+The calendar index against counting events, and date ranges against days.
+
+Seeds `--events` events over two years, counts them into the calendar
+index, and times a month's per-day counts, for every city and for one:
+read from the index through events/calendar/, by the index query alone,
+and counted from the Event table. Then times one week of a city's events
+listed with date_from and date_to against the seven date= requests it
+took before, and what keeping the counts adds to creating an event. Every
+request misses the cache.
+
+    python -m benchmarks.event_calendar --events 200000
+"""
+import argparse
+import datetime
+
+from benchmarks import common
+from benchmarks.event_pagination import seed_events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    common.setup()
+
+    from unittest import mock
+
+    from django.core.cache import cache
+    from django.db import connection
+    from django.db.models import Count
+    from rest_framework.test import APIRequestFactory
+    from users import calendar_index
+    from users.models import Event
+    from users.views import EventCalendarView, EventView
+
+    manager = common.make_user('bench-manager', role='event_manager')
+    seed_events(manager, args.events)
+    with common.Timer() as rebuild:
+        rows = calendar_index.rebuild()
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+    factory = APIRequestFactory()
+    calendar_view, event_view = EventCalendarView.as_view(), EventView.as_view()
+    month = {'date_from': '2024-06-01', 'date_to': '2024-06-30'}
+
+    def best(call):
+        """Best seconds per call over the rounds, each with an empty cache."""
+        times = []
+        for _ in range(args.rounds):
+            cache.clear()
+            with common.Timer() as timer:
+                call()
+            times.append(timer.elapsed)
+        return min(times)
+
+    def counted(**filters):
+        events = Event.objects.filter(date__gte=month['date_from'], date__lte=month['date_to'], **filters)
+        return list(events.values('date', 'location', 'category').annotate(events=Count('id')).order_by('date', 'location', 'category'))
+
+    def week(location):
+        start = datetime.date(2024, 6, 3)
+        days = [(start + datetime.timedelta(days=offset)).isoformat() for offset in range(7)]
+        ranged = lambda: event_view(factory.get('/users/events/', {'location': location, 'date_from': days[0], 'date_to': days[-1], 'page_size': 100}))
+        daily = lambda: [event_view(factory.get('/users/events/', {'location': location, 'date': day, 'page_size': 100})) for day in days]
+        return best(ranged), best(daily)
+
+    results = [
+        ('month, all cities, calendar/', best(lambda: calendar_view(factory.get('/users/events/calendar/', month)))),
+        ('month, all cities, index query', best(lambda: list(calendar_index.histogram(month['date_from'], month['date_to'])))),
+        ('month, all cities, counted', best(counted)),
+        ('month, one city, calendar/', best(lambda: calendar_view(factory.get('/users/events/calendar/', {**month, 'location': 'mumbai'})))),
+        ('month, one city, counted', best(lambda: counted(location='mumbai'))),
+    ]
+    ranged, daily = week('mumbai')
+
+    def create():
+        common.make_event(manager, date='2024-06-05', location='mumbai')
+
+    with_counts = best(create)
+    with mock.patch.object(calendar_index, 'event_saved'):
+        without_counts = best(create)
+
+    rows_out = [('calendar index', '%d rows, rebuilt in %.2f s' % (rows, rebuild.elapsed))]
+    rows_out += [(label, '%.2f ms' % (elapsed * 1000)) for label, elapsed in results]
+    rows_out += [
+        ('a week in one city, date range', '%.2f ms in 1 request' % (ranged * 1000)),
+        ('a week in one city, date=', '%.2f ms in 7 requests' % (daily * 1000)),
+        ('creating an event', '%.2f ms, %.2f ms without the counts' % (with_counts * 1000, without_counts * 1000)),
+    ]
+    common.report(f'Event calendar ({args.events} events, best of {args.rounds})', rows_out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Time EventView.delete on events with large booking fan-out.
+
+Each event gets `size` bookings, half of them paid. The bulk path should
+take roughly the same time and the same number of queries at every size;
+--legacy adds the old per-booking save() loop for comparison.
+
+    python -m benchmarks.event_cancellation --sizes 1000 10000 50000
+"""
+import argparse
+
+from benchmarks import common
+
+
+def legacy_delete(event):
+    from users.models import Booking
+
+    for booking in Booking.objects.filter(event=event):
+        if booking.is_paid:
+            booking.is_paid = False
+            booking.is_confirmed = False
+            booking.payment_method = None
+            booking.save()
+        booking.is_cancelled = True
+        booking.save()
+    event.delete()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--legacy', action='store_true')
+    args = parser.parse_args()
+
+    common.setup()
+
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from users.models import Booking
+    from users.payments import process_pending_refunds
+    from users.views import EventView
+
+    user = common.make_user('bench')
+    manager = common.make_user('bench-manager', role='event_manager')
+    view = EventView.as_view()
+    factory = APIRequestFactory()
+
+    def seed(size):
+        event = common.make_event(manager, available_tickets=size)
+        Booking.objects.bulk_create(
+            [Booking(user=user, event=event, number_of_tickets=1, price_per_ticket=500, payment_amount=500,
+                     is_paid=bool(index % 2), payment_method='card' if index % 2 else None)
+             for index in range(size)],
+            batch_size=5000,
+        )
+        return event
+
+    rows = []
+    for size in args.sizes:
+        event = seed(size)
+        request = factory.delete(f'/users/events/{event.id}/')
+        force_authenticate(request, user=manager)
+        with CaptureQueriesContext(connection) as queries, common.Timer() as timer:
+            view(request, event_id=event.id)
+        with common.Timer() as refunds:
+            refunded = process_pending_refunds()
+        rows.append((f'{size} bookings', 'delete %8.1f ms   %d queries   %d refunds issued async in %.1f ms' % (
+            timer.elapsed * 1000, len(queries), refunded, refunds.elapsed * 1000,
+        )))
+
+        if args.legacy:
+            event = seed(size)
+            with CaptureQueriesContext(connection) as queries, common.Timer() as timer:
+                legacy_delete(event)
+            rows.append((f'{size} bookings (legacy)', 'delete %8.1f ms   %d queries' % (timer.elapsed * 1000, len(queries))))
+
+    common.report('EventView.delete with booking fan-out', rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Show that keyset-paginated EventView.get latency stays flat from page 1 to page 10,000.
+
+Seeds `pages * page_size` events, then times requests that land directly on
+each sampled page. OFFSET pagination is timed alongside for contrast.
+
+    python -m benchmarks.event_pagination --pages 10000 --page-size 20
+"""
+import argparse
+import datetime
+import random
+import statistics
+
+from benchmarks import common
+
+
+def seed_events(manager, count, batch_size=5000):
+    from users.models import Event
+
+    cities = [code for code, _ in Event.CITY_CHOICES]
+    categories = [code for code, _ in Event.CATEGORY_CHOICES]
+    start = datetime.date(2024, 1, 1)
+    batch = []
+    for index in range(count):
+        batch.append(Event(
+            title=f'Event {index}', description='A benchmark event.',
+            date=start + datetime.timedelta(days=random.randrange(730)),
+            time=datetime.time(random.choice([10, 14, 18, 20])),
+            location=random.choice(cities), category=random.choice(categories),
+            payment_options='card', available_tickets=100, price=500, created_by=manager,
+        ))
+        if len(batch) == batch_size:
+            Event.objects.bulk_create(batch)
+            batch = []
+    Event.objects.bulk_create(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, default=10000)
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    common.setup()
+
+    from django.db import connection
+    from rest_framework.test import APIRequestFactory
+    from users.models import Event
+    from users.pagination import KeysetPagination
+    from users.views import EventView
+
+    seed_events(common.make_user('bench-manager', role='event_manager'), args.pages * args.page_size)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+    view = EventView.as_view()
+    factory = APIRequestFactory()
+    paginator = KeysetPagination()
+    paginator.fields = [(name, False, Event._meta.get_field(name)) for name in paginator.ordering]
+    ordered = Event.objects.order_by(*paginator.ordering)
+
+    rows = []
+    sampled = sorted({1, 10, 100, 1000, args.pages // 2, args.pages} & set(range(1, args.pages + 1)))
+    for page in sampled:
+        params = {'page_size': args.page_size}
+        if page > 1:
+            # Cursor of the last row on the previous page, as the API would have handed out
+            params['cursor'] = paginator.encode_cursor(ordered[(page - 1) * args.page_size - 1])
+
+        keyset, offset = [], []
+        for _ in range(args.repeat):
+            with common.Timer() as timer:
+                response = view(factory.get('/users/events/', params))
+            keyset.append(timer.elapsed)
+            assert len(response.data['results']) == args.page_size
+
+            with common.Timer() as timer:
+                list(ordered.values()[(page - 1) * args.page_size:page * args.page_size])
+            offset.append(timer.elapsed)
+
+        rows.append((f'page {page}', 'keyset %6.2f ms   offset query %7.2f ms' % (
+            statistics.median(keyset) * 1000, statistics.median(offset) * 1000,
+        )))
+
+    common.report(f'Event listing latency ({args.pages * args.page_size} events, median of {args.repeat})', rows)
+
+
+if __name__ == '__main__':
+    main()
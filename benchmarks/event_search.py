@@ -0,0 +1,111 @@
+"""
+Measure event search latency against the in-process index.
+
+Seeds events whose titles and descriptions are drawn from a Zipf-like
+vocabulary, builds the index, then times one- and two-term queries, some
+ending in a prefix, both against the index alone and through
+events/search/.
+
+    python -m benchmarks.event_search --events 1000000 --queries 2000
+"""
+import argparse
+import datetime
+import itertools
+import random
+import resource
+
+from benchmarks import common
+
+SYLLABLES = ['ka', 'ro', 'mi', 'ten', 'sa', 'lu', 'ver', 'dan', 'pho', 'ri', 'gal', 'zu', 'me', 'nor', 'the', 'qui']
+
+
+def vocabulary(size, rng):
+    words = sorted({''.join(combo) for combo in itertools.product(SYLLABLES, repeat=3)})
+    rng.shuffle(words)
+    return words[:size]
+
+
+def seed(manager, count, words, rng, batch_size=5000):
+    from users.models import Event
+
+    # Low ranks are drawn far more often, as in real text
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    start = datetime.date(2024, 1, 1)
+    batch = []
+    for _ in range(count):
+        batch.append(Event(
+            title=' '.join(rng.choices(words, cum_weights=weights, k=3)).title(),
+            description=' '.join(rng.choices(words, cum_weights=weights, k=8)) + '.',
+            date=start + datetime.timedelta(days=rng.randrange(730)), time=datetime.time(18),
+            location='bengaluru', category='music', payment_options='card',
+            available_tickets=100, price=500, created_by=manager,
+        ))
+        if len(batch) == batch_size:
+            Event.objects.bulk_create(batch)
+            batch = []
+    Event.objects.bulk_create(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--vocabulary', type=int, default=4000)
+    args = parser.parse_args()
+
+    common.setup()
+
+    from rest_framework.test import APIRequestFactory
+    from users import search
+    from users.models import Event
+    from users.views import EventSearchView
+
+    rng = random.Random(42)
+    words = vocabulary(args.vocabulary, rng)
+    seed(common.make_user('bench-manager', role='event_manager'), args.events, words, rng)
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with common.Timer() as build:
+        search.index.build()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Queries are built from real titles so most of them match something
+    titles = list(Event.objects.order_by('?').values_list('title', flat=True)[:args.queries])
+    queries = []
+    for title in titles:
+        terms = title.lower().split()
+        query = rng.sample(terms, rng.choice([1, 2]))
+        if rng.random() < 0.5:
+            query[-1] = query[-1][:rng.randrange(3, 6)]
+        queries.append(' '.join(query))
+
+    index_ms = []
+    for query in queries:
+        with common.Timer() as timer:
+            search.index.search(query)
+        index_ms.append(timer.elapsed * 1000)
+
+    view = EventSearchView.as_view()
+    factory = APIRequestFactory()
+    endpoint_ms = []
+    for query in queries:
+        with common.Timer() as timer:
+            view(factory.get('/api/events/search/', {'q': query}))
+        endpoint_ms.append(timer.elapsed * 1000)
+
+    common.report(f'Event search over {args.events} events ({args.queries} queries)', [
+        ('index build', '%.1f s' % build.elapsed),
+        ('index memory', '~%.0f MB' % ((rss_after - rss_before) / 1024)),
+        ('terms', len(search.index.terms)),
+        ('index p50', '%.2f ms' % common.percentile(index_ms, 50)),
+        ('index p95', '%.2f ms' % common.percentile(index_ms, 95)),
+        ('index p99', '%.2f ms' % common.percentile(index_ms, 99)),
+        ('index max', '%.2f ms' % max(index_ms)),
+        ('endpoint p50', '%.2f ms' % common.percentile(endpoint_ms, 50)),
+        ('endpoint p95', '%.2f ms' % common.percentile(endpoint_ms, 95)),
+        ('endpoint p99', '%.2f ms' % common.percentile(endpoint_ms, 99)),
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Micro-benchmark the fast list serializers against the DRF ModelSerializers.
+
+For each size the rows are fetched once; timings cover serialization plus
+JSON rendering, which is the CPU cost the fast path removes.
+
+    python -m benchmarks.fast_serializers --sizes 100 10000 100000
+"""
+import argparse
+
+from benchmarks import common
+
+
+def best_of(repeat, func):
+    samples = []
+    for _ in range(repeat):
+        with common.Timer() as timer:
+            func()
+        samples.append(timer.elapsed)
+    return min(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    common.setup()
+
+    from rest_framework.renderers import JSONRenderer
+    from users.models import Event, Booking
+    from users.serializers import EventSerializer, BookingSerializer, FastEventSerializer, FastBookingSerializer
+    from benchmarks.event_pagination import seed_events
+
+    user = common.make_user('bench')
+    seed_events(common.make_user('bench-manager', role='event_manager'), max(args.sizes))
+    event_ids = list(Event.objects.values_list('id', flat=True))
+    Booking.objects.bulk_create(
+        [Booking(user=user, event_id=event_id, number_of_tickets=2, price_per_ticket=500, payment_amount=1000)
+         for event_id in event_ids],
+        batch_size=5000,
+    )
+
+    renderer = JSONRenderer()
+    rows = []
+    for size in args.sizes:
+        for label, queryset, slow, fast in (
+            ('events', Event.objects.with_inventory().order_by('id'), EventSerializer, FastEventSerializer),
+            ('bookings', Booking.objects.order_by('id'), BookingSerializer, FastBookingSerializer),
+        ):
+            instances = list(queryset[:size])
+            values = list(fast.values(queryset)[:size])
+            assert renderer.render(slow(instances, many=True).data) == renderer.render(fast(values).data)
+
+            slow_best = best_of(args.repeat, lambda: renderer.render(slow(instances, many=True).data))
+            fast_best = best_of(args.repeat, lambda: renderer.render(fast(values).data))
+            rows.append((f'{label} x {size}', 'ModelSerializer %9.2f ms   fast %8.2f ms   speedup %5.1fx' % (
+                slow_best * 1000, fast_best * 1000, slow_best / fast_best,
+            )))
+
+    common.report(f'List serialization + JSON rendering (best of {args.repeat})', rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark the hold expiry sweeper releasing a large backlog of expired holds.
+
+Seeds `--holds` unpaid bookings spread over `--events` events, backdates
+them past BOOKING_HOLD_TTL and runs release_expired_holds. Reports overall
+throughput and the longest single batch transaction, which bounds how long
+the sweep holds locks at any one time.
+
+    python -m benchmarks.hold_expiry --holds 1000000 --batch-size 5000
+"""
+import argparse
+import contextlib
+from datetime import timedelta
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--holds', type=int, default=1000000)
+    parser.add_argument('--events', type=int, default=100)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    common.setup()
+
+    from unittest import mock
+
+    from django.conf import settings
+    from django.db import transaction
+    from django.db.models import Sum
+    from django.utils import timezone
+    from users import reservations
+    from users.models import Booking, Event
+
+    user = common.make_user('bench')
+    manager = common.make_user('bench-manager', role='event_manager')
+    events = [common.make_event(manager, available_tickets=0) for _ in range(args.events)]
+
+    with common.Timer() as seeding:
+        for start in range(0, args.holds, 20000):
+            Booking.objects.bulk_create([
+                Booking(user=user, event=events[index % args.events], number_of_tickets=1,
+                        price_per_ticket=500, payment_amount=500)
+                for index in range(start, min(start + 20000, args.holds))
+            ])
+        Booking.objects.update(created_at=timezone.now() - timedelta(seconds=settings.BOOKING_HOLD_TTL + 60))
+    print(f'Seeded {args.holds} expired holds in {seeding.elapsed:.1f} s')
+
+    batches = []
+    atomic = transaction.atomic
+
+    @contextlib.contextmanager
+    def timed_atomic(*a, **kw):
+        with common.Timer() as timer, atomic(*a, **kw):
+            yield
+        batches.append(timer.elapsed)
+
+    # Only release_expired_holds' own per-batch transactions are timed, not
+    # the nested ones bulk_create and the sales totals open inside them
+    with mock.patch.object(reservations, 'transaction', mock.Mock(atomic=timed_atomic)):
+        with common.Timer() as sweep:
+            released = reservations.release_expired_holds(batch_size=args.batch_size)
+    # The last transaction finds nothing left to release
+    batches.pop()
+
+    restored = Event.objects.aggregate(total=Sum('available_tickets'))['total']
+    common.report(f'Hold expiry sweep ({args.holds} holds, batches of {args.batch_size})', [
+        ('released', released),
+        ('tickets restored', restored),
+        ('total time', '%.1f s' % sweep.elapsed),
+        ('throughput', '%.0f holds/s' % (released / sweep.elapsed)),
+        ('batches', len(batches)),
+        ('p50 batch transaction', '%.1f ms' % (common.percentile(batches, 50) * 1000)),
+        ('longest batch transaction', '%.1f ms' % (max(batches) * 1000)),
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Measure what moving refunds off the request path buys, and worker throughput.
+
+The refund provider is simulated with a fixed delay. CancelPaymentView is
+timed with the refund queued (as shipped) and issued inline, then a Worker
+drains the queue and reports throughput per job type.
+
+    python -m benchmarks.job_queue --requests 200 --provider-ms 50 --concurrency 8
+"""
+import argparse
+import time
+from unittest import mock
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--provider-ms', type=float, default=50.0)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    common.setup()
+
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from users import jobs, payments
+    from users.models import Booking
+    from users.views import CancelPaymentView
+
+    def slow_provider(*_):
+        time.sleep(args.provider_ms / 1000)
+
+    user = common.make_user('bench')
+    event = common.make_event(common.make_user('bench-manager', role='event_manager'), available_tickets=10 ** 6)
+    view = CancelPaymentView.as_view()
+    factory = APIRequestFactory()
+
+    def paid_bookings():
+        return Booking.objects.bulk_create([
+            Booking(user=user, event=event, number_of_tickets=1, price_per_ticket=500, payment_amount=500,
+                    is_paid=True, is_confirmed=True, payment_method='card')
+            for _ in range(args.requests)
+        ])
+
+    def cancel_all(bookings, inline):
+        latencies = []
+        for booking in bookings:
+            request = factory.post('/users/cancel-payment/', {'booking_id': booking.id}, format='json')
+            force_authenticate(request, user=user)
+            with common.Timer() as timer:
+                view(request)
+                if inline:
+                    payments.refund_booking(booking.id)
+            latencies.append(timer.elapsed)
+        return latencies
+
+    rows = []
+    with mock.patch.object(payments, 'issue_refund', slow_provider):
+        for label, inline in (('refund inline', True), ('refund queued', False)):
+            latencies = cancel_all(paid_bookings(), inline)
+            rows.append((label, 'p50 %7.2f ms   p99 %7.2f ms' % (
+                common.percentile(latencies, 50) * 1000, common.percentile(latencies, 99) * 1000,
+            )))
+
+        for booking in paid_bookings():
+            jobs.enqueue('booking_confirmed', {'booking_id': booking.id})
+        with common.Timer() as drain:
+            jobs.Worker(concurrency=args.concurrency).run(once=True)
+
+    for job_type, counters in sorted(jobs.metrics.snapshot().items()):
+        rows.append((job_type, '%d done, %d retried, %d failed, %.0f jobs/s' % (
+            counters['done'], counters['retried'], counters['failed'], counters['done'] / drain.elapsed,
+        )))
+    rows.append(('worker drain', '%.2f s with %d threads' % (drain.elapsed, args.concurrency)))
+
+    common.report(f'CancelPaymentView latency and job throughput ({args.provider_ms:.0f} ms provider)', rows)
+
+
+if __name__ == '__main__':
+    main()
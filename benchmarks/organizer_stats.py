@@ -0,0 +1,102 @@
+"""
+Organizer dashboard reads from EventSales against aggregating the bookings.
+
+Seeds one manager's `--events` events with `--bookings` bookings between
+them, builds their totals with sales.rebuild (as `manage.py rebuild_sales`
+does), then times the organizer stats endpoint against the same totals
+summed straight from the Booking table, and the cost the totals add to
+each booking.
+
+    python -m benchmarks.organizer_stats --events 200 --bookings 1000000
+"""
+import argparse
+import random
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=200)
+    parser.add_argument('--bookings', type=int, default=1000000)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+
+    common.setup()
+
+    from django.db import connection
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from users import sales
+    from users.models import Booking
+    from users.reservations import reserve_tickets
+    from users.views import OrganizerStatsView
+
+    manager = common.make_user('bench-manager', role='event_manager')
+    customer = common.make_user('bench-customer')
+    events = [common.make_event(manager, available_tickets=10 ** 7) for _ in range(args.events)]
+    rng = random.Random(42)
+
+    with common.Timer() as seeding:
+        for start in range(0, args.bookings, 20000):
+            bookings = []
+            for _ in range(start, min(start + 20000, args.bookings)):
+                tickets = rng.randrange(1, 5)
+                paid, cancelled = rng.random() < 0.6, rng.random() < 0.1
+                bookings.append(Booking(
+                    user=customer, event=rng.choice(events), number_of_tickets=tickets, price_per_ticket=500,
+                    payment_amount=500 * tickets, is_paid=paid and not cancelled, is_cancelled=cancelled,
+                ))
+            Booking.objects.bulk_create(bookings)
+    print(f'Seeded {args.bookings} bookings in {seeding.elapsed:.1f} s')
+
+    with common.Timer() as rebuilding:
+        sales.rebuild()
+
+    factory = APIRequestFactory()
+    view = OrganizerStatsView.as_view()
+
+    def endpoint():
+        request = factory.get('/users/organizer/stats/', {'page_size': 100})
+        force_authenticate(request, user=manager)
+        assert view(request).status_code == 200
+
+    def from_bookings():
+        # What the endpoint would run without EventSales
+        Booking.objects.filter(event__created_by=manager).aggregate(**sales.BOOKING_TOTALS)
+        list(Booking.objects.filter(event__created_by=manager).values('event_id').annotate(**sales.BOOKING_TOTALS)[:100])
+
+    def timed(read):
+        latencies = []
+        for _ in range(args.requests):
+            with common.Timer() as timer:
+                read()
+            latencies.append(timer.elapsed * 1000)
+        return latencies
+
+    endpoint_ms = timed(endpoint)
+    bookings_ms = timed(from_bookings)
+
+    executed = []
+
+    def count(execute, sql, params, many, context):
+        executed.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count), common.Timer() as booking:
+        for _ in range(500):
+            reserve_tickets(customer, rng.choice(events), 1)
+    sales_queries = sum('users_eventsales' in sql for sql in executed) / 500
+
+    common.report(f'Organizer stats ({args.events} events, {args.bookings} bookings)', [
+        ('aggregating bookings p50', '%.1f ms' % common.percentile(bookings_ms, 50)),
+        ('stats endpoint p50', '%.1f ms' % common.percentile(endpoint_ms, 50)),
+        ('stats endpoint p99', '%.1f ms' % common.percentile(endpoint_ms, 99)),
+        ('speedup at p50', '%.0fx' % (common.percentile(bookings_ms, 50) / common.percentile(endpoint_ms, 50))),
+        ('rebuild_sales', '%.1f s' % rebuilding.elapsed),
+        ('booking cost', '%.2f queries of %.2f on EventSales, %.2f ms per booking' % (
+            sales_queries, len(executed) / 500, booking.elapsed * 1000 / 500)),
+    ])
+
+
+if __name__ == '__main__':
+    main()
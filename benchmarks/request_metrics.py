@@ -0,0 +1,114 @@
+"""
+What MetricsMiddleware costs EventView.get, with and without the cache.
+
+Replays the browse mix from benchmarks.event_cache through the whole
+request handler, middleware included, once with MetricsMiddleware removed
+from MIDDLEWARE and once with it. Rounds alternate between the two and the
+best round of each is reported.
+
+A couple of percent is within the noise of that comparison on a busy
+machine, so the middleware's own cost is also timed directly: around a view
+that does nothing, and per query for the execute wrapper. With the queries
+each request ran, that gives the overhead as a share of the request.
+
+    python -m benchmarks.request_metrics --events 2000 --requests 5000
+"""
+import argparse
+import random
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--hot', type=int, default=200, help='number of distinct events browsed')
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    common.setup()
+
+    from django.conf import settings
+    from django.core.cache import cache
+    from django.db import connection
+    from django.http import HttpResponse
+    from django.test import Client, RequestFactory, override_settings
+    from users import metrics
+    from users.models import Event
+    from benchmarks.event_pagination import seed_events
+
+    seed_events(common.make_user('bench-manager', role='event_manager'), args.events)
+    event_ids = list(Event.objects.values_list('id', flat=True)[:args.hot])
+    cities = [code for code, _ in Event.CITY_CHOICES]
+    categories = [code for code, _ in Event.CATEGORY_CHOICES]
+
+    rng = random.Random(42)
+    workload = []
+    for _ in range(args.requests):
+        if rng.random() < 0.5:
+            workload.append((f'/users/events/{rng.choice(event_ids)}/', {}))
+        else:
+            workload.append(('/users/events/', {'location': rng.choice(cities), 'category': rng.choice(categories)}))
+
+    # The middleware alone, and the wrapper it puts around each query
+    request, response = RequestFactory().get('/users/events/'), HttpResponse()
+    middleware = metrics.MetricsMiddleware(lambda request: response)
+    with common.Timer() as alone:
+        for _ in range(args.requests):
+            middleware(request)
+    per_request = alone.elapsed / args.requests
+
+    def select():
+        with common.Timer() as timer, connection.cursor() as cursor:
+            for _ in range(args.requests):
+                cursor.execute('SELECT 1')
+        return timer.elapsed
+
+    plain = select()
+    with connection.execute_wrapper(metrics.QueryTimer(connection.alias)):
+        per_query = max(select() - plain, 0) / args.requests
+
+    without = [name for name in settings.MIDDLEWARE if name != 'users.metrics.MetricsMiddleware']
+
+    def replay(middleware, caches):
+        # The client builds its middleware chain on its first request
+        with override_settings(MIDDLEWARE=middleware, CACHES=caches):
+            client = Client()
+            cache.clear()
+            with common.Timer() as timer:
+                for url, params in workload:
+                    client.get(url, params)
+        return args.requests / timer.elapsed
+
+    rows = [
+        ('middleware alone', '%.1f us per request' % (per_request * 10 ** 6)),
+        ('query wrapper', '%.1f us per query' % (per_query * 10 ** 6)),
+    ]
+    uncached = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+    for name, caches in (('uncached', uncached), ('cached', settings.CACHES)):
+        metrics.registry.clear()
+        best = {'off': 0, 'on': 0}
+        for round_ in range(args.rounds):
+            # Alternate which goes first, so drift hits both
+            for key in ('on', 'off') if round_ % 2 else ('off', 'on'):
+                best[key] = max(best[key], replay(without if key == 'off' else settings.MIDDLEWARE, caches))
+        views = metrics.registry.views.values()
+        queries = sum(view.queries.sum for view in views) / sum(view.queries.count for view in views)
+        rows += [
+            (f'{name} without metrics', '%.0f req/s' % best['off']),
+            (f'{name} with metrics', '%.0f req/s (%+.1f%%)' % (best['on'], (best['on'] / best['off'] - 1) * 100)),
+            (f'{name} overhead', '%.2f%% (%.1f queries per request)' % (
+                (per_request + queries * per_query) * best['off'] * 100, queries)),
+        ]
+
+    settings.METRICS_TOKEN = 'bench'
+    with common.Timer() as timer:
+        size = len(Client().get('/users/metrics/', HTTP_AUTHORIZATION='Bearer bench').content)
+    rows.append(('metrics/ scrape', '%.1f ms, %d bytes' % (timer.elapsed * 1000, size)))
+
+    common.report(f'MetricsMiddleware on EventView.get ({args.requests} requests, best of {args.rounds})', rows)
+
+
+if __name__ == '__main__':
+    main()
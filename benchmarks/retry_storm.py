@@ -0,0 +1,70 @@
+"""
+Simulate a mobile retry storm against BookTicketView.
+
+Every logical booking is sent `--retries` times concurrently, as clients do
+when their first attempt times out. Without an Idempotency-Key each copy
+books tickets; with one, duplicates coalesce onto a single transaction.
+
+    python -m benchmarks.retry_storm --bookings 300 --retries 5 --threads 32
+"""
+import argparse
+import random
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--bookings', type=int, default=300)
+    parser.add_argument('--retries', type=int, default=5)
+    parser.add_argument('--threads', type=int, default=32)
+    args = parser.parse_args()
+
+    common.setup()
+
+    from django.db import connection
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from users.models import Booking
+    from users.views import BookTicketView
+
+    user = common.make_user('bench')
+    manager = common.make_user('bench-manager', role='event_manager')
+    view = BookTicketView.as_view()
+    factory = APIRequestFactory()
+
+    def storm(with_keys):
+        event = common.make_event(manager, available_tickets=args.bookings * args.retries)
+        attempts = [(index, str(uuid.uuid4())) for index in range(args.bookings)] * args.retries
+        random.shuffle(attempts)
+
+        def send(attempt):
+            _, key = attempt
+            headers = {'HTTP_IDEMPOTENCY_KEY': key} if with_keys else {}
+            request = factory.post('/users/book-ticket/', {'event_id': event.id, 'number_of_tickets': 1}, format='json', **headers)
+            force_authenticate(request, user=user)
+            with common.Timer() as timer:
+                response = view(request)
+            connection.close()
+            return response.status_code, response.has_header('Idempotent-Replayed'), timer.elapsed
+
+        with common.Timer() as total:
+            with ThreadPoolExecutor(max_workers=args.threads) as pool:
+                results = list(pool.map(send, attempts))
+
+        created = Booking.objects.filter(event=event).count()
+        latencies = [elapsed for _, _, elapsed in results]
+        return '%5d bookings (%d duplicates), %4d replayed, %5.0f req/s, p99 %7.2f ms' % (
+            created, created - args.bookings, sum(1 for _, replayed, _ in results if replayed),
+            len(results) / total.elapsed, common.percentile(latencies, 99) * 1000,
+        )
+
+    common.report(f'Retry storm ({args.bookings} bookings x {args.retries} attempts)', [
+        ('no Idempotency-Key', storm(False)),
+        ('Idempotency-Key', storm(True)),
+    ])
+
+
+if __name__ == '__main__':
+    main()
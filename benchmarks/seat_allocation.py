@@ -0,0 +1,135 @@
+"""
+Best-available seat allocation on a stadium, under concurrent bookings.
+
+Lays out `--sections` sections of `--rows` rows of `--seats` seats (80,000
+by default) and times `find_block` alone on part-filled rows. Then fires
+`--requests` bookings for 1 to `--max-group` adjacent seats at the event
+from `--threads` threads through BookTicketView, and checks every booking
+got adjacent free seats that no other booking holds, and that each row's
+bitmap is exactly its bookings' seats. Last, times building the seat map
+snapshot and reading it back from the cache.
+
+    python -m benchmarks.seat_allocation --requests 2000 --threads 16
+"""
+import argparse
+import json
+import random
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sections', type=int, default=40)
+    parser.add_argument('--rows', type=int, default=50, help='rows per section')
+    parser.add_argument('--seats', type=int, default=40, help='seats per row')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--max-group', type=int, default=6, help='most seats per booking')
+    parser.add_argument('--searches', type=int, default=100000, help='find_block calls timed')
+    args = parser.parse_args()
+
+    common.setup()
+
+    from django.core.cache import cache
+    from django.db import connection
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from users import seating
+    from users.models import Booking, SeatRow
+    from users.views import BookTicketView
+
+    rng = random.Random(0)
+    rows = []
+    for seats in (args.seats, seating.MAX_ROW_SEATS):
+        # Rows about half taken, in runs, as bookings leave them
+        for _ in range(100):
+            taken, seat = 0, 0
+            while seat < seats:
+                run = rng.randint(1, args.max_group)
+                if rng.random() < 0.5:
+                    taken |= seating.block_mask(seat, min(run, seats - seat))
+                seat += run
+            rows.append((taken, seats))
+    search_costs = {}
+    for seats in (args.seats, seating.MAX_ROW_SEATS):
+        sample = [row for row in rows if row[1] == seats]
+        with common.Timer() as timer:
+            for index in range(args.searches):
+                taken, _ = sample[index % len(sample)]
+                seating.find_block(taken, seats, index % args.max_group + 1)
+        search_costs[seats] = timer.elapsed / args.searches
+
+    user = common.make_user('bench')
+    manager = common.make_user('bench-manager', role='event_manager')
+    event = common.make_event(manager, category='sports')
+    layout = [
+        {'name': f'Section {section}', 'rows': [{'name': str(row + 1), 'seats': args.seats} for row in range(args.rows)]}
+        for section in range(args.sections)
+    ]
+    with common.Timer() as layout_timer:
+        event = seating.create_seat_map(event, layout)
+    capacity = event.available_tickets
+
+    view = BookTicketView.as_view()
+    factory = APIRequestFactory()
+    groups = [rng.randint(1, args.max_group) for _ in range(args.requests)]
+
+    def book(count):
+        request = factory.post('/users/book-ticket/', {'event_id': event.id, 'number_of_tickets': count}, format='json')
+        force_authenticate(request, user=user)
+        with common.Timer() as timer:
+            try:
+                status_code = view(request).status_code
+            except Exception:
+                status_code = 500
+        connection.close()
+        return status_code, timer.elapsed
+
+    with common.Timer() as total:
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            results = list(pool.map(book, groups))
+    latencies = [elapsed for _, elapsed in results]
+
+    # Every booking's seats are free of every other's, and the rows hold exactly those
+    held, overlaps = defaultdict(int), 0
+    bookings = Booking.objects.filter(event=event).values_list('seat_row_id', 'first_seat', 'number_of_tickets')
+    for row_id, first_seat, count in bookings:
+        mask = seating.block_mask(first_seat, count)
+        overlaps += bool(held[row_id] & mask)
+        held[row_id] |= mask
+    mismatched = sum(
+        seating.to_bitmap(taken) != held[row_id] for row_id, taken in SeatRow.objects.filter(event=event).values_list('id', 'taken')
+    )
+    sold = sum(count for _, _, count in bookings)
+    event.refresh_from_db()
+
+    cache.clear()
+    with common.Timer() as build:
+        data, _ = seating.snapshot(event.id)
+    with common.Timer() as cached:
+        for _ in range(100):
+            seating.snapshot(event.id)
+
+    common.report(f'Seat allocation ({capacity} seats, {args.requests} bookings from {args.threads} threads)', [
+        ('find_block, %d-seat rows' % args.seats, '%.2f us' % (search_costs[args.seats] * 10 ** 6)),
+        ('find_block, %d-seat rows' % seating.MAX_ROW_SEATS, '%.2f us' % (search_costs[seating.MAX_ROW_SEATS] * 10 ** 6)),
+        ('seat map created in', '%.2f s' % layout_timer.elapsed),
+        ('created', sum(1 for code, _ in results if code == 201)),
+        ('refused', sum(1 for code, _ in results if code == 400)),
+        ('errors', sum(1 for code, _ in results if code >= 500)),
+        ('throughput', '%.0f req/s' % (args.requests / total.elapsed)),
+        ('p50 latency', '%.2f ms' % (common.percentile(latencies, 50) * 1000)),
+        ('p99 latency', '%.2f ms' % (common.percentile(latencies, 99) * 1000)),
+        ('seats sold', '%d (%d left, %d expected)' % (sold, event.available_tickets, capacity - sold)),
+        ('double-booked seats', overlaps),
+        ('rows not matching bookings', mismatched),
+        ('snapshot size', '%.1f KB of JSON' % (len(json.dumps(data)) / 1024)),
+        ('snapshot build', '%.1f ms' % (build.elapsed * 1000)),
+        ('snapshot cached read', '%.3f ms' % (cached.elapsed / 100 * 1000)),
+    ])
+
+
+if __name__ == '__main__':
+    main()
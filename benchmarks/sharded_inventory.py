@@ -0,0 +1,65 @@
+"""
+Compare booking throughput on a single inventory row against sharded inventory.
+
+Each configuration books against its own event with enough stock that no
+request sells out. SQLite serializes every writer on one database lock, so
+shard gains only show on a row-locking backend such as PostgreSQL.
+
+    python -m benchmarks.sharded_inventory --requests 2000 --threads 32 --shards 1 4 16
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 4, 16])
+    args = parser.parse_args()
+
+    common.setup()
+
+    from django.db import connection
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from users.reservations import shard_inventory
+    from users.views import BookTicketView
+
+    user = common.make_user('bench')
+    manager = common.make_user('bench-manager', role='event_manager')
+    view = BookTicketView.as_view()
+    factory = APIRequestFactory()
+
+    rows = []
+    for shard_count in args.shards:
+        event = shard_inventory(common.make_event(manager, available_tickets=args.requests), shard_count)
+        payload = {'event_id': event.id, 'number_of_tickets': 1}
+
+        def book(_):
+            request = factory.post('/users/book-ticket/', payload, format='json')
+            force_authenticate(request, user=user)
+            with common.Timer() as timer:
+                status_code = view(request).status_code
+            connection.close()
+            return status_code, timer.elapsed
+
+        with common.Timer() as total:
+            with ThreadPoolExecutor(max_workers=args.threads) as pool:
+                results = list(pool.map(book, range(args.requests)))
+
+        event.refresh_from_db()
+        latencies = [elapsed for _, elapsed in results]
+        failed = sum(1 for code, _ in results if code != 201)
+        label = 'single row' if shard_count <= 1 else f'{shard_count} shards'
+        rows.append((label, '%7.0f req/s   p99 %7.2f ms   failed %d   left %d' % (
+            args.requests / total.elapsed, common.percentile(latencies, 99) * 1000,
+            failed, event.total_available_tickets,
+        )))
+
+    common.report(f'Sharded inventory ({args.requests} bookings, {args.threads} threads, {connection.vendor})', rows)
+
+
+if __name__ == '__main__':
+    main()
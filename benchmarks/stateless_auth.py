@@ -0,0 +1,79 @@
+"""
+Compare JWTAuthentication against ClaimsJWTAuthentication on the booking endpoints.
+
+Logs users in through LoginView, then replays book-ticket/ and my-bookings/
+requests with their access tokens under each backend, counting queries per
+request and timing throughput.
+
+    python -m benchmarks.stateless_auth --users 50 --requests 2000
+"""
+import argparse
+import random
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    common.setup()
+
+    from django.db import connection
+    from rest_framework.test import APIRequestFactory
+    from rest_framework.views import APIView
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from users.authentication import ClaimsJWTAuthentication
+    from users.views import BookTicketView, BookingListView, LoginView
+
+    event = common.make_event(common.make_user('bench-manager', role='event_manager'), available_tickets=10 ** 7)
+    factory = APIRequestFactory()
+    login = LoginView.as_view()
+    tokens = []
+    for index in range(args.users):
+        common.make_user(f'bench-user-{index}')
+        response = login(factory.post('/users/login/', {'username': f'bench-user-{index}', 'password': 'benchpassword'}))
+        tokens.append(response.data['access'])
+
+    rng = random.Random(42)
+    workload = [rng.choice(tokens) for _ in range(args.requests)]
+    endpoints = {
+        'book-ticket': (BookTicketView.as_view(), lambda: factory.post('/users/book-ticket/', {'event_id': event.id, 'number_of_tickets': 1})),
+        'my-bookings': (BookingListView.as_view(), lambda: factory.get('/users/my-bookings/')),
+    }
+
+    executed = []
+
+    def count(execute, sql, params, many, context):
+        executed.append(sql)
+        return execute(sql, params, many, context)
+
+    rows = []
+    for name, (view, build) in endpoints.items():
+        results = {}
+        for backend in (JWTAuthentication, ClaimsJWTAuthentication):
+            APIView.authentication_classes = [backend]
+            executed.clear()
+            with connection.execute_wrapper(count), common.Timer() as timer:
+                for token in workload:
+                    request = build()
+                    request.META['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+                    view(request)
+            results[backend] = (len(executed) / args.requests, args.requests / timer.elapsed)
+
+        (db_queries, db_rate), (claims_queries, claims_rate) = results[JWTAuthentication], results[ClaimsJWTAuthentication]
+        rows += [
+            (f'{name} JWTAuthentication', '%.2f queries/request, %.0f req/s' % (db_queries, db_rate)),
+            (f'{name} ClaimsJWTAuthentication', '%.2f queries/request, %.0f req/s' % (claims_queries, claims_rate)),
+            (f'{name} queries removed', '%.2f per request (%.0f%%), %.2fx throughput' % (
+                db_queries - claims_queries, 100 * (1 - claims_queries / db_queries), claims_rate / db_rate,
+            )),
+        ]
+
+    common.report(f'Authentication backends ({args.users} users, {args.requests} requests per endpoint)', rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+What TokenBucketThrottle adds to a request.
+
+Times `allow_request` on its own for each bucket store, for requests let
+through (clients spread over `--clients` buckets) and for a client that is
+being refused. Then times a request to a view that does nothing through
+APIView's dispatch, without throttling and with it, which adds DRF's
+throttle handling around the check. Rounds alternate between the two and
+the best round of each is reported.
+
+    python -m benchmarks.throttling --requests 100000 --clients 10000
+"""
+import argparse
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=100000)
+    parser.add_argument('--clients', type=int, default=10000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    common.setup()
+
+    from django.core.cache import cache
+    from django.test import override_settings
+    from rest_framework.permissions import AllowAny
+    from rest_framework.request import Request
+    from rest_framework.response import Response
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from rest_framework.views import APIView
+    from users import throttling
+    from users.models import User
+
+    factory = APIRequestFactory()
+    # Unsaved users: the throttle only reads their pk and role
+    users = [User(pk=index + 1, username=f'bench-user-{index}') for index in range(args.clients)]
+    requests = []
+    for user in users:
+        request = Request(factory.post('/users/book-ticket/'))
+        request.user = user
+        requests.append(request)
+
+    class View(APIView):
+        authentication_classes = []
+        permission_classes = [AllowAny]
+        throttle_scope = 'bench'
+
+        def post(self, request):
+            return Response()
+
+    view = View()
+    open_rates = {'bench': {User.USER: (10 ** 9, 10 ** 9)}}
+    # One token, then one a day
+    closed_rates = {'bench': {User.USER: (1, 1 / 86400)}}
+
+    def checks(rates, requests):
+        """Seconds per allow_request, and how many were allowed."""
+        throttle, allowed = throttling.TokenBucketThrottle(), 0
+        with override_settings(THROTTLE_RATES=rates), common.Timer() as timer:
+            for index in range(args.requests):
+                allowed += throttle.allow_request(requests[index % len(requests)], view)
+        return timer.elapsed / args.requests, allowed
+
+    rows = []
+    for name, store in (('local', 'users.throttling.LocalBucketStore'), ('cache', 'users.throttling.CacheBucketStore')):
+        with override_settings(THROTTLE_STORE=store):
+            throttling.get_store().clear()
+            cache.clear()
+            allowed_cost, allowed = checks(open_rates, requests)
+            refused_cost, refused = checks(closed_rates, requests[:1])
+        rows += [
+            (f'{name} store, let through', '%.1f us per check (%d of %d allowed)' % (allowed_cost * 10 ** 6, allowed, args.requests)),
+            (f'{name} store, refused', '%.1f us per check (%d of %d allowed)' % (refused_cost * 10 ** 6, refused, args.requests)),
+        ]
+
+    def dispatch(throttle_classes):
+        handler = View.as_view(throttle_classes=throttle_classes)
+        http_requests = [factory.post('/users/book-ticket/') for _ in range(len(users))]
+        for http_request, user in zip(http_requests, users):
+            force_authenticate(http_request, user=user)
+        with override_settings(THROTTLE_RATES=open_rates), common.Timer() as timer:
+            for index in range(args.requests):
+                handler(http_requests[index % len(users)])
+        return timer.elapsed / args.requests
+
+    throttling.get_store().clear()
+    best = {'without': float('inf'), 'with': float('inf')}
+    for round_ in range(args.rounds):
+        # Alternate which goes first, so drift hits both
+        for key in ('with', 'without') if round_ % 2 else ('without', 'with'):
+            best[key] = min(best[key], dispatch([throttling.TokenBucketThrottle] if key == 'with' else []))
+    without, with_throttle = best['without'], best['with']
+    rows += [
+        ('request without throttling', '%.1f us' % (without * 10 ** 6)),
+        ('request with throttling', '%.1f us (+%.1f us)' % (with_throttle * 10 ** 6, (with_throttle - without) * 10 ** 6)),
+    ]
+
+    common.report(f'TokenBucketThrottle ({args.requests} requests over {args.clients} clients, best of {args.rounds})', rows)
+
+
+if __name__ == '__main__':
+    main()
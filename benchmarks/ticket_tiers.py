@@ -0,0 +1,142 @@
+"""
+Ticket tiers: the listing's price range, booking a tier, and tier oversell.
+
+Creates `--events` events with `--tiers` tiers each and times reading every
+event's row for the listing with min_price/max_price taken from the event
+row, against aggregating each event's tiers in correlated subqueries. Then
+books `--bookings` times through BookTicketView with and without a tier,
+with queries and latency per booking, and fires `--requests` bookings from
+`--threads` threads at a tier of `--tier-tickets` tickets, checking that
+it sells exactly out and the event's tickets stay the sum of its tiers'.
+
+    python -m benchmarks.ticket_tiers --events 10000 --threads 16
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--tiers', type=int, default=3, help='tiers per event')
+    parser.add_argument('--bookings', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--tier-tickets', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    common.setup()
+
+    from django.db import connection
+    from django.db.models import Max, Min, OuterRef, Subquery, Sum
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from users import tiers
+    from users.models import Booking, Event, TicketTier
+    from users.serializers import FastEventSerializer
+    from users.views import BookTicketView
+
+    manager = common.make_user('bench-manager', role='event_manager')
+    user = common.make_user('bench')
+    template = common.make_event(manager)
+    Event.objects.bulk_create([
+        Event(**{field.attname: getattr(template, field.attname) for field in Event._meta.concrete_fields if not field.primary_key})
+        for _ in range(args.events - 1)
+    ], batch_size=1000)
+    events = list(Event.objects.all())
+    TicketTier.objects.bulk_create([
+        TicketTier(event=event, name=f'Tier {index}', price=100 * (index + 1), available_tickets=10 ** 6)
+        for event in events for index in range(args.tiers)
+    ], batch_size=1000)
+    Event.objects.update(min_price=100, max_price=100 * args.tiers, available_tickets=args.tiers * 10 ** 6)
+
+    def tier_price(aggregate):
+        return Subquery(
+            TicketTier.objects.filter(event=OuterRef('pk')).values('event').annotate(price=aggregate('price')).values('price')
+        )
+
+    listings = {
+        'columns': lambda: list(FastEventSerializer.values(Event.objects.with_inventory()).order_by('date', 'time', 'id')),
+        'subqueries': lambda: list(
+            Event.objects.with_inventory().annotate(tier_min=tier_price(Min), tier_max=tier_price(Max))
+            .order_by('date', 'time', 'id').values(*FastEventSerializer.columns(), 'tier_min', 'tier_max')
+        ),
+    }
+    best = {name: float('inf') for name in listings}
+    for round_ in range(args.rounds):
+        for name in listings if round_ % 2 else reversed(list(listings)):
+            with common.Timer() as timer:
+                listings[name]()
+            best[name] = min(best[name], timer.elapsed)
+
+    view, factory = BookTicketView.as_view(), APIRequestFactory()
+    untiered = common.make_event(manager, available_tickets=10 ** 6)
+    event = events[0]
+    tier = TicketTier.objects.filter(event=event).first()
+    executed = []
+
+    def count(execute, sql, params, many, context):
+        executed.append(sql)
+        return execute(sql, params, many, context)
+
+    def book(payload):
+        request = factory.post('/users/book-ticket/', payload, format='json')
+        force_authenticate(request, user=user)
+        with common.Timer() as timer:
+            try:
+                status_code = view(request).status_code
+            except Exception:
+                status_code = 500
+        return status_code, timer.elapsed
+
+    sequential = {}
+    for name, payload in (
+        ('without a tier', {'event_id': untiered.id, 'number_of_tickets': 1}),
+        ('with a tier', {'event_id': event.id, 'number_of_tickets': 1, 'tier_id': tier.id}),
+    ):
+        executed.clear()
+        with connection.execute_wrapper(count):
+            results = [book(payload) for _ in range(args.bookings)]
+        assert all(code == 201 for code, _ in results)
+        sequential[name] = (len(executed) / args.bookings, common.percentile([elapsed for _, elapsed in results], 50))
+
+    hot = tiers.create_tier(common.make_event(manager), name='VIP', price=2000, available_tickets=args.tier_tickets)
+    tiers.create_tier(hot.event, name='General', price=500, available_tickets=args.tier_tickets)
+
+    def book_hot(_):
+        result = book({'event_id': hot.event_id, 'number_of_tickets': 1, 'tier_id': hot.id})
+        connection.close()
+        return result
+
+    with common.Timer() as total:
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            results = list(pool.map(book_hot, range(args.requests)))
+    sold = Booking.objects.filter(tier=hot).aggregate(total=Sum('number_of_tickets'))['total'] or 0
+    hot.refresh_from_db()
+    hot_event = Event.objects.get(id=hot.event_id)
+    tier_sum = TicketTier.objects.filter(event=hot_event).aggregate(total=Sum('available_tickets'))['total']
+    latencies = [elapsed for _, elapsed in results]
+
+    rows = [
+        ('listing, price range columns', '%.1f ms for %d events' % (best['columns'] * 1000, args.events)),
+        ('listing, tier subqueries', '%.1f ms (%.1fx)' % (best['subqueries'] * 1000, best['subqueries'] / best['columns'])),
+    ]
+    for name, (queries, latency) in sequential.items():
+        rows.append((f'book-ticket/ {name}', '%.1f queries, p50 %.2f ms' % (queries, latency * 1000)))
+    rows += [
+        ('concurrent tier bookings', '%d created, %d sold out, %d errors' % (
+            sum(code == 201 for code, _ in results), sum(code == 400 for code, _ in results), sum(code >= 500 for code, _ in results),
+        )),
+        ('throughput', '%.0f req/s' % (args.requests / total.elapsed)),
+        ('p50 latency', '%.2f ms' % (common.percentile(latencies, 50) * 1000)),
+        ('p99 latency', '%.2f ms' % (common.percentile(latencies, 99) * 1000)),
+        ('tier oversell', max(0, sold + hot.available_tickets - args.tier_tickets)),
+        ('event tickets', '%d (sum of its tiers %d)' % (hot_event.available_tickets, tier_sum)),
+    ]
+    common.report(f'Ticket tiers ({args.events} events, {args.tiers} tiers each)', rows)
+
+
+if __name__ == '__main__':
+    main()
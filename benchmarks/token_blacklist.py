@@ -0,0 +1,132 @@
+"""
+Benchmark blacklist lookups and expired token compaction under login/logout churn.
+
+Seeds `--tokens` outstanding refresh tokens, `--blacklisted` of them
+blacklisted and `--expired` of them past expiry, as months of logins and
+logouts leave behind. Times session lookups (mostly live sessions, some
+logged out) straight against the table, as simplejwt checks it, and
+through the Bloom filter front, then the sync that picks up a burst of
+logouts from other processes, and finally compact_tokens.
+
+    python -m benchmarks.token_blacklist --tokens 1000000
+"""
+import argparse
+import contextlib
+import random
+import uuid
+from datetime import timedelta
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tokens', type=int, default=1000000)
+    parser.add_argument('--blacklisted', type=float, default=0.3)
+    parser.add_argument('--expired', type=float, default=0.7)
+    parser.add_argument('--lookups', type=int, default=20000)
+    parser.add_argument('--logouts', type=int, default=5000, help='logouts made elsewhere before the sync')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    common.setup()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.utils import timezone
+    from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+    from users import authentication
+
+    user = common.make_user('bench')
+    rng = random.Random(42)
+    now = timezone.now()
+
+    def seed(count, blacklisted_share, expired_share):
+        jtis = []
+        for start in range(0, count, 20000):
+            tokens = OutstandingToken.objects.bulk_create([
+                OutstandingToken(
+                    user=user, jti=uuid.uuid4().hex, token='x' * 200, created_at=now,
+                    # The oldest tokens have expired
+                    expires_at=now + timedelta(days=-1 if index < count * expired_share else 7),
+                )
+                for index in range(start, min(start + 20000, count))
+            ])
+            BlacklistedToken.objects.bulk_create([
+                BlacklistedToken(token=token) for token in tokens if rng.random() < blacklisted_share
+            ])
+            jtis += [token.jti for token in tokens]
+        return jtis
+
+    with common.Timer() as seeding:
+        seed(args.tokens, args.blacklisted, args.expired)
+    print(f'Seeded {args.tokens} tokens in {seeding.elapsed:.1f} s')
+
+    live = list(OutstandingToken.objects.filter(blacklistedtoken__isnull=True, expires_at__gt=now).values_list('jti', flat=True))
+    revoked = list(BlacklistedToken.objects.filter(token__expires_at__gt=now).values_list('token__jti', flat=True))
+    # Mostly live sessions, with a few logged-out tokens still being presented
+    sessions = [rng.choice(revoked) if rng.random() < 0.01 else rng.choice(live) for _ in range(args.lookups)]
+
+    executed = []
+
+    def count(execute, sql, params, many, context):
+        executed.append(sql)
+        return execute(sql, params, many, context)
+
+    def time_lookups(lookup):
+        latencies = []
+        executed.clear()
+        with connection.execute_wrapper(count):
+            for session in sessions:
+                with common.Timer() as timer:
+                    lookup(session)
+                latencies.append(timer.elapsed * 1000)
+        return latencies, len(executed) / len(sessions)
+
+    table_ms, table_queries = time_lookups(lambda jti: BlacklistedToken.objects.filter(token__jti=jti).exists())
+    with common.Timer() as build:
+        authentication.blacklist.ensure_synced()
+    front_ms, front_queries = time_lookups(authentication.session_revoked)
+
+    # A burst of logouts in other processes, then the sync that picks them up
+    BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in OutstandingToken.objects.filter(
+        jti__in=rng.sample(live, args.logouts))])
+    authentication.blacklist.synced_at -= settings.AUTH_BLACKLIST_SYNC_INTERVAL + 1
+    with common.Timer() as sync:
+        authentication.blacklist.ensure_synced()
+
+    rows_before = OutstandingToken.objects.count(), BlacklistedToken.objects.count()
+    batches = []
+    atomic = authentication.transaction.atomic
+
+    @contextlib.contextmanager
+    def timed_atomic(*a, **kw):
+        with common.Timer() as timer, atomic(*a, **kw):
+            yield
+        batches.append(timer.elapsed)
+
+    authentication.transaction.atomic = timed_atomic
+    try:
+        with common.Timer() as compaction:
+            deleted = authentication.compact_tokens(batch_size=args.batch_size)
+    finally:
+        authentication.transaction.atomic = atomic
+    rows_after = OutstandingToken.objects.count(), BlacklistedToken.objects.count()
+
+    bloom = authentication.blacklist.filter
+    common.report(f'Token blacklist ({args.tokens} tokens, {args.lookups} lookups, 1% revoked)', [
+        ('table lookup p50', '%.3f ms' % common.percentile(table_ms, 50)),
+        ('table lookup p99', '%.3f ms' % common.percentile(table_ms, 99)),
+        ('filter lookup p50', '%.3f ms' % common.percentile(front_ms, 50)),
+        ('filter lookup p99', '%.3f ms' % common.percentile(front_ms, 99)),
+        ('queries per lookup', '%.3f table, %.3f filter' % (table_queries, front_queries)),
+        ('filter build', '%.2f s, %.1f MB for %d jtis' % (build.elapsed, len(bloom.bits) / 2 ** 20, bloom.count)),
+        (f'sync after {args.logouts} logouts', '%.1f ms' % (sync.elapsed * 1000)),
+        ('compaction', '%d tokens in %.1f s, longest batch %.0f ms' % (deleted, compaction.elapsed, max(batches, default=0) * 1000)),
+        ('outstanding rows', '%d -> %d' % (rows_before[0], rows_after[0])),
+        ('blacklisted rows', '%d -> %d' % (rows_before[1], rows_after[1])),
+    ])
+
+
+if __name__ == '__main__':
+    main()
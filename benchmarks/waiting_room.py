@@ -0,0 +1,174 @@
+"""
+Simulated on-sale spike at 50x booking capacity, with and without the
+waiting room.
+
+First times the real views on this machine: a booking through
+BookTicketView, with and without a queue token, and a waiting room join
+and poll. Then replays `--overload` times booking capacity arriving within
+`--seconds` seconds, in simulated time:
+
+- The booking path is a FIFO queue served at the measured rate by
+  `--servers` servers (1 for SQLite, which takes one writer at a time). A
+  booking that waits longer than `--timeout` (the database lock timeout)
+  fails and its user retries a second later.
+- Without a waiting room every user books on arrival.
+- With one, users join, poll again after the retry_after the waiting room
+  gives them, and book once let through. The line is the real
+  users.waiting_room code on the simulated clock. The event's
+  admission_rate is `--admission-rate` times the measured rate, so the
+  controller has to find the real one.
+
+Joins and polls only use the cache, so they are served apart from the
+booking path and left out of its queue; their cost is reported instead.
+
+    python -m benchmarks.waiting_room --overload 50 --seconds 1 --admission-rate 2
+"""
+import argparse
+import heapq
+import itertools
+from unittest import mock
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--overload', type=float, default=50, help='arrivals per second, as a multiple of booking capacity')
+    parser.add_argument('--seconds', type=float, default=1, help='seconds over which users arrive')
+    parser.add_argument('--servers', type=int, default=1, help='bookings the database runs at once')
+    parser.add_argument('--timeout', type=float, default=20, help='seconds a booking waits for the database before failing')
+    parser.add_argument('--admission-rate', type=float, default=2, help="the event's admission_rate, as a multiple of booking capacity")
+    parser.add_argument('--samples', type=int, default=500, help='requests timed per view')
+    args = parser.parse_args()
+
+    common.setup()
+
+    from django.core.cache import cache
+    from django.core.cache.backends import base as cache_base, locmem
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from users import waiting_room
+    from users.models import User
+    from users.views import BookTicketView, WaitingRoomView
+
+    manager = common.make_user('bench-manager', role='event_manager')
+    User.objects.bulk_create([User(username=f'bench-user-{index}', email=f'user{index}@example.com') for index in range(args.samples)])
+    users = list(User.objects.filter(username__startswith='bench-user-'))
+    factory = APIRequestFactory()
+    book_view, room_view = BookTicketView.as_view(), WaitingRoomView.as_view()
+
+    def timed(view, method, payloads):
+        """Seconds per request, and the responses."""
+        responses = []
+        with common.Timer() as timer:
+            for user, data in zip(users, payloads):
+                request = factory.get('/', data) if method == 'get' else factory.post('/', data, format='json')
+                force_authenticate(request, user=user)
+                responses.append(view(request))
+        assert all(response.status_code < 300 for response in responses)
+        return timer.elapsed / len(users), [response.data for response in responses]
+
+    direct_event = common.make_event(manager, available_tickets=10 ** 6)
+    gated_event = common.make_event(manager, available_tickets=10 ** 6, admission_rate=10 ** 6)
+    direct_cost, _ = timed(book_view, 'post', [{'event_id': direct_event.id, 'number_of_tickets': 1}] * len(users))
+    join_cost, places = timed(room_view, 'post', [{'event_id': gated_event.id}] * len(users))
+    poll_cost, _ = timed(room_view, 'get', [{'queue_token': place['queue_token']} for place in places])
+    # Let everyone through before booking
+    cache.delete(waiting_room._key(gated_event.id, 'step'))
+    gated_cost, _ = timed(book_view, 'post', [
+        {'event_id': gated_event.id, 'number_of_tickets': 1, 'queue_token': place['queue_token']} for place in places
+    ])
+    capacity = args.servers / gated_cost
+    count = int(capacity * args.overload * args.seconds)
+
+    def simulate(gated):
+        cache.clear()
+        clock = {'now': 0.0}
+        event_id, rate = 10 ** 9 + gated, max(round(capacity * args.admission_rate), 1)
+        # (time, sequence, action, user)
+        pending, sequence = [], itertools.count()
+        servers = [0.0] * args.servers
+        arrived, admitted_at, latencies = {}, {}, []
+        counts = {'polls': 0, 'failed': 0, 'booked': 0}
+        service = gated_cost if gated else direct_cost
+
+        def at(when, action, user):
+            heapq.heappush(pending, (when, next(sequence), action, user))
+
+        for index in range(count):
+            arrived[index] = args.seconds * index / count
+            at(arrived[index], 'join' if gated else 'book', index)
+
+        user = mock.Mock()
+        tokens, last = {}, 0.0
+        # The waiting room and the cache, whose expiry times its step lock, run on the simulated clock
+        simulated = mock.Mock(time=lambda: clock['now'])
+        with mock.patch.object(waiting_room, 'time', simulated), mock.patch.object(locmem, 'time', simulated), \
+                mock.patch.object(cache_base, 'time', simulated):
+            while pending:
+                now, _, action, index = heapq.heappop(pending)
+                clock['now'] = last = now
+
+                if action == 'done':
+                    if gated:
+                        waiting_room._incr(waiting_room._key(event_id, 'completed'))
+                    continue
+                if action in ('join', 'poll'):
+                    user.pk = index
+                    if action == 'join':
+                        tokens[index], place = waiting_room.join(user, event_id, rate)
+                    else:
+                        counts['polls'] += 1
+                        place = waiting_room.place(event_id, waiting_room.read_token(tokens[index], user)[1], rate)
+                    if not place['admitted']:
+                        at(now + place['retry_after'], 'poll', index)
+                        continue
+                    admitted_at[index] = now
+                    at(now, 'book', index)
+                    continue
+
+                # A booking: queued for the first free server, or failed after waiting out the lock timeout
+                if gated:
+                    waiting_room._incr(waiting_room._key(event_id, 'started'))
+                server = min(range(args.servers), key=servers.__getitem__)
+                start = max(now, servers[server])
+                if start - now > args.timeout:
+                    counts['failed'] += 1
+                    at(now + args.timeout, 'done', index)
+                    at(now + args.timeout + 1, 'book', index)
+                    continue
+                servers[server] = finish = start + service
+                latencies.append(finish - now)
+                counts['booked'] += 1
+                at(finish, 'done', index)
+            controller = cache.get(waiting_room._key(event_id, 'controller'))
+
+        rows = [
+            ('booking latency p50', '%.0f ms' % (common.percentile(latencies, 50) * 1000)),
+            ('booking latency p99', '%.0f ms' % (common.percentile(latencies, 99) * 1000)),
+            ('booking latency max', '%.0f ms' % (max(latencies) * 1000)),
+            ('failed bookings', '%d (lock timeouts, retried)' % counts['failed']),
+            ('all booked after', '%.1f s' % last),
+        ]
+        if gated:
+            waits = [admitted_at[index] - arrived[index] for index in range(count)]
+            rows += [
+                ('time in line p50', '%.1f s' % common.percentile(waits, 50)),
+                ('time in line p99', '%.1f s' % common.percentile(waits, 99)),
+                ('polls per user', '%.1f' % (counts['polls'] / count)),
+                ('admission rate', '%.0f/s at the end (admission_rate %d)' % (controller['rate'], rate)),
+            ]
+        return rows
+
+    rows = [
+        ('book-ticket/', '%.2f ms direct, %.2f ms with a queue token' % (direct_cost * 1000, gated_cost * 1000)),
+        ('waiting-room/', '%.2f ms per join, %.2f ms per poll' % (join_cost * 1000, poll_cost * 1000)),
+        ('capacity', '%.0f bookings/s' % capacity),
+        ('users', '%d within %g s' % (count, args.seconds)),
+    ]
+    rows += [(f'direct {label}', value) for label, value in simulate(gated=False)]
+    rows += [(f'waiting room {label}', value) for label, value in simulate(gated=True)]
+    common.report(f'Simulated on-sale spike at {args.overload:g}x booking capacity', rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bookmyevent.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from users.availability import StreamHandler  # noqa: E402  (needs the apps loaded)
+
+# Availability streams are served ahead of Django's request handling
+application = StreamHandler(django_application)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so the latency it records covers the rest of the stack
+    'users.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -71,18 +74,158 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'bookmyevent.wsgi.application'
+ASGI_APPLICATION = 'bookmyevent.asgi.application'
+
+# Serve event and booking reads with async views. Turn on when serving
+# bookmyevent.asgi; under WSGI every async request needs its own event loop
+ASYNC_READ_VIEWS = False
 
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
+# Chosen with DB_ENGINE: 'sqlite' (the default) or 'postgresql', which reads
+# DB_NAME, DB_USER, DB_PASSWORD, DB_HOST and DB_PORT.
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'bookmyevent'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', ''),
+            'PORT': os.environ.get('DB_PORT', ''),
+            # Seconds each worker thread keeps its connection open for the next request (0 closes it every request)
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            # Reused connections are checked first, so a database restart doesn't fail the next request
+            'CONN_HEALTH_CHECKS': True,
+            # Set DB_PGBOUNCER=1 behind PgBouncer in transaction pooling mode, which can't hold
+            # the server-side cursors iterator() uses open between transactions
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_PGBOUNCER', '') == '1',
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            # Django's SQLite backend plus `pragmas` and `transaction_mode` (see bookmyevent/sqlite3/base.py)
+            'ENGINE': 'bookmyevent.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'OPTIONS': {
+                # Seconds a writer waits for the write lock (SQLite's busy_timeout) before "database is locked"
+                'timeout': 20,
+                # Writers queue for the lock up front instead of failing when they upgrade to it
+                'transaction_mode': 'IMMEDIATE',
+                'pragmas': {
+                    # Readers no longer block the writer, nor the writer them
+                    'journal_mode': 'WAL',
+                    # In WAL mode, safe against application crashes; a power loss can drop the last commits
+                    'synchronous': 'NORMAL',
+                    # Page cache per connection, in KiB when negative
+                    'cache_size': -20000,
+                    'temp_store': 'MEMORY',
+                    'mmap_size': 256 * 2 ** 20,
+                },
+            },
+        }
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
+# Seconds a cached event detail or listing page may be served before it is rebuilt
+EVENT_CACHE_TIMEOUT = 300
+# Listing pages aren't invalidated by bookings, so this bounds how stale their ticket counts get
+EVENT_LISTING_CACHE_TIMEOUT = 10
+
+# Event search (see users/search.py). A title occurrence counts this many description occurrences
+SEARCH_TITLE_WEIGHT = 3
+# Seconds before a process rebuilds its search index to pick up other processes' writes; None never does
+SEARCH_INDEX_REFRESH = None
+
+# Live availability streams (see users/availability.py). Seconds between pushes; changes within one are coalesced
+AVAILABILITY_STREAM_INTERVAL = 0.5
+# Seconds between keepalive comments on a stream with nothing to report
+AVAILABILITY_STREAM_HEARTBEAT = 15
+# Seconds before a stream ends and the client reconnects, bounding subscribers left by dropped connections
+AVAILABILITY_STREAM_MAX_AGE = 300
+# Milliseconds clients wait before reconnecting
+AVAILABILITY_STREAM_RETRY = 3000
+AVAILABILITY_STREAM_MAX_EVENTS = 50
+# Also pick up other processes' writes through the event cache versions; needs a shared cache backend
+AVAILABILITY_STREAM_FANOUT = False
+
+
+# Seconds an unpaid booking holds its tickets before the sweeper releases them
+BOOKING_HOLD_TTL = 15 * 60
+# Seconds between hold sweeps run by `manage.py run_jobs`
+HOLD_SWEEP_INTERVAL = 60
+# Items accepted by one book-tickets/batch/ request
+BATCH_BOOKING_MAX_ITEMS = 100
+# Rows each event's sales totals are spread over, so concurrent bookings and payments rarely update the same one
+EVENT_SALES_SLOTS = 8
+# Longest date range events/calendar/ covers in one request
+CALENDAR_MAX_DAYS = 366
+
+# Waiting room for events with an admission_rate (see users/waiting_room.py). Its line is
+# kept in the cache, so spans processes only with a shared cache backend.
+# Seconds between admission steps
+WAITING_ROOM_TICK = 1
+# Users let through per second however slow bookings get, so the line always moves
+WAITING_ROOM_MIN_RATE = 1
+# Seconds of bookings the waiting room lets back up before admitting fewer users
+WAITING_ROOM_TARGET_LATENCY = 0.5
+# Longest wait, in seconds, before a waiting client is told to poll again
+WAITING_ROOM_POLL_INTERVAL = 5
+# Seconds a queue token stays valid
+WAITING_ROOM_TOKEN_TTL = 2 * 60 * 60
+
+# Idempotency-Key handling on book-ticket/ and make-payment/ (see users/idempotency.py).
+# Replays and duplicate coalescing span processes only with a shared cache backend.
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+# Seconds a duplicate waits for the original request before giving up with 409
+IDEMPOTENCY_IN_FLIGHT_TIMEOUT = 30
+
+# Token-bucket throttling (see users/throttling.py). Each client gets a bucket per scope of
+# (size, tokens added per second): the burst it may send and the rate it may keep up. Clients
+# are users by role, or 'anon' per IP address when signed out; those not listed aren't throttled.
+THROTTLE_RATES = {
+    'login': {'anon': (10, 0.2)},
+    'book-ticket': {'user': (10, 1), 'event_manager': (30, 3)},
+    'events': {'anon': (60, 10), 'user': (60, 10), 'event_manager': (120, 20)},
+}
+# 'users.throttling.LocalBucketStore' keeps buckets in each process, which each allow the full
+# rate; 'users.throttling.CacheBucketStore' shares them through the THROTTLE_CACHE cache backend
+THROTTLE_STORE = 'users.throttling.LocalBucketStore'
+THROTTLE_CACHE = 'default'
+
+# Request metrics, served at metrics/ (see users/metrics.py)
+# Token a scraper sends as "Authorization: Bearer <token>" to read metrics/; unset, metrics/ is off
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# Seconds after which a request is logged with the plans of its slowest queries
+METRICS_SLOW_REQUEST_THRESHOLD = 1.0
+# Seconds between slow request logs for the same view
+METRICS_SLOW_SAMPLE_INTERVAL = 60
+
+# Background jobs (see users/jobs.py; run workers with `manage.py run_jobs`)
+JOB_MAX_ATTEMPTS = 5
+# Seconds before the first retry; doubles on every further attempt
+JOB_RETRY_BACKOFF = 5
+# Seconds after which a job still marked running is assumed abandoned and requeued
+JOB_STALE_AFTER = 600
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -126,9 +269,20 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
+    # 'users.authentication.ClaimsJWTAuthentication' skips the per-request user query (see users/authentication.py)
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    # Cursor-paginated listings; clients may pass ?page_size= up to 100
+    'DEFAULT_PAGINATION_CLASS': 'users.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
+    # Views with a throttle_scope are throttled by THROTTLE_RATES
+    'DEFAULT_THROTTLE_CLASSES': (
+        'users.throttling.TokenBucketThrottle',
+    ),
+    # Anonymous clients are told apart by REMOTE_ADDR; behind a proxy, the number of proxies
+    # adding to X-Forwarded-For. Unset, clients could pick their own with the header
+    'NUM_PROXIES': 0,
 }
 
 # Simple JWT settings
@@ -139,6 +293,14 @@ AUTH_USER_MODEL = 'users.User'
 
 from datetime import timedelta
 
+# Token blacklist front used by ClaimsJWTAuthentication (see users/authentication.py).
+# Seconds between reads of new blacklist rows, so logouts in other processes apply within this
+AUTH_BLACKLIST_SYNC_INTERVAL = 30
+# Blacklist filter hits remembered after being checked against the table
+AUTH_BLACKLIST_LRU_SIZE = 10000
+# Seconds between runs of the expired token compaction scheduled by `manage.py run_jobs`
+TOKEN_COMPACTION_INTERVAL = 60 * 60
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
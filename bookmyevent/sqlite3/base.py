@@ -0,0 +1,32 @@
+"""
+The SQLite backend, tuned for many concurrent writers.
+
+Adds two settings to OPTIONS, which Django 4.2's backend doesn't have:
+
+- `pragmas`, a dict of PRAGMA statements run on every new connection, for
+  WAL mode and friends.
+- `transaction_mode`: 'IMMEDIATE' begins each transaction by taking the
+  write lock, waiting up to `timeout` (SQLite's busy_timeout) for it. A
+  deferred transaction that reads before it writes has to upgrade its lock
+  mid-transaction, which fails at once with "database is locked" if
+  another connection wrote in between, whatever the timeout.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict['OPTIONS'].get('pragmas', {}).items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
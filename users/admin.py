@@ -8,6 +8,7 @@ class EventAdmin(admin.ModelAdmin):
     list_display = ('title', 'date', 'time', 'location', 'available_tickets', 'created_by')
     search_fields = ('title', 'location')
     list_filter = ('date', 'location')
+    list_select_related = ('created_by',)
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
@@ -18,4 +19,6 @@ class UserAdmin(admin.ModelAdmin):
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'event', 'number_of_tickets', 'created_at')
-    list_filter = ('user', 'event', 'created_at')
\ No newline at end of file
+    list_filter = ('user', 'event', 'created_at')
+    # The changelist renders user and event for every row
+    list_select_related = ('user', 'event')
\ No newline at end of file
@@ -0,0 +1,210 @@
+"""
+JWT authentication that trusts the token's claims instead of loading the user.
+
+`JWTAuthentication` reads the User row on every request, although the views
+only need the user's id and role. Tokens issued by LoginView carry `role`,
+`is_staff` and `session`, the jti of the refresh token they were issued
+with. `ClaimsJWTAuthentication` builds a user object from those, so an
+authenticated request costs no query for the user.
+
+A stateless token stays valid after logout, so each session is checked
+against the refresh token blacklist. The check goes through `blacklist`, a
+Bloom filter of blacklisted jtis that each process tops up from the table
+every AUTH_BLACKLIST_SYNC_INTERVAL seconds. A session missing from the
+filter was not revoked when it was last synced, which answers almost every
+lookup without a query; the rare hit is confirmed against the table and
+remembered. Logouts in this process apply at once, those in others within
+the sync interval.
+
+Blacklisted and outstanding tokens are useless once expired, and
+`compact_tokens` deletes them so the tables stay bounded.
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .models import User
+
+CLAIMS = ('role', 'is_staff', 'session')
+
+# Blacklist rows re-read on each sync, so a row committed after ones with
+# higher ids (possible on databases without serialized writes) isn't missed
+SYNC_OVERLAP = 1000
+
+
+class BloomFilter:
+    """A set of strings with false positives (at about `error_rate`) but no false negatives."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + index * second) % self.size for index in range(self.hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class Blacklist:
+    """Blacklisted refresh token jtis, as seen by this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """Forget everything; the next lookup rebuilds from the table."""
+        with self.lock:
+            self.filter = None
+            self.last_id = 0
+            self.synced_at = None
+            # jti -> revoked, for filter hits confirmed against the table
+            self.confirmed = OrderedDict()
+
+    def _rows(self, after_id=0):
+        return BlacklistedToken.objects.filter(id__gt=after_id).order_by('id').values_list('id', 'token__jti')
+
+    def _rebuild(self):
+        # Room to double before the next rebuild
+        fresh = BloomFilter(capacity=max(2 * BlacklistedToken.objects.count(), 10000))
+        last_id = 0
+        for row_id, jti in self._rows().iterator(chunk_size=5000):
+            fresh.add(jti)
+            last_id = row_id
+        with self.lock:
+            self.filter, self.last_id, self.synced_at = fresh, last_id, time.monotonic()
+            self.confirmed.clear()
+
+    def _sync(self):
+        rows = list(self._rows(max(self.last_id - SYNC_OVERLAP, 0)))
+        if self.filter.count + len(rows) > self.filter.capacity:
+            return self._rebuild()
+        with self.lock:
+            for row_id, jti in rows:
+                if row_id > self.last_id:
+                    self.filter.add(jti)
+                    self.last_id = row_id
+                if jti in self.confirmed:
+                    self.confirmed[jti] = True
+            self.synced_at = time.monotonic()
+
+    def ensure_synced(self):
+        if self.filter is None:
+            with self.sync_lock:
+                if self.filter is None:
+                    self._rebuild()
+            return
+        # A lookup that finds another thread syncing uses the filter as it is
+        if time.monotonic() - self.synced_at > settings.AUTH_BLACKLIST_SYNC_INTERVAL and self.sync_lock.acquire(blocking=False):
+            try:
+                self._sync()
+            finally:
+                self.sync_lock.release()
+
+    def __contains__(self, jti):
+        self.ensure_synced()
+        if jti not in self.filter:
+            return False
+
+        with self.lock:
+            revoked = self.confirmed.get(jti)
+            if revoked is not None:
+                self.confirmed.move_to_end(jti)
+                return revoked
+        revoked = BlacklistedToken.objects.filter(token__jti=jti).exists()
+        self._remember(jti, revoked)
+        return revoked
+
+    def _remember(self, jti, revoked):
+        with self.lock:
+            self.confirmed[jti] = revoked
+            self.confirmed.move_to_end(jti)
+            while len(self.confirmed) > settings.AUTH_BLACKLIST_LRU_SIZE:
+                self.confirmed.popitem(last=False)
+
+    def add(self, jti):
+        """Record a jti this process just blacklisted."""
+        with self.lock:
+            if self.filter is not None:
+                self.filter.add(jti)
+        self._remember(jti, True)
+
+
+blacklist = Blacklist()
+
+
+def session_revoked(session):
+    """Whether the refresh token with jti `session` has been blacklisted."""
+    return session in blacklist
+
+
+def revoke_session(session):
+    # The blacklist row is written by the caller; this only saves waiting for the next sync
+    transaction.on_commit(partial(blacklist.add, session))
+
+
+def revoke_user_sessions(user):
+    """Blacklist every refresh token issued to `user`, so tokens carrying their old claims stop working."""
+    for token in OutstandingToken.objects.filter(user=user, blacklistedtoken__isnull=True):
+        BlacklistedToken.objects.get_or_create(token=token)
+        revoke_session(token.jti)
+
+
+def compact_tokens(batch_size=1000):
+    """
+    Delete outstanding tokens that have expired, with their blacklist rows,
+    one short transaction per batch. Returns the number of tokens deleted.
+    """
+    # Expired tokens fail validation before the blacklist is consulted
+    expired = OutstandingToken.objects.filter(expires_at__lte=timezone.now())
+    deleted = 0
+    while True:
+        # Tokens expire roughly in insertion order, so these are found near the start of the table
+        batch = list(expired.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not batch:
+            return deleted
+        with transaction.atomic():
+            BlacklistedToken.objects.filter(token_id__in=batch).delete()
+            deleted += OutstandingToken.objects.filter(id__in=batch).delete()[0]
+
+
+class ClaimsUser(TokenUser):
+    @cached_property
+    def id(self):
+        # simplejwt writes the user id claim as a string
+        return User._meta.pk.to_python(self.token[api_settings.USER_ID_CLAIM])
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if not all(claim in validated_token for claim in CLAIMS):
+            # Issued before tokens carried these claims
+            return super().get_user(validated_token)
+        if session_revoked(validated_token['session']):
+            raise InvalidToken('Token has been revoked.', code='token_revoked')
+        return ClaimsUser(validated_token)
@@ -0,0 +1,272 @@
+"""
+Live ticket availability for server-sent event streams.
+
+Inventory writes call `publish`, which marks the event changed once the
+transaction commits. Each process runs one broker: every
+AVAILABILITY_STREAM_INTERVAL seconds it reads the tickets left for all
+events changed since the last tick in a single query and hands each
+subscriber the ones it follows, so a burst of bookings reaches a client as
+one message per interval however many tickets were sold.
+
+Under ASGI, `StreamHandler` serves streams ahead of Django's request
+handling, so an idle subscriber costs a coroutine rather than a request
+thread. The broker only sees writes made in its own process. With
+AVAILABILITY_STREAM_FANOUT it also polls the cache versions that
+`caching.invalidate_event` bumps, which catches writes from every process
+sharing the cache backend.
+"""
+import asyncio
+import contextvars
+import io
+import json
+import threading
+import time
+from collections import defaultdict
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import DisallowedHost
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.urls import reverse
+
+from . import caching
+from .models import Event
+
+
+HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+def parse_event_ids(value):
+    """Event ids from a comma-separated `value`, raising ValueError with a message for the client."""
+    try:
+        event_ids = list(dict.fromkeys(int(event_id) for event_id in value.split(',')))
+    except ValueError:
+        raise ValueError("Query parameter 'events' must be a comma-separated list of event ids.")
+    if len(event_ids) > settings.AVAILABILITY_STREAM_MAX_EVENTS:
+        raise ValueError(f"At most {settings.AVAILABILITY_STREAM_MAX_EVENTS} events can be followed per stream.")
+    return event_ids
+
+
+def current_availability(event_ids):
+    """{event id: tickets left} for each of `event_ids`, with None for events that no longer exist."""
+    events = Event.objects.with_inventory().filter(id__in=event_ids).only('id', 'available_tickets', 'shard_count')
+    tickets = {event.id: event.total_available_tickets for event in events}
+    return {event_id: tickets.get(event_id) for event_id in event_ids}
+
+
+class Subscription:
+    def __init__(self, event_ids):
+        self.event_ids = event_ids
+        self.changes = {}
+        self.ready = asyncio.Event()
+
+    def push(self, changes):
+        self.changes.update(changes)
+        self.ready.set()
+
+    async def next(self, timeout):
+        """Changes pushed since the last call, or {} if none arrive within `timeout` seconds."""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return {}
+        self.ready.clear()
+        changes, self.changes = self.changes, {}
+        return changes
+
+
+class Broker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # event id -> subscriptions following it
+        self.subscriptions = {}
+        self.changed = set()
+        # event id -> cache version last seen, for fan-out
+        self.versions = {}
+        self.task = None
+
+    def notify(self, event_id):
+        """Mark `event_id` changed. Safe to call from any thread."""
+        with self.lock:
+            if event_id in self.subscriptions:
+                self.changed.add(event_id)
+
+    def subscribe(self, event_ids):
+        """Follow `event_ids`. Must be called from the event loop serving the stream."""
+        subscription = Subscription(event_ids)
+        with self.lock:
+            for event_id in event_ids:
+                self.subscriptions.setdefault(event_id, set()).add(subscription)
+
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.task.get_loop() is not loop:
+            # A fresh context keeps the flusher out of the subscribing
+            # request's thread-sensitive context, which ends with the request
+            self.task = loop.create_task(self.run(), context=contextvars.Context())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for event_id in subscription.event_ids:
+                followers = self.subscriptions.get(event_id, set())
+                followers.discard(subscription)
+                if not followers:
+                    self.subscriptions.pop(event_id, None)
+                    self.versions.pop(event_id, None)
+
+    async def run(self):
+        while self.subscriptions:
+            await asyncio.sleep(settings.AVAILABILITY_STREAM_INTERVAL)
+            await self.flush()
+
+    async def flush(self):
+        """Push the availability of every event changed since the last flush to its subscribers."""
+        with self.lock:
+            changed, self.changed = self.changed, set()
+            followed = list(self.subscriptions)
+        if settings.AVAILABILITY_STREAM_FANOUT and followed:
+            changed |= await sync_to_async(self.changed_elsewhere)(followed)
+        if not changed:
+            return
+
+        tickets = await sync_to_async(current_availability)(changed)
+        updates = defaultdict(dict)
+        with self.lock:
+            for event_id, available in tickets.items():
+                for subscription in self.subscriptions.get(event_id, ()):
+                    updates[subscription][event_id] = available
+        for subscription, changes in updates.items():
+            subscription.push(changes)
+
+    def changed_elsewhere(self, event_ids):
+        """Those of `event_ids` whose cache version moved since the last call."""
+        versions = dict(zip(event_ids, caching.get_versions([f'event:{event_id}' for event_id in event_ids])))
+        with self.lock:
+            changed = {event_id for event_id, version in versions.items() if self.versions.get(event_id, version) != version}
+            self.versions.update((event_id, version) for event_id, version in versions.items() if event_id in self.subscriptions)
+        return changed
+
+
+broker = Broker()
+
+
+def publish(event_id):
+    """Tell subscribers `event_id`'s inventory changed once the current transaction commits."""
+    transaction.on_commit(partial(broker.notify, event_id))
+
+
+def _message(name, data):
+    return f'event: {name}\ndata: {json.dumps(data)}\n\n'
+
+
+def render(changes):
+    """Server-sent events reporting `changes`, a {event id: tickets left or None} mapping."""
+    available = [
+        {'event_id': event_id, 'available_tickets': tickets}
+        for event_id, tickets in changes.items() if tickets is not None
+    ]
+    deleted = [event_id for event_id, tickets in changes.items() if tickets is None]
+    messages = []
+    if available:
+        messages.append(_message('availability', available))
+    if deleted:
+        messages.append(_message('deleted', deleted))
+    return ''.join(messages)
+
+
+def retry_field():
+    return f'retry: {settings.AVAILABILITY_STREAM_RETRY}\n\n'
+
+
+async def stream(event_ids):
+    """
+    Server-sent events for `event_ids`: their current availability, then
+    each change until every event is deleted or the stream has been open
+    AVAILABILITY_STREAM_MAX_AGE seconds. Clients reconnect after that, so a
+    subscriber whose connection dropped unnoticed doesn't linger.
+    """
+    # Subscribe before reading the snapshot so no change can slip in between
+    subscription = broker.subscribe(event_ids)
+    try:
+        yield retry_field()
+        deadline = time.monotonic() + settings.AVAILABILITY_STREAM_MAX_AGE
+        sent = {}
+        changes = await sync_to_async(current_availability)(event_ids)
+        while True:
+            changes = {event_id: tickets for event_id, tickets in changes.items() if sent.get(event_id, -1) != tickets}
+            if changes:
+                sent.update(changes)
+                yield render(changes)
+            if all(sent.get(event_id, 0) is None for event_id in event_ids):
+                return
+
+            timeout = min(settings.AVAILABILITY_STREAM_HEARTBEAT, deadline - time.monotonic())
+            if timeout <= 0:
+                return
+            changes = await subscription.next(timeout)
+            if not changes:
+                yield ': keepalive\n\n'
+    finally:
+        broker.unsubscribe(subscription)
+
+
+class StreamHandler:
+    """
+    ASGI application serving valid availability stream requests itself and
+    passing everything else to `application`.
+
+    Django's handler keeps a thread and the request's middleware state for
+    every open stream, and only notices a client left when a write fails.
+    Here a stream is a coroutine, and it ends as soon as the server reports
+    the disconnect.
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.path = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            if self.path is None:
+                self.path = reverse('event-availability')
+            if scope['path'] == self.path:
+                event_ids = self.event_ids(scope)
+                if event_ids is not None:
+                    return await self.stream(event_ids, receive, send)
+        # Invalid requests get Django's error responses
+        return await self.application(scope, receive, send)
+
+    @staticmethod
+    def event_ids(scope):
+        request = ASGIRequest(scope, io.BytesIO())
+        try:
+            request.get_host()
+            return parse_event_ids(request.GET.get('events', ''))
+        except (DisallowedHost, ValueError):
+            return None
+
+    async def stream(self, event_ids, receive, send):
+        headers = [(b'content-type', b'text/event-stream')]
+        headers += [(name.lower().encode(), value.encode()) for name, value in HEADERS.items()]
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+
+        async def pump():
+            async for message in stream(event_ids):
+                await send({'type': 'http.response.body', 'body': message.encode(), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+
+        async def disconnected():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        tasks = [asyncio.ensure_future(pump()), asyncio.ensure_future(disconnected())]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            # Cancelling the stream unsubscribes it
+            for task in tasks:
+                task.cancel()
+        for task in done:
+            task.result()
@@ -0,0 +1,133 @@
+"""
+Streaming bulk import and export of events, behind `manage.py import_events`
+and `manage.py export_events`.
+
+Files are CSV or JSON Lines with the fields of EventSerializer, as the API
+renders them, so an export imports back as is. Both directions hold one
+batch in memory at a time, whatever the size of the file. Imported rows get
+the same validation as `POST events/` and each batch is written with
+bulk_create in the transaction that advances its ImportCheckpoint, so an
+interrupted import resumes after the last batch that committed, without
+duplicating or skipping rows.
+
+bulk_create sends no post_save signals. The import bumps the listing cache
+versions and adds the events to the calendar counts itself; the search
+index of a running server only sees imported events after its next rebuild
+(see SEARCH_INDEX_REFRESH).
+"""
+import csv
+import json
+from itertools import islice
+
+from django.db import reset_queries, transaction
+from rest_framework.exceptions import ValidationError
+
+from . import caching, calendar_index
+from .models import Event, ImportCheckpoint
+from .serializers import EventSerializer, FastEventSerializer
+
+EXTENSIONS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+
+def detect_format(path):
+    for extension, format in EXTENSIONS.items():
+        if path.endswith(extension):
+            return format
+    raise ValueError(f"Can't tell the format of {path}; use a .csv or .jsonl name or pass --format.")
+
+
+def read_rows(file, format):
+    """Each record in `file`. Lines that aren't valid JSON come through as strings and fail validation."""
+    if format == 'csv':
+        # CSV has no null; the export writes None as an empty cell. Other
+        # fields keep theirs, to be rejected as blank
+        nullable = {name for name, field in EventSerializer().fields.items() if field.allow_null}
+        for row in csv.DictReader(file):
+            yield {name: None if value == '' and name in nullable else value for name, value in row.items()}
+        return
+    for line in file:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield line
+
+
+def import_events(file, format, created_by, checkpoint=None, resume=False, batch_size=1000, errors=None, progress=None):
+    """
+    Create an event owned by `created_by` for every valid row of `file`.
+    Returns (imported, rejected).
+
+    Each rejected row is written to `errors` as a JSON line with its row
+    number and validation errors. `checkpoint` names the ImportCheckpoint
+    recording progress; with `resume` the import carries on from it instead
+    of starting over. `progress(rows, imported, rejected)` is called after
+    every batch.
+    """
+    start = 0
+    if checkpoint is not None:
+        state, _ = ImportCheckpoint.objects.get_or_create(name=checkpoint)
+        if resume:
+            start = state.rows_done
+        elif state.rows_done:
+            ImportCheckpoint.objects.filter(name=checkpoint).update(rows_done=0)
+
+    # Rows a previous run committed are read again only to find where to carry on
+    rows = islice(enumerate(read_rows(file, format), start=1), start, None)
+    serializer = EventSerializer()
+    imported = rejected = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+
+        events, failures = [], []
+        for number, row in batch:
+            try:
+                events.append(Event(created_by=created_by, **serializer.run_validation(row)))
+            except ValidationError as exc:
+                failures.append({'row': number, 'errors': exc.detail})
+
+        last_row = batch[-1][0]
+        with transaction.atomic():
+            Event.objects.bulk_create(events)
+            calendar_index.events_added(events)
+            if checkpoint is not None:
+                ImportCheckpoint.objects.filter(name=checkpoint).update(rows_done=last_row)
+
+        # Failures are recorded once their batch has committed, so a resumed import doesn't repeat them
+        if errors is not None:
+            errors.writelines(json.dumps(failure) + '\n' for failure in failures)
+        caching.bump(name for event in events for name in caching.event_version_names(
+            None, event.location, event.category, event.date
+        ))
+        imported += len(events)
+        rejected += len(failures)
+        # Under DEBUG every batch's INSERT would stay in the query log, and they are large
+        reset_queries()
+        if progress is not None:
+            progress(last_row, imported, rejected)
+
+    if checkpoint is not None:
+        ImportCheckpoint.objects.filter(name=checkpoint).delete()
+    return imported, rejected
+
+
+def export_events(file, format, chunk_size=2000):
+    """Write every event to `file` as the API renders it, oldest first. Returns the number written."""
+    _, names, _ = FastEventSerializer.compile()
+    if format == 'csv':
+        writer = csv.DictWriter(file, fieldnames=names)
+        writer.writeheader()
+        write = writer.writerows
+    else:
+        def write(items):
+            file.writelines(json.dumps(item) + '\n' for item in items)
+
+    rows = FastEventSerializer.values(Event.objects.with_inventory().order_by('id')).iterator(chunk_size=chunk_size)
+    exported = 0
+    while chunk := list(islice(rows, chunk_size)):
+        write(FastEventSerializer(chunk).data)
+        exported += len(chunk)
+    return exported
@@ -0,0 +1,180 @@
+"""
+Versioned read-through cache for serialized event detail and listing pages.
+
+Cached entries are never deleted. Each key embeds version counters instead:
+one per event for detail pages, and one per filter value (location,
+category, date) for listings, plus an "all" version for unfiltered
+listings. A listing over a date range of up to RANGE_VERSION_MAX_DAYS days
+is under the version of each date in it. A write bumps only the versions it
+can affect, so stale entries become unreachable and age out under
+EVENT_CACHE_TIMEOUT.
+
+Bookings and released tickets bump only the event's own version, through
+`invalidate_tickets`. Listing pages therefore keep the ticket counts they
+were built with until they expire, after at most
+EVENT_LISTING_CACHE_TIMEOUT. Otherwise every booking during an on-sale
+would rebuild every listing page that shows the event. The detail page,
+seat map and tiers are always current.
+"""
+import datetime
+import hashlib
+import threading
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+KEY_PREFIX = 'events'
+LISTING_FILTERS = ('location', 'category', 'date')
+# Longer date ranges are only under the versions of the other filters, or "all"
+RANGE_VERSION_MAX_DAYS = 31
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def stats():
+    """Hit/miss counters for this process."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _count(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def _version_key(name):
+    return f'{KEY_PREFIX}:v:{name}'
+
+
+def get_versions(names):
+    """Current version of each name, creating missing ones."""
+    keys = [_version_key(name) for name in names]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Seed with the clock rather than 1 so an evicted counter can't
+            # come back at a value older entries were stored under
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump(names):
+    for name in set(names):
+        key = _version_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def event_version_names(event_id=None, location=None, category=None, date=None):
+    names = ['all']
+    if event_id is not None:
+        names.append(f'event:{event_id}')
+    if location:
+        names.append(f'location:{location}')
+    if category:
+        names.append(f'category:{category}')
+    if date:
+        names.append(f'date:{date}')
+    return names
+
+
+def affected_versions(event, previous=None):
+    """
+    Every version `event` appears under. `previous` holds the field values
+    the event was loaded with, so an update also covers the listings it
+    moved out of.
+    """
+    names = event_version_names(event.id, event.location, event.category, event.date)
+    if previous:
+        names += event_version_names(
+            None, previous.get('location'), previous.get('category'), previous.get('date')
+        )
+    return names
+
+
+def invalidate_event(event, previous=None):
+    """
+    Bump the versions of `event` now and again once the current transaction
+    commits, so a page rebuilt from pre-commit data in between is dropped too.
+    """
+    names = affected_versions(event, previous)
+    bump(names)
+    transaction.on_commit(partial(bump, names))
+
+
+def invalidate_tickets(event):
+    """
+    `invalidate_event` for a change to the event's tickets alone, which only
+    its own pages show live.
+    """
+    names = [f'event:{event.id}']
+    bump(names)
+    transaction.on_commit(partial(bump, names))
+
+
+def listing_version_names(params):
+    names = [f'{field}:{params[field]}' for field in LISTING_FILTERS if params.get(field)]
+    if not params.get('date'):
+        names += [f'date:{day}' for day in _range_days(params.get('date_from'), params.get('date_to'))]
+    return names or ['all']
+
+
+def _range_days(date_from, date_to):
+    """The days from `date_from` to `date_to`, or none if the range is open, invalid or long."""
+    try:
+        first, last = datetime.date.fromisoformat(date_from), datetime.date.fromisoformat(date_to)
+    except (TypeError, ValueError):
+        return []
+    if not 0 <= (last - first).days < RANGE_VERSION_MAX_DAYS:
+        return []
+    return [first + datetime.timedelta(days=offset) for offset in range((last - first).days + 1)]
+
+
+def _entry_key(kind, identity, version_names):
+    versions = get_versions(version_names)
+    digest = hashlib.sha1(repr((identity, versions)).encode()).hexdigest()
+    return f'{KEY_PREFIX}:{kind}:{digest}'
+
+
+def read_through(kind, identity, version_names, build, timeout=None):
+    """
+    Return the cached value for `identity` under the current versions of
+    `version_names`, calling `build()` and caching its result on a miss, for
+    `timeout` seconds or EVENT_CACHE_TIMEOUT. Returns (value, hit).
+    """
+    key = _entry_key(kind, identity, version_names)
+    value = cache.get(key)
+    if value is not None:
+        _count('hits')
+        return value, True
+
+    _count('misses')
+    value = build()
+    cache.set(key, value, timeout=timeout or settings.EVENT_CACHE_TIMEOUT)
+    return value, False
+
+
+async def aread_through(kind, identity, version_names, build, timeout=None):
+    """
+    `read_through` for async views, where `build` is a coroutine function.
+
+    The cache is called synchronously: the configured LocMem backend never
+    waits on I/O, and its async methods would only add a thread hop.
+    """
+    key = _entry_key(kind, identity, version_names)
+    value = cache.get(key)
+    if value is not None:
+        _count('hits')
+        return value, True
+
+    _count('misses')
+    value = await build()
+    cache.set(key, value, timeout=timeout or settings.EVENT_CACHE_TIMEOUT)
+    return value, False
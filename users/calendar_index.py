@@ -0,0 +1,99 @@
+"""
+Per-day event counts for calendar widgets.
+
+Counting a month of events by day, city and category from the Event table
+reads every event in the month. EventDayCount keeps those counts instead,
+one row per day, city and category that has had events, and the calendar
+reads a date range of it off its unique index: a few hundred rows for a
+month, however many events there are.
+
+Every Event save and delete adds its +1 or -1 to the counts in the same
+transaction, as the post_save and post_delete handlers in users/signals.py
+call `event_saved` and `event_deleted`. An event moved to another day, city
+or category comes off the old count and goes on the new one. Imports,
+which bypass the signals, call `events_added` themselves. `rebuild`
+recomputes everything from the Event table, for `manage.py
+rebuild_calendar` after events were written some other way.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, When
+
+from .models import Event, EventDayCount
+
+FIELDS = ('date', 'location', 'category')
+
+
+def _key(date, location, category):
+    # Dates may still be the strings they were assigned as
+    return Event._meta.get_field('date').to_python(date), location, category
+
+
+def event_saved(event, previous=None, created=False):
+    """
+    Count a saved event. `previous` holds the values an updated event was
+    loaded with; without them the update is taken to have moved nothing.
+    """
+    key = _key(event.date, event.location, event.category)
+    if created:
+        _apply({key: 1})
+    elif previous and all(field in previous for field in FIELDS):
+        old = _key(*(previous[field] for field in FIELDS))
+        if old != key:
+            _apply({old: -1, key: 1})
+
+
+def event_deleted(event):
+    _apply({_key(event.date, event.location, event.category): -1})
+
+
+def events_added(events):
+    changes = {}
+    for event in events:
+        key = _key(event.date, event.location, event.category)
+        changes[key] = changes.get(key, 0) + 1
+    _apply(changes)
+
+
+def _apply(changes):
+    """Add `changes`, {(date, location, category): delta}, creating rows as needed."""
+    if not changes:
+        return
+    rows = EventDayCount.objects.filter(reduce(or_, (Q(**dict(zip(FIELDS, key))) for key in changes)))
+    if len(changes) == 1:
+        delta, = changes.values()
+        values = {'events': F('events') + delta}
+        # Usually the row exists and this is the only query
+        if rows.update(**values):
+            return
+    else:
+        values = {'events': Case(
+            *(When(**dict(zip(FIELDS, key)), then=F('events') + delta) for key, delta in changes.items()),
+            default=F('events'),
+            output_field=EventDayCount._meta.get_field('events'),
+        )}
+    EventDayCount.objects.bulk_create([EventDayCount(**dict(zip(FIELDS, key))) for key in changes], ignore_conflicts=True)
+    rows.update(**values)
+
+
+def histogram(date_from, date_to, location=None, category=None):
+    """The counts from `date_from` to `date_to`, as (date, location, category, events) rows."""
+    rows = EventDayCount.objects.filter(date__gte=date_from, date__lte=date_to, events__gt=0)
+    if location:
+        rows = rows.filter(location=location)
+    if category:
+        rows = rows.filter(category=category)
+    return rows.order_by(*FIELDS).values_list(*FIELDS, 'events')
+
+
+def rebuild():
+    """Recompute every count from the Event table. Returns the number of rows written."""
+    with transaction.atomic():
+        # Event writes update these rows in their own transaction, so locking
+        # them first waits for those in flight to commit
+        list(EventDayCount.objects.select_for_update().values_list('id'))
+        EventDayCount.objects.all().delete()
+        counts = Event.objects.values(*FIELDS).annotate(events=Count('id')).order_by()
+        return len(EventDayCount.objects.bulk_create([EventDayCount(**row) for row in counts], batch_size=1000))
@@ -0,0 +1,114 @@
+"""
+`Idempotency-Key` support for unsafe endpoints that clients retry.
+
+The first request with a key runs the view and its response is stored in
+the cache for IDEMPOTENCY_KEY_TTL seconds. Later requests with the same key
+get that response replayed without touching the database. Duplicates that
+arrive while the first request is still running wait for its result
+instead of running the transaction again. Server errors and 429s are not
+stored: they tell the client to retry, and a retry with the same key runs
+the view again.
+"""
+import hashlib
+import json
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+
+# Requests running in this process, by cache key, so local duplicates can
+# wait on an event rather than poll the cache
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {request.path} {body}'.encode()).hexdigest()
+
+
+def _replay(stored, fingerprint):
+    if stored['fingerprint'] != fingerprint:
+        return Response(
+            {"error": f"{HEADER} has already been used for a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return Response(stored['data'], status=stored['status'], headers={'Idempotent-Replayed': 'true'})
+
+
+def _storable(response):
+    return response.status_code < 500 and response.status_code != status.HTTP_429_TOO_MANY_REQUESTS
+
+
+def _wait_for(cache_key, local_event):
+    """Wait for the request holding `cache_key` to store its response."""
+    deadline = time.monotonic() + settings.IDEMPOTENCY_IN_FLIGHT_TIMEOUT
+    if local_event is not None:
+        local_event.wait(settings.IDEMPOTENCY_IN_FLIGHT_TIMEOUT)
+    while True:
+        stored = cache.get(cache_key)
+        if stored is not None or cache.get(f'{cache_key}:lock') is None or time.monotonic() > deadline:
+            return stored
+        time.sleep(POLL_INTERVAL)
+
+
+def idempotent(view_method):
+    """Make an APIView handler honour the `Idempotency-Key` request header."""
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({"error": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Keys are scoped to the user and endpoint so clients can't collide
+        cache_key = 'idempotency:' + hashlib.sha256(f'{request.user.pk}:{request.path}:{key}'.encode()).hexdigest()
+        fingerprint = _fingerprint(request)
+
+        while True:
+            stored = cache.get(cache_key)
+            if stored is not None:
+                return _replay(stored, fingerprint)
+
+            with _in_flight_lock:
+                local_event = _in_flight.get(cache_key)
+                owner = local_event is None and cache.add(
+                    f'{cache_key}:lock', True, timeout=settings.IDEMPOTENCY_IN_FLIGHT_TIMEOUT
+                )
+                if owner:
+                    local_event = _in_flight[cache_key] = threading.Event()
+
+            if owner:
+                break
+
+            stored = _wait_for(cache_key, local_event)
+            if stored is not None:
+                return _replay(stored, fingerprint)
+            if cache.get(f'{cache_key}:lock') is not None:
+                return Response({"error": "A request with this Idempotency-Key is still in progress."}, status=status.HTTP_409_CONFLICT)
+            # The original request failed without storing a response; try again
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+            if _storable(response):
+                cache.set(cache_key, {
+                    'fingerprint': fingerprint,
+                    'status': response.status_code,
+                    'data': response.data,
+                }, timeout=settings.IDEMPOTENCY_KEY_TTL)
+            return response
+        finally:
+            cache.delete(f'{cache_key}:lock')
+            with _in_flight_lock:
+                _in_flight.pop(cache_key).set()
+
+    return wrapper
@@ -0,0 +1,190 @@
+"""
+A small database-backed job queue for work that doesn't belong on the
+request path.
+
+Jobs are rows in the Job table, so enqueueing inside a transaction makes
+the job commit (or roll back) together with the change that caused it.
+Workers claim a job with a conditional UPDATE, run the handler registered
+for its type, and retry failures with exponential backoff.
+
+    @jobs.handler('refund_booking')
+    def refund_booking(booking_id): ...
+
+    jobs.enqueue('refund_booking', {'booking_id': 1}, idempotency_key='refund:1')
+"""
+import logging
+import random
+import threading
+import time
+import traceback
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+def handler(job_type):
+    """Register the decorated function to run jobs of `job_type` with their payload as kwargs."""
+    def register(func):
+        _handlers[job_type] = func
+        return func
+    return register
+
+
+def enqueue(job_type, payload=None, idempotency_key=None, delay=None):
+    """
+    Queue a job and return it. With an `idempotency_key`, a job already
+    queued under the same key is returned instead of a new one.
+    """
+    if job_type not in _handlers:
+        raise ValueError(f'No handler registered for job type {job_type!r}.')
+
+    fields = {
+        'job_type': job_type,
+        'payload': payload or {},
+        'max_attempts': settings.JOB_MAX_ATTEMPTS,
+        'run_after': timezone.now() + (delay or timedelta()),
+    }
+    if idempotency_key is None:
+        return Job.objects.create(**fields)
+    job, _ = Job.objects.get_or_create(idempotency_key=idempotency_key, defaults=fields)
+    return job
+
+
+class Metrics:
+    """Per job type counters and run time, for throughput reporting."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.counters = defaultdict(lambda: {'done': 0, 'retried': 0, 'failed': 0, 'seconds': 0.0})
+
+    def record(self, job_type, outcome, seconds):
+        with self.lock:
+            counters = self.counters[job_type]
+            counters[outcome] += 1
+            counters['seconds'] += seconds
+
+    def snapshot(self):
+        with self.lock:
+            elapsed = time.monotonic() - self.started
+            return {
+                job_type: dict(counters, per_second=counters['done'] / elapsed if elapsed else 0.0)
+                for job_type, counters in self.counters.items()
+            }
+
+
+metrics = Metrics()
+
+
+def backoff(attempts):
+    """Seconds to wait before retry number `attempts`, doubling each time with jitter."""
+    delay = settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1)
+    return delay * random.uniform(0.5, 1.5)
+
+
+def claim(limit):
+    """Claim up to `limit` due jobs for this worker."""
+    now = timezone.now()
+    candidates = Job.objects.filter(status=Job.QUEUED, run_after__lte=now).order_by('run_after', 'id')
+    claimed = []
+    for job_id in candidates.values_list('id', flat=True)[:limit]:
+        # Whoever flips the status first owns the job
+        if Job.objects.filter(id=job_id, status=Job.QUEUED).update(
+            status=Job.RUNNING, attempts=F('attempts') + 1, updated_at=now
+        ):
+            claimed.append(job_id)
+    return list(Job.objects.filter(id__in=claimed))
+
+
+def run_job(job):
+    """Run one claimed job and record its outcome."""
+    started = time.monotonic()
+    try:
+        # Handlers manage their own transactions, so slow external calls
+        # don't have to hold database locks
+        _handlers[job.job_type](**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            outcome = 'retried'
+            Job.objects.filter(id=job.id).update(
+                status=Job.QUEUED, last_error=error, updated_at=timezone.now(),
+                run_after=timezone.now() + timedelta(seconds=backoff(job.attempts)),
+            )
+        else:
+            outcome = 'failed'
+            Job.objects.filter(id=job.id).update(status=Job.FAILED, last_error=error, updated_at=timezone.now())
+        logger.warning('Job %s (%s) attempt %s failed', job.id, job.job_type, job.attempts, exc_info=True)
+    else:
+        outcome = 'done'
+        Job.objects.filter(id=job.id).update(status=Job.DONE, updated_at=timezone.now())
+    metrics.record(job.job_type, outcome, time.monotonic() - started)
+    return outcome
+
+
+def requeue_stale():
+    """Put back jobs left running by a worker that died mid-job."""
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_STALE_AFTER)
+    return Job.objects.filter(status=Job.RUNNING, updated_at__lt=cutoff).update(status=Job.QUEUED)
+
+
+def run_pending(limit=None):
+    """
+    Run every due job in the calling thread and return how many ran.
+    Used by tests and one-off drains; `Worker` is the long-running form.
+    """
+    ran = 0
+    while limit is None or ran < limit:
+        batch = claim(100 if limit is None else min(100, limit - ran))
+        if not batch:
+            return ran
+        for job in batch:
+            run_job(job)
+        ran += len(batch)
+    return ran
+
+
+class Worker:
+    """Claims due jobs and runs them on a thread pool until stopped."""
+
+    def __init__(self, concurrency=4, poll_interval=1.0):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.stopping = threading.Event()
+
+    def _run(self, job):
+        try:
+            return run_job(job)
+        finally:
+            connection.close()
+
+    def run(self, once=False):
+        last_stale_check = 0.0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while not self.stopping.is_set():
+                close_old_connections()
+                if time.monotonic() - last_stale_check > settings.JOB_STALE_AFTER / 2:
+                    requeue_stale()
+                    last_stale_check = time.monotonic()
+
+                batch = claim(self.concurrency * 2)
+                if batch:
+                    wait([pool.submit(self._run, job) for job in batch])
+                elif once:
+                    return
+                else:
+                    self.stopping.wait(self.poll_interval)
+
+    def stop(self):
+        self.stopping.set()
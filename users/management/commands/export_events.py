@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users import bulk
+
+
+class Command(BaseCommand):
+    help = "Export every event to a CSV or JSON Lines file, streaming it in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='file to write (default: standard output)')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='defaults to the output extension, or jsonl')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        output = options['output']
+        format = options['format']
+        if format is None:
+            try:
+                format = bulk.detect_format(output) if output else 'jsonl'
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        started = time.monotonic()
+        if output:
+            with open(output, 'w', newline='', encoding='utf-8') as file:
+                exported = bulk.export_events(file, format, chunk_size=options['chunk_size'])
+        else:
+            exported = bulk.export_events(self.stdout, format, chunk_size=options['chunk_size'])
+
+        # Keep standard output clean for the data
+        elapsed = time.monotonic() - started
+        self.stderr.write(f'Exported {exported} event(s) in {elapsed:.1f} s ({exported / max(elapsed, 1e-9):.0f} events/s).')
@@ -0,0 +1,52 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users import bulk
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Import events from a CSV or JSON Lines file, validating and writing them in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--created-by', required=True, help='username of the event manager the events belong to')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--resume', action='store_true', help='carry on after the last batch a failed run committed')
+        parser.add_argument('--errors', help='where to write rejected rows (default: <path>.errors.jsonl)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            format = options['format'] or bulk.detect_format(path)
+        except ValueError as e:
+            raise CommandError(str(e))
+        try:
+            created_by = User.objects.get(username=options['created_by'], role=User.EVENT_MANAGER)
+        except User.DoesNotExist:
+            raise CommandError(f"{options['created_by']} is not an event manager.")
+
+        started = time.monotonic()
+
+        def progress(rows, imported, rejected):
+            self.stdout.write(f'{rows} rows read, {imported} imported, {rejected} rejected, '
+                              f'{imported / (time.monotonic() - started):.0f} events/s')
+
+        # Resumed runs append to the rejects of the earlier ones
+        with open(path, newline='', encoding='utf-8') as file, \
+                open(options['errors'] or f'{path}.errors.jsonl', 'a' if options['resume'] else 'w', encoding='utf-8') as errors:
+            imported, rejected = bulk.import_events(
+                file, format, created_by,
+                checkpoint=f'import_events:{os.path.abspath(path)}'[:255],
+                resume=options['resume'], batch_size=options['batch_size'], errors=errors, progress=progress,
+            )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} event(s), rejected {rejected}, in {elapsed:.1f} s ({imported / elapsed:.0f} events/s).'
+        ))
+        if rejected:
+            self.stdout.write(f"Rejected rows are listed in {errors.name}.")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from users.payments import process_pending_refunds
+
+
+class Command(BaseCommand):
+    help = "Issue refunds for cancelled bookings that were paid for."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        processed = process_pending_refunds(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Issued {processed} refund(s).'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users.calendar_index import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-day event counts behind events/calendar/ from the events."
+
+    def handle(self, *args, **options):
+        rows = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt calendar counts: {rows} day, city and category row(s).'))
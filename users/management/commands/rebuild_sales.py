@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from users.sales import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute every event's sales totals from its bookings, a batch of events at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt sales totals for {rebuilt} event(s).'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from users.reservations import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = "Cancel unpaid bookings whose hold has expired and release their tickets."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        released = release_expired_holds(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired hold(s).'))
@@ -0,0 +1,32 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from users import jobs
+from users.tasks import schedule_hold_sweep, schedule_token_compaction
+
+
+class Command(BaseCommand):
+    help = "Run background jobs (refunds, booking confirmations, hold expiry, token compaction) on a pool of worker threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--once', action='store_true', help='exit once no jobs are due')
+
+    def handle(self, *args, **options):
+        worker = jobs.Worker(concurrency=options['concurrency'], poll_interval=options['poll_interval'])
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: worker.stop())
+
+        # Expired ticket holds and tokens are cleared in-process by self-rescheduling jobs
+        schedule_hold_sweep()
+        schedule_token_compaction()
+        self.stdout.write(f"Running jobs with {options['concurrency']} worker thread(s).")
+        worker.run(once=options['once'])
+
+        for job_type, counters in sorted(jobs.metrics.snapshot().items()):
+            self.stdout.write(
+                f"{job_type}: {counters['done']} done, {counters['retried']} retried, "
+                f"{counters['failed']} failed, {counters['per_second']:.1f} jobs/s"
+            )
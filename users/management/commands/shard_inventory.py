@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import Event
+from users.reservations import shard_inventory
+
+
+class Command(BaseCommand):
+    help = "Split an event's ticket inventory across N counter rows to spread booking writes (0 or 1 unshards it)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_id', type=int)
+        parser.add_argument('shards', type=int)
+
+    def handle(self, *args, **options):
+        if options['shards'] < 0:
+            raise CommandError('shards must be zero or positive.')
+        try:
+            event = Event.objects.get(id=options['event_id'])
+        except Event.DoesNotExist:
+            raise CommandError(f"Event {options['event_id']} does not exist.")
+
+        try:
+            event = shard_inventory(event, options['shards'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f'"{event}" now has {event.shard_count or 1} inventory shard(s) holding {event.total_available_tickets} tickets.'
+        ))
@@ -0,0 +1,291 @@
+"""
+Per-view request metrics, served in the Prometheus text format at metrics/.
+
+MetricsMiddleware times every request and counts the queries it runs
+and the time they take, as well as the time spent rendering the response
+body. It records all of these against the view's URL name and the
+method, in this process's `registry`. Each process reports its own
+figures, as with the cache, job and throttling counters, which are
+exported alongside.
+
+Requests slower than METRICS_SLOW_REQUEST_THRESHOLD are logged with the
+plans of their slowest queries, at most once per view every
+METRICS_SLOW_SAMPLE_INTERVAL seconds so a slow endpoint can't flood the
+log or the database with EXPLAINs.
+
+Queries made by async views run in another thread and are not counted,
+so async requests add nothing to the query histogram and database time.
+"""
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+from . import caching, jobs, throttling
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'bookmyevent'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Slowest queries kept per request, for the slow request log
+SLOWEST_QUERIES = 3
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'WITH')
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # The last slot counts observations above every bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """(le, count) pairs, as Prometheus buckets are."""
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+        # status code -> requests
+        self.responses = {}
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            # (view, method) -> ViewMetrics
+            self.views = {}
+
+    def record(self, view, method, status, seconds, queries, db_seconds, render_seconds):
+        """`queries` and `db_seconds` are None for requests whose queries weren't counted."""
+        with self.lock:
+            metrics = self.views.get((view, method))
+            if metrics is None:
+                metrics = self.views[view, method] = ViewMetrics()
+            metrics.latency.observe(seconds)
+            if queries is not None:
+                metrics.queries.observe(queries)
+                metrics.db_seconds += db_seconds
+            metrics.render_seconds += render_seconds
+            metrics.responses[status] = metrics.responses.get(status, 0) + 1
+
+    def render(self):
+        """Everything recorded so far, with the cache and job counters, in the Prometheus text format."""
+        lines = []
+        # Held while formatting; a scrape takes well under a millisecond
+        with self.lock:
+            views = sorted(self.views.items())
+            family(lines, 'http_requests_total', 'counter', 'Requests served, by view, method and status.')
+            for (view, method), metrics in views:
+                for status, count in sorted(metrics.responses.items()):
+                    lines.append(f'{PREFIX}_http_requests_total{{{labels(view=view, method=method, status=status)}}} {count}')
+            family(lines, 'http_request_duration_seconds', 'histogram', 'Time from the request reaching the middleware to the response leaving it.')
+            for (view, method), metrics in views:
+                histogram(lines, 'http_request_duration_seconds', labels(view=view, method=method), metrics.latency)
+            family(lines, 'http_db_queries', 'histogram', 'Database queries per request.')
+            for (view, method), metrics in views:
+                histogram(lines, 'http_db_queries', labels(view=view, method=method), metrics.queries)
+            family(lines, 'http_db_seconds_total', 'counter', 'Time spent in database queries.')
+            for (view, method), metrics in views:
+                lines.append(f'{PREFIX}_http_db_seconds_total{{{labels(view=view, method=method)}}} {metrics.db_seconds:.6f}')
+            family(lines, 'http_render_seconds_total', 'counter', 'Time spent serializing response bodies.')
+            for (view, method), metrics in views:
+                lines.append(f'{PREFIX}_http_render_seconds_total{{{labels(view=view, method=method)}}} {metrics.render_seconds:.6f}')
+
+        family(lines, 'cache_requests_total', 'counter', 'Event cache lookups, by outcome.')
+        for outcome, count in sorted(caching.stats().items()):
+            lines.append(f'{PREFIX}_cache_requests_total{{{labels(outcome=outcome)}}} {count}')
+        job_counters = sorted(jobs.metrics.snapshot().items())
+        family(lines, 'jobs_total', 'counter', 'Background jobs run by this process, by type and outcome.')
+        for job_type, counters in job_counters:
+            for outcome in ('done', 'retried', 'failed'):
+                lines.append(f'{PREFIX}_jobs_total{{{labels(job_type=job_type, outcome=outcome)}}} {counters[outcome]}')
+        family(lines, 'job_seconds_total', 'counter', 'Time spent running background jobs.')
+        for job_type, counters in job_counters:
+            lines.append(f'{PREFIX}_job_seconds_total{{{labels(job_type=job_type)}}} {counters["seconds"]:.6f}')
+        family(lines, 'throttled_requests_total', 'counter', 'Requests refused by throttling, by scope and client.')
+        for (scope, client), count in sorted(throttling.rejections.snapshot().items()):
+            lines.append(f'{PREFIX}_throttled_requests_total{{{labels(scope=scope, client=client)}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def labels(**values):
+    escaped = {name: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for name, value in values.items()}
+    return ','.join(f'{name}="{value}"' for name, value in escaped.items())
+
+
+def family(lines, name, kind, help_text):
+    lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+    lines.append(f'# TYPE {PREFIX}_{name} {kind}')
+
+
+def histogram(lines, name, series_labels, values):
+    for bound, cumulative in values.cumulative():
+        lines.append(f'{PREFIX}_{name}_bucket{{{series_labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{PREFIX}_{name}_sum{{{series_labels}}} {values.sum}')
+    lines.append(f'{PREFIX}_{name}_count{{{series_labels}}} {values.count}')
+
+
+registry = Registry()
+
+
+class QueryTimer:
+    """An execute wrapper counting and timing queries, keeping the slowest few."""
+
+    __slots__ = ('count', 'seconds', 'slowest', 'alias')
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.count = 0
+        self.seconds = 0.0
+        # Min-heap of (seconds, sequence, sql, params)
+        self.slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            if not many and (len(self.slowest) < SLOWEST_QUERIES or elapsed > self.slowest[0][0]):
+                entry = (elapsed, self.count, sql, params)
+                if len(self.slowest) < SLOWEST_QUERIES:
+                    heapq.heappush(self.slowest, entry)
+                else:
+                    heapq.heappushpop(self.slowest, entry)
+
+
+class RequestMetrics:
+    __slots__ = ('timers', 'render_started', 'render_seconds')
+
+    def __init__(self, timers):
+        self.timers = timers
+        self.render_started = None
+        self.render_seconds = 0.0
+
+    def rendered(self, response):
+        self.render_seconds = time.perf_counter() - self.render_started
+
+
+_sampled_at = {}
+_sampled_lock = threading.Lock()
+
+
+def should_sample(view):
+    """Whether to log a slow request for `view` now, at most once per METRICS_SLOW_SAMPLE_INTERVAL."""
+    now = time.monotonic()
+    with _sampled_lock:
+        if now - _sampled_at.get(view, -settings.METRICS_SLOW_SAMPLE_INTERVAL) < settings.METRICS_SLOW_SAMPLE_INTERVAL:
+            return False
+        _sampled_at[view] = now
+        return True
+
+
+def explain(alias, sql, params):
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+    except DatabaseError as exc:
+        # e.g. the request's transaction was rolled back
+        return f'(no plan: {exc})'
+
+
+def log_slow_request(request, view, seconds, timers):
+    queries = sorted(
+        ((elapsed, timer.alias, sql, params) for timer in timers for elapsed, _, sql, params in timer.slowest),
+        key=lambda query: query[0], reverse=True,
+    )[:SLOWEST_QUERIES]
+    lines = [f'Slow request: {request.method} {request.path} ({view}) took {seconds * 1000:.0f} ms, '
+             f'{sum(timer.count for timer in timers)} queries in {sum(timer.seconds for timer in timers) * 1000:.0f} ms']
+    for elapsed, alias, sql, params in queries:
+        lines.append(f'{elapsed * 1000:.1f} ms: {sql} {params!r}')
+        if sql.lstrip()[:6].upper().startswith(EXPLAINABLE):
+            lines.append(explain(alias, sql, params))
+    logger.warning('\n'.join(lines))
+
+
+class MetricsMiddleware:
+    """Record each request in `registry`; goes first in MIDDLEWARE so it times the rest."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        # connections.all() costs a few microseconds a call, a good part of what this adds to a request
+        active = connections.all()
+        timers = [QueryTimer(connection.alias) for connection in active]
+        for connection, timer in zip(active, timers):
+            connection.execute_wrappers.append(timer)
+        request._metrics = RequestMetrics(timers)
+        try:
+            response = self.get_response(request)
+        finally:
+            for connection, timer in zip(active, timers):
+                connection.execute_wrappers.remove(timer)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        # Its queries run in other threads, out of the timers' sight
+        request._metrics = RequestMetrics(None)
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    def process_template_response(self, request, response):
+        # Called just before the response body is rendered
+        request._metrics.render_started = time.perf_counter()
+        response.add_post_render_callback(request._metrics.rendered)
+        return response
+
+    def record(self, request, response, seconds):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else None) or 'unmatched'
+        timers = request._metrics.timers
+        if timers is None:
+            queries = db_seconds = None
+        else:
+            queries, db_seconds = sum(timer.count for timer in timers), sum(timer.seconds for timer in timers)
+        registry.record(view, request.method, response.status_code, seconds, queries, db_seconds, request._metrics.render_seconds)
+        if seconds > settings.METRICS_SLOW_REQUEST_THRESHOLD and should_sample(view):
+            log_slow_request(request, view, seconds, timers or [])
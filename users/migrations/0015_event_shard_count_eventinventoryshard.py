@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_alter_booking_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='shard_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='EventInventoryShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField()),
+                ('available_tickets', models.PositiveIntegerField()),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_shards', to='users.event')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='eventinventoryshard',
+            constraint=models.UniqueConstraint(fields=('event', 'index'), name='unique_event_inventory_shard'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0016_event_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='refund_pending',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('refund_pending', True)), fields=['id'], name='booking_refund_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:00
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def fill_sales(apps, schema_editor):
+    """Start every event's totals from its existing bookings, as `manage.py rebuild_sales` does."""
+    Booking = apps.get_model('users', 'Booking')
+    EventSales = apps.get_model('users', 'EventSales')
+    active, paid, cancelled = Q(is_cancelled=False), Q(is_cancelled=False, is_paid=True), Q(is_cancelled=True)
+    totals = Booking.objects.exclude(event=None).values('event_id').annotate(
+        bookings=Count('id', filter=active),
+        tickets_sold=Coalesce(Sum('number_of_tickets', filter=active), 0),
+        paid_bookings=Count('id', filter=paid),
+        paid_tickets=Coalesce(Sum('number_of_tickets', filter=paid), 0),
+        revenue=Coalesce(Sum('payment_amount', filter=paid), 0, output_field=models.DecimalField(max_digits=14, decimal_places=2)),
+        cancelled_bookings=Count('id', filter=cancelled),
+        cancelled_tickets=Coalesce(Sum('number_of_tickets', filter=cancelled), 0),
+    )
+    EventSales.objects.bulk_create((EventSales(slot=0, **row) for row in totals.iterator()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0021_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField(default=0)),
+                ('bookings', models.IntegerField(default=0)),
+                ('tickets_sold', models.BigIntegerField(default=0)),
+                ('paid_bookings', models.IntegerField(default=0)),
+                ('paid_tickets', models.BigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cancelled_bookings', models.IntegerField(default=0)),
+                ('cancelled_tickets', models.BigIntegerField(default=0)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales', to='users.event')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='eventsales',
+            constraint=models.UniqueConstraint(fields=('event', 'slot'), name='event_sales_slot_unique'),
+        ),
+        migrations.RunPython(fill_sales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0023_event_admission_rate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='first_seat',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='seated',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='SeatSection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('position', models.PositiveSmallIntegerField()),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_sections', to='users.event')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SeatRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=10)),
+                ('rank', models.PositiveIntegerField()),
+                ('seats', models.PositiveSmallIntegerField()),
+                ('taken', models.BinaryField()),
+                ('available', models.PositiveSmallIntegerField()),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_rows', to='users.event')),
+                ('section', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='users.seatsection')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='seat_row',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='users.seatrow'),
+        ),
+        migrations.AddConstraint(
+            model_name='seatsection',
+            constraint=models.UniqueConstraint(fields=('event', 'position'), name='unique_event_seat_section'),
+        ),
+        migrations.AddConstraint(
+            model_name='seatrow',
+            constraint=models.UniqueConstraint(fields=('event', 'rank'), name='unique_event_seat_row'),
+        ),
+    ]
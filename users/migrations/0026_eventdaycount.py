@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:23
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_counts(apps, schema_editor):
+    """Count the existing events, as `manage.py rebuild_calendar` does."""
+    Event = apps.get_model('users', 'Event')
+    EventDayCount = apps.get_model('users', 'EventDayCount')
+    counts = Event.objects.values('date', 'location', 'category').annotate(events=Count('id')).order_by()
+    EventDayCount.objects.bulk_create((EventDayCount(**row) for row in counts.iterator()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0025_ticket_tiers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventDayCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('location', models.CharField(choices=[('bengaluru', 'Bengaluru'), ('hyderabad', 'Hyderabad'), ('chennai', 'Chennai'), ('delhi', 'Delhi'), ('mumbai', 'Mumbai'), ('pune', 'Pune'), ('kolkata', 'Kolkata'), ('jaipur', 'Jaipur')], max_length=50)),
+                ('category', models.CharField(choices=[('music', 'Music'), ('sports', 'Sports'), ('theatre', 'Theatre'), ('dance', 'Dance')], max_length=50)),
+                ('events', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='eventdaycount',
+            constraint=models.UniqueConstraint(fields=('date', 'location', 'category'), name='event_day_count_unique'),
+        ),
+        migrations.RunPython(fill_counts, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+from datetime import timedelta
 
 class User(AbstractUser):
     USER = 'user'
@@ -19,6 +21,22 @@ class User(AbstractUser):
         return self.username
 
 
+class EventQuerySet(models.QuerySet):
+    def with_inventory(self):
+        """Annotate sharded events with their shard inventory, summed in the same query."""
+        shard_totals = (
+            EventInventoryShard.objects.filter(event=models.OuterRef('pk'))
+            .values('event')
+            .annotate(total=models.Sum('available_tickets'))
+            .values('total')
+        )
+        return self.annotate(sharded_tickets=models.Case(
+            models.When(shard_count__gt=0, then=models.Subquery(shard_totals)),
+            default=None,
+            output_field=models.PositiveIntegerField(),
+        ))
+
+
 class Event(models.Model):
     CATEGORY_CHOICES = [
         ('music', 'Music'),
@@ -48,11 +66,120 @@ class Event(models.Model):
     available_tickets = models.PositiveIntegerField()
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES)
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # 0 means inventory lives in available_tickets; otherwise it is split across this many shards
+    shard_count = models.PositiveSmallIntegerField(default=0)
+    # Users let through the waiting room per second at most; null takes bookings without one
+    admission_rate = models.PositiveIntegerField(null=True, blank=True)
+    # Sold by the seat from its seat map; available_tickets then counts the free seats
+    seated = models.BooleanField(default=False)
+    # Cheapest and dearest of its ticket tiers, kept by users/tiers.py so listings read them off
+    # the row; null for events without tiers, which sell at `price`
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
 
+    objects = EventQuerySet.as_manager()
+
+    class Meta:
+        # Listings are ordered by (date, time, id) and filtered by any mix of location/category/date
+        indexes = [
+            models.Index(fields=['date', 'time', 'id'], name='event_date_time_idx'),
+            models.Index(fields=['location', 'date', 'time', 'id'], name='event_location_date_idx'),
+            models.Index(fields=['category', 'date', 'time', 'id'], name='event_category_date_idx'),
+            models.Index(fields=['location', 'category', 'date', 'time', 'id'], name='event_loc_cat_date_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded values so post_save can tell what an update changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    @property
+    def total_available_tickets(self):
+        """Tickets left, summed across inventory shards for sharded events."""
+        if not self.shard_count:
+            return self.available_tickets
+        if hasattr(self, 'sharded_tickets'):
+            return self.sharded_tickets or 0
+        return self.inventory_shards.aggregate(total=models.Sum('available_tickets'))['total'] or 0
+
+    @property
+    def tiered(self):
+        """Whether the event sells its tickets through ticket tiers."""
+        return self.min_price is not None
+
+
+class EventInventoryShard(models.Model):
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='inventory_shards')
+    index = models.PositiveSmallIntegerField()
+    available_tickets = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'index'], name='unique_event_inventory_shard'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id}#{self.index}: {self.available_tickets}"
+
+
+class TicketTier(models.Model):
+    """A price band of an event with tickets of its own, such as early bird or VIP (see users/tiers.py)."""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='tiers')
+    name = models.CharField(max_length=50)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    available_tickets = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'name'], name='unique_event_ticket_tier'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id}: {self.name}"
+
+
+class SeatSection(models.Model):
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='seat_sections')
+    name = models.CharField(max_length=50)
+    # Sections are listed, and their seats offered, in this order
+    position = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'position'], name='unique_event_seat_section'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id}: {self.name}"
+
+
+class SeatRow(models.Model):
+    """A row of seats, with a bitmap of the ones taken (see users/seating.py)."""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='seat_rows')
+    section = models.ForeignKey(SeatSection, on_delete=models.CASCADE, related_name='rows')
+    name = models.CharField(max_length=10)
+    # Rows are offered best first in this order, across the event's sections
+    rank = models.PositiveIntegerField()
+    seats = models.PositiveSmallIntegerField()
+    # Bit i, little-endian, is set while the row's seat i + 1 is taken
+    taken = models.BinaryField()
+    available = models.PositiveSmallIntegerField()
+    # Moved on by every claim and release, so one made from a stale read of the row fails
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'rank'], name='unique_event_seat_row'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id}: {self.name} ({self.available}/{self.seats} free)"
+
 
 class Booking(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -65,7 +192,119 @@ class Booking(models.Model):
     is_confirmed = models.BooleanField(default=False)
     price_per_ticket = models.DecimalField(max_digits=10, decimal_places=2)
     is_cancelled = models.BooleanField(default=False)
+    # Set when a paid booking is cancelled; cleared once the refund has been issued
+    refund_pending = models.BooleanField(default=False)
+    # Set when an unpaid booking's hold ran out and its tickets were released
+    hold_expired = models.BooleanField(default=False)
+    # For a seated event, the number_of_tickets adjacent seats held in seat_row from first_seat (0-based)
+    seat_row = models.ForeignKey(SeatRow, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    first_seat = models.PositiveSmallIntegerField(null=True, blank=True)
+    # The tier the tickets came from, for an event with tiers
+    tier = models.ForeignKey(TicketTier, on_delete=models.SET_NULL, null=True, blank=True, related_name='bookings')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(refund_pending=True), name='booking_refund_pending_idx'),
+            # Lets the hold sweeper find the oldest unpaid, uncancelled bookings
+            models.Index(fields=['is_paid', 'created_at'], condition=models.Q(is_cancelled=False), name='booking_hold_expiry_idx'),
+            # Serves a user's bookings newest first for keyset pagination
+            models.Index(fields=['user', 'created_at', 'id'], name='booking_user_created_idx'),
+        ]
+
+
+    def __str__(self):
+        event = self.event.title if self.event_id else "a deleted event"
+        return f"{self.user.username} booked {self.number_of_tickets} ticket(s) for {event}"
+
+    @property
+    def hold_expires_at(self):
+        """When an unpaid booking's tickets are released back to the event."""
+        return self.created_at + timedelta(seconds=settings.BOOKING_HOLD_TTL)
+
+class EventSales(models.Model):
+    """
+    A share of an event's sales totals, kept up to date by the booking,
+    payment and cancellation code (see users/sales.py). An event's totals
+    are the sum of its rows.
+    """
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='sales')
+    # Bookings are spread over EVENT_SALES_SLOTS rows by id, so concurrent writes rarely share a row
+    slot = models.PositiveSmallIntegerField(default=0)
+    # Counts may go negative on a single row; only the sum is meaningful
+    bookings = models.IntegerField(default=0)
+    tickets_sold = models.BigIntegerField(default=0)
+    paid_bookings = models.IntegerField(default=0)
+    paid_tickets = models.BigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cancelled_bookings = models.IntegerField(default=0)
+    cancelled_tickets = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'slot'], name='event_sales_slot_unique'),
+        ]
+
+    def __str__(self):
+        return f"Sales for event {self.event_id} (slot {self.slot})"
+
+class EventDayCount(models.Model):
+    """
+    How many events a city has on a day in a category, kept up to date as
+    events are created, moved and deleted (see users/calendar_index.py).
+    """
+    date = models.DateField()
+    location = models.CharField(max_length=50, choices=Event.CITY_CHOICES)
+    category = models.CharField(max_length=50, choices=Event.CATEGORY_CHOICES)
+    events = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index calendar reads scan, a date range at a time
+            models.UniqueConstraint(fields=['date', 'location', 'category'], name='event_day_count_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.location}/{self.category}: {self.events}"
+
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    job_type = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    # Enqueueing twice with the same key yields the original job
+    idempotency_key = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.job_type} #{self.id} ({self.status})"
+
 
+class ImportCheckpoint(models.Model):
+    """How far a resumable bulk import has got, committed with each batch it covers."""
+    name = models.CharField(max_length=255, unique=True)
+    rows_done = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"{self.user.username} booked {self.number_of_tickets} ticket(s) for {self.event.title}"
\ No newline at end of file
+        return f"{self.name} ({self.rows_done} rows)"
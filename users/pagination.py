@@ -0,0 +1,106 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks straight to the next page.
+
+    The cursor holds the ordering key of the last row served, and the next
+    page is fetched with `WHERE key > cursor ORDER BY key LIMIT n`, so every
+    page costs the same index range scan however deep the client goes.
+    `ordering` must end in a unique field so the key is a total order.
+    """
+    ordering = ('date', 'time', 'id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering=None):
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """`paginate_queryset` for async views, fetching the page with the async ORM."""
+        return self.set_page([row async for row in self.page_queryset(queryset, request)])
+
+    def page_queryset(self, queryset, request):
+        """`queryset` narrowed to the requested page, plus one row to tell if there is a next page."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.fields = [
+            (name.lstrip('-'), name.startswith('-'), queryset.model._meta.get_field(name.lstrip('-')))
+            for name in self.ordering
+        ]
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+        return queryset.order_by(*self.ordering)[:self.page_size + 1]
+
+    def set_page(self, page):
+        self.has_next = len(page) > self.page_size
+        self.page = page[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE
+        return max(1, min(page_size, self.max_page_size))
+
+    def after(self, position):
+        """Rows strictly after `position` in ordering, as a Q object."""
+        name, descending, _ = self.fields[0]
+        # A bound on the leading column lets the database use an index range scan
+        condition = Q(**{f'{name}__{"lte" if descending else "gte"}': position[0]})
+
+        following = Q()
+        for index, (name, descending, _) in enumerate(self.fields):
+            step = Q(**{f'{name}__{"lt" if descending else "gt"}': position[index]})
+            for previous, (previous_name, _, _) in enumerate(self.fields[:index]):
+                step &= Q(**{previous_name: position[previous]})
+            following |= step
+        return condition & following
+
+    def encode_cursor(self, row):
+        # Pages may hold model instances or `.values()` dicts
+        if isinstance(row, dict):
+            position = [str(row[name]) for name, _, _ in self.fields]
+        else:
+            position = [field.value_to_string(row) for _, _, field in self.fields]
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if len(position) != len(self.fields):
+                raise ValueError
+            return [field.to_python(value) for (_, _, field), value in zip(self.fields, position)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
@@ -0,0 +1,115 @@
+import logging
+
+from django.db import transaction
+
+from . import jobs, sales
+from .models import Booking
+from .reservations import hold_cutoff
+
+logger = logging.getLogger(__name__)
+
+
+def issue_refund(booking_id, amount, payment_method):
+    """
+    Send a refund to the payment provider.
+
+    There is no provider integration yet, so the refund is only logged.
+    """
+    logger.info('Refunding %s via %s for booking %s', amount, payment_method, booking_id)
+
+
+def send_booking_confirmation(booking_id):
+    """Notify the customer that their booking is paid and confirmed."""
+    logger.info('Booking %s confirmed', booking_id)
+
+
+class PaymentRejected(Exception):
+    """Raised when a booking can't be paid for; the message says why."""
+
+
+def confirm_payment(booking, payment_method):
+    """
+    Mark `booking` paid and queue its confirmation side effects.
+
+    Only a live hold can be paid: the update is conditional on the booking
+    being unpaid, uncancelled and inside its hold window, so it can't race
+    the expiry sweeper. Nor while the refund of a cancelled payment is still
+    pending, which would otherwise refund this payment instead.
+    """
+    with transaction.atomic():
+        paid = Booking.objects.filter(
+            id=booking.id, is_paid=False, is_cancelled=False, refund_pending=False, created_at__gte=hold_cutoff()
+        ).update(is_paid=True, payment_method=payment_method, is_confirmed=True)
+
+        if not paid:
+            booking.refresh_from_db()
+            if booking.is_paid:
+                raise PaymentRejected("Booking is already paid.")
+            if booking.is_cancelled and not booking.hold_expired:
+                raise PaymentRejected("Booking has been cancelled.")
+            if booking.refund_pending and not booking.is_cancelled:
+                raise PaymentRejected("The refund of the previous payment is still being processed. Please try again shortly.")
+            raise PaymentRejected("Booking hold has expired. Please book again.")
+
+        sales.record([booking], paid=1)
+        jobs.enqueue('booking_confirmed', {'booking_id': booking.id})
+
+
+def cancel_payment(booking):
+    """
+    Reverse the payment on `booking` and queue its refund. Returns False if
+    it had not been paid.
+    """
+    with transaction.atomic():
+        cancelled = Booking.objects.filter(id=booking.id, is_paid=True).update(
+            is_paid=False, is_confirmed=False, refund_pending=True
+        )
+        if not cancelled:
+            return False
+        sales.record([booking], paid=-1)
+        jobs.enqueue('refund_booking', {'booking_id': booking.id})
+    return True
+
+
+def refund_booking(booking_id):
+    """
+    Issue the refund for one booking, if it is still owed one.
+
+    The refund is claimed by clearing `refund_pending` before the provider
+    is called, so two workers can't refund the same booking, and no
+    transaction is held open across the provider call. If the provider
+    fails the flag is restored and the error re-raised for a retry.
+    """
+    booking = Booking.objects.filter(id=booking_id, refund_pending=True).values_list('payment_amount', 'payment_method').first()
+    if booking is None or not Booking.objects.filter(id=booking_id, refund_pending=True).update(refund_pending=False):
+        return False
+
+    try:
+        issue_refund(booking_id, *booking)
+    except Exception:
+        Booking.objects.filter(id=booking_id).update(refund_pending=True)
+        raise
+    Booking.objects.filter(id=booking_id, refund_pending=False, is_paid=False).update(payment_method=None)
+    return True
+
+
+def process_pending_refunds(batch_size=500):
+    """
+    Issue refunds for bookings flagged `refund_pending`, reading their ids
+    `batch_size` at a time, and return how many were refunded.
+
+    Each refund goes through `refund_booking`, which claims it before the
+    provider call, so a failure part-way only leaves the unsent ones flagged
+    for the retry, and no locks are held while the provider is called.
+    """
+    processed, last_id = 0, 0
+    while True:
+        batch = list(
+            Booking.objects.filter(refund_pending=True, id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not batch:
+            return processed
+
+        for booking_id in batch:
+            processed += refund_booking(booking_id)
+        last_id = batch[-1]
@@ -0,0 +1,391 @@
+import random
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+from django.utils import timezone
+
+from . import availability, caching, jobs, sales, seating
+from .models import Event, EventInventoryShard, Booking, TicketTier
+
+
+class NotEnoughTickets(Exception):
+    """Raised when an event cannot cover the requested number of tickets."""
+
+
+class NotEnoughAdjacentSeats(NotEnoughTickets):
+    """Raised when a seated event has the seats, but no row has that many together."""
+
+
+class TierRequired(Exception):
+    """Raised when an event with ticket tiers is booked without one."""
+
+
+class BatchRejected(Exception):
+    """Raised when an all-or-nothing batch fails; `results` says which items caused it."""
+
+    def __init__(self, results):
+        super().__init__(results)
+        self.results = results
+
+
+def reserve_tickets(user, event, number_of_tickets, tier=None):
+    """
+    Take `number_of_tickets` from `event` and create the matching booking.
+
+    The decrement is a single conditional UPDATE, so concurrent requests
+    can never push `available_tickets` below zero, and the booking row is
+    written in the same transaction. Seated events also claim the best
+    block of adjacent seats. Events with ticket tiers take the tickets from
+    `tier` too, at its price.
+    """
+    if event.tiered and tier is None:
+        raise TierRequired()
+    with transaction.atomic():
+        if event.shard_count:
+            _take_from_shards(event, number_of_tickets)
+        else:
+            taken = Event.objects.filter(
+                id=event.id, available_tickets__gte=number_of_tickets
+            ).update(available_tickets=F('available_tickets') - number_of_tickets)
+
+            if not taken:
+                raise NotEnoughTickets()
+        if tier is not None:
+            _take_from_tier(tier, number_of_tickets)
+        seats = _claim_seats(event, number_of_tickets) if event.seated else {}
+        price = event.price if tier is None else tier.price
+
+        caching.invalidate_tickets(event)
+        availability.publish(event.id)
+        booking = Booking.objects.create(
+            user_id=user.pk,
+            event=event,
+            number_of_tickets=number_of_tickets,
+            price_per_ticket=price,
+            payment_amount=price * number_of_tickets,
+            tier=tier,
+            **seats,
+        )
+        sales.record([booking], booked=1)
+        return booking
+
+
+def _claim_seats(event, number_of_tickets):
+    """The Booking fields for the seats claimed from seated `event`. Must run inside a transaction."""
+    claimed = seating.claim(event.id, number_of_tickets)
+    if claimed is None:
+        raise NotEnoughAdjacentSeats()
+    return {'seat_row': claimed[0], 'first_seat': claimed[1]}
+
+
+def _take_from_tier(tier, number_of_tickets):
+    """Take tickets from an event's tier. Must run inside a transaction, after the event's are taken."""
+    if not TicketTier.objects.filter(
+        id=tier.id, available_tickets__gte=number_of_tickets
+    ).update(available_tickets=F('available_tickets') - number_of_tickets):
+        raise NotEnoughTickets()
+
+
+def reserve_batch(user, items, all_or_nothing=True):
+    """
+    Book several `(event_id, number_of_tickets)` items in one transaction.
+    Items for events with ticket tiers add a third element, the tier id.
+
+    Returns a list with, for each item, its Booking or the exception that
+    refused it (Event.DoesNotExist, TicketTier.DoesNotExist, TierRequired,
+    NotEnoughTickets or NotEnoughAdjacentSeats); refused items are skipped
+    and the rest still booked. With `all_or_nothing` any refusal rolls the whole batch back and
+    raises BatchRejected, whose results hold None for the items that were
+    not at fault.
+
+    The events are locked in id order, so batches over the same events
+    can't deadlock, and the batch costs one locking read, one UPDATE, one
+    INSERT and two queries for the sales totals however many items it has.
+    Sharded events are the exception: each of their items takes its
+    tickets as `reserve_tickets` does. Items for seated events also claim
+    their seats, a couple of queries each, and items for tiers take their
+    tickets with an UPDATE each, after one query reading every tier.
+    """
+    items = [(*item, None)[:3] for item in items]
+    results = [None] * len(items)
+    # Items are handled in event id order too, so shard rows are locked in a consistent order
+    order = sorted(range(len(items)), key=lambda index: items[index][0])
+    try:
+        with transaction.atomic():
+            events = Event.objects.select_for_update().filter(id__in={item[0] for item in items}).order_by('id').in_bulk()
+            tiers = TicketTier.objects.in_bulk({item[2] for item in items if item[2] is not None})
+            remaining = {event.id: event.available_tickets for event in events.values()}
+            taken = {}
+            for index in order:
+                event_id, number_of_tickets, tier_id = items[index]
+                event = events.get(event_id)
+                if event is None:
+                    results[index] = Event.DoesNotExist('Event not found.')
+                    continue
+                tier = tiers.get(tier_id)
+                if tier_id is not None and (tier is None or tier.event_id != event_id):
+                    results[index] = TicketTier.DoesNotExist('Ticket tier not found.')
+                    continue
+                if event.tiered and tier is None:
+                    results[index] = TierRequired()
+                    continue
+                seats = {}
+                if event.shard_count:
+                    try:
+                        with transaction.atomic():
+                            _take_from_shards(event, number_of_tickets)
+                    except NotEnoughTickets as exc:
+                        results[index] = exc
+                        continue
+                elif remaining[event_id] < number_of_tickets:
+                    results[index] = NotEnoughTickets()
+                    continue
+                else:
+                    try:
+                        if tier is not None:
+                            _take_from_tier(tier, number_of_tickets)
+                        if event.seated:
+                            seats = _claim_seats(event, number_of_tickets)
+                    except NotEnoughTickets as exc:
+                        results[index] = exc
+                        continue
+                    remaining[event_id] -= number_of_tickets
+                    taken[event_id] = taken.get(event_id, 0) + number_of_tickets
+                price = event.price if tier is None else tier.price
+                results[index] = Booking(
+                    user_id=user.pk,
+                    event=event,
+                    number_of_tickets=number_of_tickets,
+                    price_per_ticket=price,
+                    payment_amount=price * number_of_tickets,
+                    tier=tier,
+                    **seats,
+                )
+
+            if all_or_nothing and any(isinstance(result, Exception) for result in results):
+                raise BatchRejected([result if isinstance(result, Exception) else None for result in results])
+
+            if taken:
+                # Conditional like reserve_tickets, in case the database doesn't lock rows on read
+                updated = Event.objects.filter(reduce(or_, (
+                    Q(id=event_id, available_tickets__gte=number_of_tickets) for event_id, number_of_tickets in taken.items()
+                ))).update(available_tickets=Case(
+                    *(When(id=event_id, then=F('available_tickets') - number_of_tickets) for event_id, number_of_tickets in taken.items()),
+                    default=F('available_tickets'),
+                    output_field=Event._meta.get_field('available_tickets'),
+                ))
+                if updated != len(taken):
+                    raise NotEnoughTickets()
+
+            bookings = [result for result in results if isinstance(result, Booking)]
+            Booking.objects.bulk_create(bookings)
+            sales.record(bookings, booked=1)
+            for event_id in {booking.event_id for booking in bookings}:
+                caching.invalidate_tickets(events[event_id])
+                availability.publish(event_id)
+    except NotEnoughTickets:
+        # The inventory moved between the read and the write; nothing was booked
+        if all_or_nothing:
+            raise BatchRejected([NotEnoughTickets() for _ in items])
+        raise
+    return results
+
+
+def _take_from_shards(event, number_of_tickets):
+    """
+    Take tickets from a sharded event. Must run inside a transaction.
+
+    Starts at a random shard so concurrent bookings spread their writes
+    across rows. If no single shard can cover the order, the remaining
+    stock is gathered from several shards; the caller's transaction rolls
+    the partial takes back if even that falls short.
+    """
+    shards = EventInventoryShard.objects.filter(event_id=event.id)
+    start = random.randrange(event.shard_count)
+    order = [(start + offset) % event.shard_count for offset in range(event.shard_count)]
+
+    for index in order:
+        if shards.filter(index=index, available_tickets__gte=number_of_tickets).update(
+            available_tickets=F('available_tickets') - number_of_tickets
+        ):
+            return
+
+    remaining = number_of_tickets
+    # Locked in index order, so two bookings gathering from the same shards can't deadlock
+    for index, available in shards.select_for_update().filter(available_tickets__gt=0).order_by('index').values_list('index', 'available_tickets'):
+        take = min(available, remaining)
+        if shards.filter(index=index, available_tickets__gte=take).update(
+            available_tickets=F('available_tickets') - take
+        ):
+            remaining -= take
+        if not remaining:
+            return
+
+    raise NotEnoughTickets()
+
+
+def release_tickets(event, number_of_tickets):
+    """Give `number_of_tickets` back to the event's inventory."""
+    caching.invalidate_tickets(event)
+    availability.publish(event.id)
+    if event.shard_count:
+        EventInventoryShard.objects.filter(
+            event_id=event.id, index=random.randrange(event.shard_count)
+        ).update(available_tickets=F('available_tickets') + number_of_tickets)
+    else:
+        Event.objects.filter(id=event.id).update(
+            available_tickets=F('available_tickets') + number_of_tickets
+        )
+
+
+def release_tiers(bookings):
+    """Give the tickets of `bookings` taken from ticket tiers back to their tiers."""
+    tickets = {}
+    for booking in bookings:
+        if booking.tier_id is not None:
+            tickets[booking.tier_id] = tickets.get(booking.tier_id, 0) + booking.number_of_tickets
+    for tier_id, number_of_tickets in tickets.items():
+        TicketTier.objects.filter(id=tier_id).update(available_tickets=F('available_tickets') + number_of_tickets)
+
+
+def shard_inventory(event, shard_count, total=None):
+    """
+    Split the event's inventory across `shard_count` shard rows.
+
+    `total` replaces the current inventory; by default the tickets left
+    are carried over. A `shard_count` of 0 or 1 folds the stock back into
+    `Event.available_tickets`.
+    """
+    with transaction.atomic():
+        event = Event.objects.select_for_update().get(id=event.id)
+        if event.seated and shard_count > 1:
+            raise ValueError("Seated events sell from their seat map and can't be sharded.")
+        if event.tiered and shard_count > 1:
+            raise ValueError("Events with ticket tiers sell from their tiers and can't be sharded.")
+        shards = EventInventoryShard.objects.select_for_update().filter(event=event)
+        if total is None:
+            total = event.available_tickets + sum(shard.available_tickets for shard in shards)
+        shards.delete()
+
+        if shard_count > 1:
+            base, extra = divmod(total, shard_count)
+            EventInventoryShard.objects.bulk_create([
+                EventInventoryShard(event=event, index=index, available_tickets=base + (index < extra))
+                for index in range(shard_count)
+            ])
+            event.available_tickets = 0
+            event.shard_count = shard_count
+        else:
+            event.available_tickets = total
+            event.shard_count = 0
+
+        event.save(update_fields=['available_tickets', 'shard_count'])
+    return event
+
+
+# Cancelling clears payment state and flags paid bookings for refund. The
+# right-hand sides all see the row's old values, so refund_pending reads
+# is_paid before it is cleared, and a refund already pending from a
+# cancelled payment stays pending. payment_method is kept until the refund
+# is issued.
+CANCELLED = {
+    'is_cancelled': True,
+    'refund_pending': Case(When(Q(is_paid=True) | Q(refund_pending=True), then=True), default=False),
+    'is_paid': False,
+    'is_confirmed': False,
+}
+
+
+def cancel_booking(booking):
+    """
+    Cancel `booking` and return its tickets to the event.
+
+    Returns False if the booking was already cancelled, so a repeated
+    request can't release the same tickets twice.
+    """
+    with transaction.atomic():
+        # Whether it is paid now, which `booking` may predate; the lock keeps
+        # it so until the update below
+        was_paid = Booking.objects.select_for_update().filter(id=booking.id, is_cancelled=False).values_list('is_paid', flat=True).first()
+        if was_paid is None or not Booking.objects.filter(id=booking.id, is_cancelled=False).update(**CANCELLED):
+            return False
+
+        sales.record([booking], booked=-1, paid=-was_paid, cancelled=1)
+
+        if booking.event is not None:
+            release_tickets(booking.event, booking.number_of_tickets)
+            seating.release([booking])
+            release_tiers([booking])
+
+        if was_paid:
+            jobs.enqueue('refund_booking', {'booking_id': booking.id})
+
+    return True
+
+
+def cancel_event(event):
+    """
+    Cancel every booking for `event` and delete it.
+
+    Runs a fixed handful of set-based statements however many bookings the
+    event has: refunds are only flagged here and issued by a queued
+    `process_refunds` job.
+    """
+    with transaction.atomic():
+        Booking.objects.filter(event=event, is_cancelled=False).update(**CANCELLED)
+        jobs.enqueue('process_refunds', idempotency_key=f'event-refunds:{event.id}')
+        event.delete()
+
+
+def hold_cutoff():
+    """Unpaid bookings created before this have outlived their hold."""
+    return timezone.now() - timedelta(seconds=settings.BOOKING_HOLD_TTL)
+
+
+def release_expired_holds(batch_size=1000):
+    """
+    Cancel unpaid bookings whose hold has expired and give their tickets
+    back, one short transaction per batch so the table is never locked for
+    long. Returns the number of bookings released.
+
+    Each batch is read and locked inside its own transaction, skipping rows
+    another sweep has locked, so overlapping sweeps never release the same
+    hold twice. A batch is only released if its UPDATE cancelled every
+    booking it read. On a backend where the lock didn't hold, the batch is
+    rolled back and read again, so the count returned and the tickets given
+    back always match.
+    """
+    cutoff = hold_cutoff()
+    expired = Booking.objects.filter(is_paid=False, is_cancelled=False, created_at__lt=cutoff)
+    released = 0
+    while True:
+        with transaction.atomic():
+            # The lock also makes a payment racing the sweep either land
+            # before it (and the booking isn't read) or fail after it
+            bookings = list(
+                expired.select_for_update(skip_locked=True).order_by('created_at')
+                .only('id', 'event_id', 'number_of_tickets', 'payment_amount', 'seat_row_id', 'first_seat', 'tier_id')[:batch_size]
+            )
+            if not bookings:
+                return released
+
+            cancelled = expired.filter(id__in=[booking.id for booking in bookings]).update(is_cancelled=True, hold_expired=True)
+            if cancelled != len(bookings):
+                # Some changed after they were read, so this sweep didn't cancel them
+                transaction.set_rollback(True)
+                continue
+            bookings = [booking for booking in bookings if booking.event_id is not None]
+            sales.record(bookings, booked=-1, cancelled=1)
+            seating.release(bookings)
+            release_tiers(bookings)
+            tickets = {}
+            for booking in bookings:
+                tickets[booking.event_id] = tickets.get(booking.event_id, 0) + booking.number_of_tickets
+            events = Event.objects.in_bulk(tickets)
+            for event_id, number_of_tickets in tickets.items():
+                release_tickets(events[event_id], number_of_tickets)
+        released += cancelled
@@ -0,0 +1,126 @@
+"""
+Per-event sales totals for the organizer dashboard.
+
+Summing the Booking table for every event a manager owns gets slower with
+every booking sold. Instead each change to a booking (created, paid,
+payment reversed, cancelled, hold expired) adds its effect to the event's
+EventSales rows in the same transaction, and the dashboard reads those:
+a handful of rows per event, however many bookings it has.
+
+An event's totals are spread over up to EVENT_SALES_SLOTS rows, picked by
+booking id, so bookings and payments for one event don't all queue on a
+single row. `rebuild` recomputes everything from the Booking table, for
+`manage.py rebuild_sales`.
+"""
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, When
+from django.db.models.functions import Coalesce
+
+from .models import Booking, Event, EventSales
+
+FIELDS = ('bookings', 'tickets_sold', 'paid_bookings', 'paid_tickets', 'revenue', 'cancelled_bookings', 'cancelled_tickets')
+
+ACTIVE, PAID, CANCELLED = Q(is_cancelled=False), Q(is_cancelled=False, is_paid=True), Q(is_cancelled=True)
+
+
+def _total(field, expression):
+    return Coalesce(expression, 0, output_field=EventSales._meta.get_field(field))
+
+
+# The totals of a set of bookings, as they stand in the Booking table
+BOOKING_TOTALS = {
+    'bookings': _total('bookings', Count('id', filter=ACTIVE)),
+    'tickets_sold': _total('tickets_sold', Sum('number_of_tickets', filter=ACTIVE)),
+    'paid_bookings': _total('paid_bookings', Count('id', filter=PAID)),
+    'paid_tickets': _total('paid_tickets', Sum('number_of_tickets', filter=PAID)),
+    'revenue': _total('revenue', Sum('payment_amount', filter=PAID)),
+    'cancelled_bookings': _total('cancelled_bookings', Count('id', filter=CANCELLED)),
+    'cancelled_tickets': _total('cancelled_tickets', Sum('number_of_tickets', filter=CANCELLED)),
+}
+
+
+def record(bookings, booked=0, paid=0, cancelled=0):
+    """
+    Add the effect of `bookings` changing state to their events' totals.
+    Must run in the transaction that makes the change.
+
+    Each step is +1 or -1 per booking: `booked` when bookings are created
+    (+1) or cancelled (-1), `paid` when a payment goes through or is
+    reversed, `cancelled` when they are cancelled.
+    """
+    changes = {}
+    for booking in bookings:
+        if booking.event_id is None:
+            continue
+        deltas = changes.setdefault((booking.event_id, booking.id % settings.EVENT_SALES_SLOTS), dict.fromkeys(FIELDS, 0))
+        deltas['bookings'] += booked
+        deltas['tickets_sold'] += booked * booking.number_of_tickets
+        deltas['paid_bookings'] += paid
+        deltas['paid_tickets'] += paid * booking.number_of_tickets
+        deltas['revenue'] += paid * (booking.payment_amount or 0)
+        deltas['cancelled_bookings'] += cancelled
+        deltas['cancelled_tickets'] += cancelled * booking.number_of_tickets
+    if changes:
+        _apply(changes)
+
+
+def _apply(changes):
+    """Add `changes`, {(event_id, slot): {field: delta}}, creating rows as needed."""
+    rows = EventSales.objects.filter(reduce(or_, (Q(event_id=event_id, slot=slot) for event_id, slot in changes)))
+    if len(changes) == 1:
+        deltas, = changes.values()
+        values = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        # Usually the row exists and this is the only query
+        if rows.update(**values):
+            return
+    else:
+        values = {
+            field: Case(
+                *(When(event_id=event_id, slot=slot, then=F(field) + deltas[field]) for (event_id, slot), deltas in changes.items()),
+                default=F(field),
+                output_field=EventSales._meta.get_field(field),
+            )
+            for field in FIELDS
+        }
+    EventSales.objects.bulk_create([EventSales(event_id=event_id, slot=slot) for event_id, slot in changes], ignore_conflicts=True)
+    rows.update(**values)
+
+
+def rebuild(batch_size=500):
+    """
+    Recompute every event's totals from the Booking table, one short
+    transaction per batch of events. Returns the number of events rebuilt.
+    """
+    rebuilt = last_id = 0
+    while True:
+        ids = list(Event.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return rebuilt
+
+        with transaction.atomic():
+            # Booking changes update these rows in their own transaction, so
+            # locking them first waits for those in flight to commit
+            list(EventSales.objects.select_for_update().filter(event_id__in=ids).values_list('id'))
+            totals = Booking.objects.filter(event_id__in=ids).values('event_id').annotate(**BOOKING_TOTALS)
+            EventSales.objects.filter(event_id__in=ids).delete()
+            EventSales.objects.bulk_create([EventSales(slot=0, **row) for row in totals])
+        rebuilt += len(ids)
+        last_id = ids[-1]
+
+
+def organizer_events(user):
+    """`user`'s events, annotated with their sales totals."""
+    return Event.objects.filter(created_by_id=user.id).annotate(
+        **{field: _total(field, Sum(f'sales__{field}')) for field in FIELDS}
+    )
+
+
+def organizer_totals(user):
+    """The sales totals across all of `user`'s events."""
+    return EventSales.objects.filter(event__created_by_id=user.id).aggregate(
+        **{field: _total(field, Sum(field)) for field in FIELDS}
+    )
@@ -0,0 +1,300 @@
+"""
+In-process full-text search over event titles and descriptions.
+
+The index maps every term to the events containing it, grouped by a weight
+that counts title occurrences SEARCH_TITLE_WEIGHT times. A query matches
+events containing all of its terms; each term also matches longer terms it
+is a prefix of, so "conc" finds "concert". An event scores the sum over
+query terms of its best match's weight times inverse document frequency,
+with prefix matches discounted. Reading each term's events best first lets
+a query stop early instead of scoring every match of a common term.
+
+The index is built from the database on first use and kept current by the
+Event signals, which apply changes once their transaction commits. Like
+the LocMem cache it lives in each process; SEARCH_INDEX_REFRESH makes it
+rebuild periodically to pick up events written by other processes.
+"""
+import heapq
+import math
+import re
+import sys
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter
+from functools import partial
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Event
+
+_TOKEN = re.compile(r'\w+')
+
+# Shorter terms only match exactly; a one-letter prefix matches too much to rank usefully
+MIN_PREFIX_LENGTH = 2
+# Prefix matches use at most this many of the most common completions
+MAX_PREFIX_EXPANSIONS = 50
+PREFIX_DISCOUNT = 0.5
+# Events a multi-term query reads best first before switching to intersecting id sets
+TOP_BUDGET = 2000
+# ...and the most matches it will score one by one after that
+SCAN_LIMIT = 5000
+# Rough cost of checking one event's terms, in set lookups
+PROBE_COST = 20
+
+
+def tokenize(text):
+    """Lowercase terms of `text`, with accents stripped."""
+    text = text.casefold()
+    if not text.isascii():
+        text = ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+    return _TOKEN.findall(text)
+
+
+class SearchIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.build_lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """Drop everything; the next search rebuilds from the database."""
+        with self.lock:
+            # term -> {weight: ids of the events containing it with that weight}
+            self.tiers = {}
+            self.frequency = {}
+            # event id -> {term: weight}
+            self.documents = {}
+            self.terms = []
+            self.built_at = None
+            # Changes that arrive while a build is reading the database
+            self.pending = None
+
+    def build(self):
+        """Index every event, replacing the current contents."""
+        with self.build_lock:
+            self._build()
+
+    def _build(self):
+        with self.lock:
+            self.pending = []
+        fresh = SearchIndex()
+        rows = Event.objects.values_list('id', 'title', 'description').iterator(chunk_size=5000)
+        for event_id, title, description in rows:
+            fresh._add(event_id, title, description, sort=False)
+        fresh.terms.sort()
+
+        with self.lock:
+            self.tiers, self.frequency, self.documents, self.terms = fresh.tiers, fresh.frequency, fresh.documents, fresh.terms
+            self.built_at = time.monotonic()
+            pending, self.pending = self.pending, None
+            for change in pending:
+                change()
+
+    def _refresh(self):
+        try:
+            self._build()
+        finally:
+            self.build_lock.release()
+            connection.close()
+
+    def ensure_built(self):
+        if self.built_at is None:
+            with self.build_lock:
+                if self.built_at is None:
+                    self._build()
+            return
+
+        refresh = settings.SEARCH_INDEX_REFRESH
+        # A stale index keeps serving while a thread rebuilds it
+        if refresh is not None and time.monotonic() - self.built_at > refresh and self.build_lock.acquire(blocking=False):
+            threading.Thread(target=self._refresh, daemon=True).start()
+
+    def add(self, event_id, title, description):
+        """Index `event_id`, replacing what was indexed for it before."""
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append(partial(self.add, event_id, title, description))
+            if self.built_at is not None:
+                self._remove(event_id)
+                self._add(event_id, title, description)
+
+    def remove(self, event_id):
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append(partial(self.remove, event_id))
+            self._remove(event_id)
+
+    def _add(self, event_id, title, description, sort=True):
+        weights = Counter()
+        for term in tokenize(title):
+            weights[term] += settings.SEARCH_TITLE_WEIGHT
+        for term in tokenize(description):
+            weights[term] += 1
+
+        document = {}
+        for term, weight in weights.items():
+            term = sys.intern(term)
+            tiers = self.tiers.get(term)
+            if tiers is None:
+                tiers = self.tiers[term] = {}
+                self.frequency[term] = 0
+                if sort:
+                    insort(self.terms, term)
+                else:
+                    self.terms.append(term)
+            tiers.setdefault(weight, set()).add(event_id)
+            self.frequency[term] += 1
+            document[term] = weight
+        self.documents[event_id] = document
+
+    def _remove(self, event_id):
+        for term, weight in self.documents.pop(event_id, {}).items():
+            tiers = self.tiers[term]
+            tiers[weight].discard(event_id)
+            if not tiers[weight]:
+                del tiers[weight]
+            self.frequency[term] -= 1
+            if not self.frequency[term]:
+                del self.tiers[term], self.frequency[term]
+                del self.terms[bisect_left(self.terms, term)]
+
+    def _expand(self, term):
+        """{term: idf} for `term` and the terms it is a prefix of, with prefix matches discounted."""
+        expansion = []
+        if term in self.tiers:
+            expansion.append((term, 1.0))
+        if len(term) >= MIN_PREFIX_LENGTH:
+            # Terms starting with `term` sort between it and the same prefix with its last letter bumped
+            start = bisect_left(self.terms, term)
+            end = bisect_left(self.terms, term[:-1] + chr(ord(term[-1]) + 1), start)
+            completions = [candidate for candidate in self.terms[start:end] if candidate != term]
+            if len(completions) > MAX_PREFIX_EXPANSIONS:
+                completions = heapq.nlargest(MAX_PREFIX_EXPANSIONS, completions, key=self.frequency.get)
+            expansion.extend((candidate, PREFIX_DISCOUNT) for candidate in completions)
+
+        total = len(self.documents) or 1
+        return {term: factor * math.log(1 + total / self.frequency[term]) for term, factor in expansion}
+
+    def _ranked(self, group):
+        """(-score, event_id) for every event matching `group`, best first."""
+        def stream(term, idf):
+            tiers = self.tiers[term]
+            for weight in sorted(tiers, reverse=True):
+                score = -weight * idf
+                for event_id in tiers[weight]:
+                    yield score, event_id
+        return heapq.merge(*(stream(term, idf) for term, idf in group.items()), key=itemgetter(0))
+
+    def _score(self, event_id, groups):
+        """Score of `event_id`, or None if it misses any query term."""
+        document = self.documents[event_id]
+        total = 0.0
+        for group in groups:
+            # A query term scores its best match in the event
+            if len(group) <= len(document):
+                score = max(document.get(term, 0) * idf for term, idf in group.items())
+            else:
+                score = max((weight * group[term] for term, weight in document.items() if term in group), default=0)
+            if not score:
+                return None
+            total += score
+        return total
+
+    def _intersection(self, groups):
+        """Ids of the events matching every group."""
+        by_size = sorted(groups, key=lambda group: sum(map(self.frequency.get, group)))
+        candidates = set().union(*(ids for term in by_size[0] for ids in self.tiers[term].values()))
+        for group in by_size[1:]:
+            id_sets = [ids for term in group for ids in self.tiers[term].values()]
+            if sum(min(len(candidates), len(ids)) for ids in id_sets) > PROBE_COST * len(candidates):
+                # Cheaper to check each candidate's own terms
+                candidates = {event_id for event_id in candidates if not group.keys().isdisjoint(self.documents[event_id])}
+            else:
+                matched = set()
+                for ids in id_sets:
+                    matched |= candidates & ids
+                candidates = matched
+        return candidates
+
+    def _scan(self, groups, candidates, limit):
+        ranked = ((self._score(event_id, groups), -event_id, event_id) for event_id in candidates)
+        return [event_id for _, _, event_id in heapq.nlargest(limit, ranked)]
+
+    def _top(self, groups, limit, budget=None):
+        """
+        The `limit` best events matching every group, by Fagin's threshold
+        algorithm: read each query term's matches best first and stop once
+        no event still unread could beat the ones found. Returns None if
+        that takes more than `budget` reads.
+        """
+        streams = [self._ranked(group) for group in groups]
+        # The most each query term can still add for an event not yet read
+        bounds = [float('inf')] * len(groups)
+        best = []
+        seen = set()
+        while True:
+            if budget is not None and len(seen) > budget:
+                return None
+            for index, stream in enumerate(streams):
+                entry = next(stream, None)
+                if entry is None:
+                    # Every event containing this query term has been scored
+                    return [event_id for _, _, event_id in sorted(best, reverse=True)]
+
+                score, event_id = entry
+                bounds[index] = -score
+                if event_id in seen:
+                    continue
+                seen.add(event_id)
+                score = self._score(event_id, groups)
+                if score is None:
+                    continue
+                # Ties go to the event found first
+                item = (score, -len(seen), event_id)
+                if len(best) < limit:
+                    heapq.heappush(best, item)
+                elif item > best[0]:
+                    heapq.heapreplace(best, item)
+
+            if len(best) == limit and best[0][0] >= sum(bounds):
+                return [event_id for _, _, event_id in sorted(best, reverse=True)]
+
+    def search(self, query, limit=20):
+        """Ids of the events best matching `query`, best first."""
+        self.ensure_built()
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        with self.lock:
+            groups = [self._expand(term) for term in terms]
+            if not all(groups):
+                return []
+            if len(groups) == 1:
+                return self._top(groups, limit)
+            # Reading best first is quick when the terms' best matches
+            # overlap. When they don't, few events usually match them all,
+            # and intersecting id sets then scoring those is quicker
+            top = self._top(groups, limit, budget=TOP_BUDGET)
+            if top is not None:
+                return top
+            candidates = self._intersection(groups)
+            if len(candidates) <= SCAN_LIMIT:
+                return self._scan(groups, candidates, limit)
+            return self._top(groups, limit)
+
+
+index = SearchIndex()
+
+
+def event_changed(event):
+    """Reindex `event` once the current transaction commits."""
+    transaction.on_commit(partial(index.add, event.id, event.title, event.description))
+
+
+def event_removed(event):
+    transaction.on_commit(partial(index.remove, event.id))
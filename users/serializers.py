@@ -1,5 +1,12 @@
+import decimal
+from operator import itemgetter
+
 from rest_framework import serializers
-from .models import User, Event, Booking
+from rest_framework.settings import ISO_8601, api_settings
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .models import User, Event, Booking, TicketTier
+from . import seating
+from .reservations import shard_inventory
 
 class RegisterSerializer(serializers.ModelSerializer):
     class Meta:
@@ -17,13 +24,211 @@ class RegisterSerializer(serializers.ModelSerializer):
         )
 
 
+class LoginSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        # Copied into the access token, so ClaimsJWTAuthentication needn't load the user
+        token['role'] = user.role
+        token['is_staff'] = user.is_staff
+        token['session'] = token['jti']
+        return token
+
+
 class EventSerializer(serializers.ModelSerializer):
     class Meta:
         model = Event
-        fields = ['id', 'title', 'description', 'price', 'category', 'date', 'time', 'location', 'payment_options','available_tickets']
+        fields = ['id', 'title', 'description', 'price', 'min_price', 'max_price', 'category', 'date', 'time', 'location', 'payment_options','available_tickets', 'admission_rate', 'seated']
+        # Set by giving the event a seat map or ticket tiers
+        read_only_fields = ['min_price', 'max_price', 'seated']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if instance.shard_count:
+            data['available_tickets'] = instance.total_available_tickets
+        if instance.min_price is None:
+            # Without tiers every ticket sells at price
+            data['min_price'] = data['max_price'] = data['price']
+        return data
+
+    def validate_available_tickets(self, value):
+        if self.instance is None or value == self.instance.available_tickets:
+            return value
+        # A seated event's tickets are its free seats, and a tiered one's its tiers' tickets
+        if self.instance.seated:
+            raise serializers.ValidationError("A seated event's tickets are its seats; change its seat map instead.")
+        if self.instance.tiered:
+            raise serializers.ValidationError("An event with ticket tiers sells its tiers' tickets; change those instead.")
+        return value
+
+    def update(self, instance, validated_data):
+        # Sharded events keep their stock in shard rows, so a new total is spread across them
+        total = validated_data.pop('available_tickets', None) if instance.shard_count else None
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        # Only the fields given are written, so an edit never writes back
+        # the tickets or price range it read
+        instance.save(update_fields=list(validated_data))
+        if total is not None:
+            instance = shard_inventory(instance, instance.shard_count, total)
+        return instance
+
+class TicketTierSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TicketTier
+        fields = ['id', 'name', 'price', 'available_tickets']
+
+    def validate_name(self, value):
+        tiers = TicketTier.objects.filter(event=self.context['event'], name=value)
+        if self.instance is not None:
+            tiers = tiers.exclude(id=self.instance.id)
+        if tiers.exists():
+            raise serializers.ValidationError("The event already has a tier with this name.")
+        return value
+
+class SeatRowLayoutSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=10)
+    seats = serializers.IntegerField(min_value=1, max_value=seating.MAX_ROW_SEATS)
+
+class SeatSectionLayoutSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=50)
+    rows = SeatRowLayoutSerializer(many=True, allow_empty=False)
+
+class SeatMapSerializer(serializers.Serializer):
+    """A seat map to create: sections, each with its rows of seats, best first."""
+    sections = SeatSectionLayoutSerializer(many=True, allow_empty=False)
 
 class BookingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Booking
         fields = ['id', 'user', 'event', 'number_of_tickets', 'is_paid', 'payment_method', 'payment_amount', 'is_confirmed', 'is_cancelled']
-        read_only_fields = ['user', 'created_at']
\ No newline at end of file
+        read_only_fields = ['user', 'created_at']
+
+class EventSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Event
+        fields = ['id', 'title', 'date', 'time', 'location', 'category', 'price']
+
+class ExpandedBookingSerializer(BookingSerializer):
+    """A booking with a summary of its event in place of the event id."""
+    event = EventSummarySerializer(read_only=True)
+
+class SalesTotalsSerializer(serializers.Serializer):
+    """Sales totals, as kept in EventSales."""
+    bookings = serializers.IntegerField()
+    paid_bookings = serializers.IntegerField()
+    unpaid_bookings = serializers.SerializerMethodField()
+    cancelled_bookings = serializers.IntegerField()
+    tickets_sold = serializers.IntegerField()
+    paid_tickets = serializers.IntegerField()
+    cancelled_tickets = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+    def get_unpaid_bookings(self, totals):
+        return totals['bookings'] - totals['paid_bookings']
+
+class EventSalesSerializer(SalesTotalsSerializer):
+    event_id = serializers.IntegerField(source='id')
+    title = serializers.CharField()
+    date = serializers.DateField()
+    time = serializers.TimeField()
+
+def _fast_converter(field):
+    """
+    A plain function producing the same output as `field.to_representation`
+    for non-null values, or None when the value can be passed through as is.
+    """
+    if isinstance(field, serializers.DecimalField):
+        exponent = decimal.Decimal('.1') ** field.decimal_places
+        context = decimal.getcontext().copy()
+        context.prec = field.max_digits
+        rounding = field.rounding
+        return lambda value: f'{value.quantize(exponent, rounding=rounding, context=context):f}'
+    if isinstance(field, serializers.DateField):
+        output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+        return (lambda value: value.isoformat()) if output_format == ISO_8601 else field.to_representation
+    if isinstance(field, serializers.TimeField):
+        output_format = getattr(field, 'format', api_settings.TIME_FORMAT)
+        return (lambda value: value.isoformat()) if output_format == ISO_8601 else field.to_representation
+    if isinstance(field, (serializers.CharField, serializers.IntegerField, serializers.BooleanField,
+                          serializers.ChoiceField, serializers.PrimaryKeyRelatedField)):
+        return None
+    return field.to_representation
+
+
+class FastListSerializer:
+    """
+    Read-only list serializer for hot paths.
+
+    Renders rows from `.values()` with converters precompiled from the
+    fields of `serializer_class`, skipping DRF's per-field machinery while
+    producing identical output.
+    """
+    serializer_class = None
+    extra_columns = ()
+    _compiled = None
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @classmethod
+    def columns(cls):
+        return cls.compile()[0]
+
+    @classmethod
+    def compile(cls):
+        if cls.__dict__.get('_compiled') is None:
+            fields = cls.serializer_class().fields
+            names = tuple(fields)
+            # Foreign keys serialize as their raw <name>_id column
+            columns = tuple(
+                f'{name}_id' if isinstance(fields[name], serializers.PrimaryKeyRelatedField) else name
+                for name in names
+            ) + tuple(cls.extra_columns)
+            converters = tuple(
+                (index, convert) for index, convert in enumerate(_fast_converter(fields[name]) for name in names)
+                if convert is not None
+            )
+            cls._compiled = (columns, names, converters)
+        return cls._compiled
+
+    @classmethod
+    def values(cls, queryset):
+        return queryset.values(*cls.columns())
+
+    def finish(self, item, values):
+        """Hook for subclasses to adjust an item using the extra columns."""
+
+    @property
+    def data(self):
+        columns, names, converters = self.compile()
+        getter = itemgetter(*columns)
+        finish = self.finish if self.extra_columns else None
+        data = []
+        for row in self.rows:
+            values = list(getter(row))
+            for index, convert in converters:
+                if values[index] is not None:
+                    values[index] = convert(values[index])
+            item = dict(zip(names, values))
+            if finish is not None:
+                finish(item, values)
+            data.append(item)
+        return data
+
+
+class FastEventSerializer(FastListSerializer):
+    serializer_class = EventSerializer
+    extra_columns = ('shard_count', 'sharded_tickets')
+
+    def finish(self, item, values):
+        if values[-2]:
+            item['available_tickets'] = values[-1] or 0
+        if item['min_price'] is None:
+            item['min_price'] = item['max_price'] = item['price']
+
+
+class FastBookingSerializer(FastListSerializer):
+    serializer_class = BookingSerializer
+    # Needed for the keyset cursor
+    extra_columns = ('created_at',)
@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import availability, caching, calendar_index, search
+from .models import Event
+
+
+@receiver(post_save, sender=Event)
+def event_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    previous = getattr(instance, '_loaded_values', None)
+    caching.invalidate_event(instance, previous)
+    if update_fields is None or set(calendar_index.FIELDS) & update_fields:
+        calendar_index.event_saved(instance, previous, created)
+    if update_fields is None or {'title', 'description'} & update_fields:
+        search.event_changed(instance)
+    if update_fields is None or {'available_tickets', 'shard_count'} & update_fields:
+        availability.publish(instance.id)
+    # A later save of the same instance changes what this one wrote
+    saved = update_fields or [field.attname for field in Event._meta.concrete_fields]
+    instance._loaded_values = {**(previous or {}), **{name: getattr(instance, name) for name in saved}}
+
+
+@receiver(post_delete, sender=Event)
+def event_deleted(sender, instance, **kwargs):
+    caching.invalidate_event(instance)
+    calendar_index.event_deleted(instance)
+    search.event_removed(instance)
+    availability.publish(instance.id)
@@ -0,0 +1,59 @@
+"""Handlers for the background job types, registered with `jobs.handler`."""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+
+from . import authentication, jobs, payments, reservations
+
+
+@jobs.handler('refund_booking')
+def refund_booking(booking_id):
+    payments.refund_booking(booking_id)
+
+
+@jobs.handler('process_refunds')
+def process_refunds():
+    payments.process_pending_refunds()
+
+
+@jobs.handler('booking_confirmed')
+def booking_confirmed(booking_id):
+    payments.send_booking_confirmation(booking_id)
+
+
+@jobs.handler('release_expired_holds')
+def release_expired_holds():
+    # Queue the next sweep first so the chain survives a failed run
+    schedule_hold_sweep()
+    reservations.release_expired_holds()
+
+
+@jobs.handler('compact_tokens')
+def compact_tokens():
+    schedule_token_compaction()
+    authentication.compact_tokens()
+
+
+def _schedule_periodic(job_type, interval):
+    """
+    Queue `job_type` at the start of the next `interval` second slot. The
+    slot is the idempotency key, so any number of workers scheduling at
+    once still produce one run per interval.
+    """
+    slot = int(time.time() // interval) + 1
+    return jobs.enqueue(
+        job_type,
+        idempotency_key=f"{job_type.replace('_', '-')}:{slot}",
+        delay=timedelta(seconds=slot * interval - time.time()),
+    )
+
+
+def schedule_hold_sweep():
+    """Queue the next hold sweep, HOLD_SWEEP_INTERVAL seconds apart."""
+    return _schedule_periodic('release_expired_holds', settings.HOLD_SWEEP_INTERVAL)
+
+
+def schedule_token_compaction():
+    """Queue the next expired token compaction, TOKEN_COMPACTION_INTERVAL seconds apart."""
+    return _schedule_periodic('compact_tokens', settings.TOKEN_COMPACTION_INTERVAL)
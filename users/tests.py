@@ -1,11 +1,60 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import runpy
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import AsyncRequestFactory, TransactionTestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.permissions import AllowAny
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase, force_authenticate
+from rest_framework.views import APIView
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from bookmyevent.sqlite3.base import DatabaseWrapper
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from .models import Event, Booking
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.db.models import Count, QuerySet, Sum
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from . import availability, caching, jobs, metrics, reservations, search, seating, throttling, waiting_room
+from .authentication import BloomFilter, ClaimsJWTAuthentication, blacklist, compact_tokens
+from .models import Event, EventDayCount, EventInventoryShard, EventSales, Booking, ImportCheckpoint, Job, SeatRow, TicketTier
+from .idempotency import idempotent
+from .payments import PaymentRejected, cancel_payment, confirm_payment, process_pending_refunds
+from .reservations import NotEnoughTickets, shard_inventory, release_expired_holds, release_tickets, reserve_batch, reserve_tickets, cancel_booking, cancel_event
+from .serializers import EventSerializer, BookingSerializer, FastEventSerializer, FastBookingSerializer
+from .tasks import schedule_hold_sweep
+from .views import AsyncEventView, AsyncBookingListView, AvailabilityStreamView, EventView, with_async_reads
 
 User = get_user_model()
 
+# Every test's requests come from one address and reuse user ids, so buckets would carry over
+# from test to test; ThrottlingTests turns throttling back on
+no_throttling = override_settings(THROTTLE_RATES={})
+
+
+def setUpModule():
+    no_throttling.enable()
+
+
+def tearDownModule():
+    no_throttling.disable()
+
 class UserTests(APITestCase):
     def setUp(self):
         self.register_url = reverse('register')
@@ -130,6 +179,22 @@ class EventTests(APITestCase):
         response = self.client.post(self.event_url, self.event_data)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+    def test_edit_keeps_tickets_booked_meanwhile(self):
+        event = Event.objects.create(created_by=self.event_manager, **self.event_data)
+        self.client.force_authenticate(user=self.event_manager)
+        is_valid = EventSerializer.is_valid
+
+        def book_then_validate(serializer, *args, **kwargs):
+            # A booking lands after the event was read for the edit
+            reserve_tickets(self.event_manager, event, 3)
+            return is_valid(serializer, *args, **kwargs)
+
+        with mock.patch.object(EventSerializer, 'is_valid', book_then_validate):
+            response = self.client.patch(reverse('mod-event', args=[event.id]), {'title': 'Rock Concert'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        event.refresh_from_db()
+        self.assertEqual((event.title, event.available_tickets), ('Rock Concert', 97))
+
 class BookingTests(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -179,6 +244,43 @@ class BookingTests(APITestCase):
         response = self.client.post(self.booking_url, booking_data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_booking_decrements_available_tickets(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        self.client.post(self.booking_url, {'event_id': self.event.id, 'number_of_tickets': 30})
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.available_tickets, 70)
+
+    def test_booking_cannot_oversell(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        first = self.client.post(self.booking_url, {'event_id': self.event.id, 'number_of_tickets': 60})
+        second = self.client.post(self.booking_url, {'event_id': self.event.id, 'number_of_tickets': 60})
+        self.event.refresh_from_db()
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.event.available_tickets, 40)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_booking_invalid_number_of_tickets(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        for number_of_tickets in (0, -5, 'abc'):
+            response = self.client.post(self.booking_url, {'event_id': self.event.id, 'number_of_tickets': number_of_tickets})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.available_tickets, 100)
+
+    def test_cancel_booking_releases_tickets_once(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        booking_id = self.client.post(self.booking_url, {'event_id': self.event.id, 'number_of_tickets': 10}).data['booking_id']
+
+        response = self.client.post(reverse('cancel-booking'), {'booking_id': booking_id})
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        response = self.client.post(reverse('cancel-booking'), {'booking_id': booking_id})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.available_tickets, 100)
+        self.assertTrue(Booking.objects.get(id=booking_id).is_cancelled)
+
 class PaymentTests(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -236,3 +338,2237 @@ class PaymentTests(APITestCase):
         self.booking.refresh_from_db()
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertFalse(self.booking.is_paid)
+
+    def test_refund_survives_cancelling_the_booking(self):
+        confirm_payment(self.booking, 'upi')
+        cancel_payment(self.booking)
+        self.assertTrue(cancel_booking(self.booking))
+
+        with mock.patch('users.payments.issue_refund') as refund:
+            jobs.run_pending()
+        refund.assert_called_once()
+        self.booking.refresh_from_db()
+        self.assertFalse(self.booking.refund_pending)
+        self.assertEqual(EventSales.objects.filter(event=self.event).aggregate(paid=Sum('paid_bookings'))['paid'], 0)
+
+    def test_repaying_waits_for_the_pending_refund(self):
+        confirm_payment(self.booking, 'upi')
+        cancel_payment(self.booking)
+        with self.assertRaises(PaymentRejected):
+            confirm_payment(self.booking, 'card')
+
+        with mock.patch('users.payments.issue_refund') as refund:
+            jobs.run_pending()
+        refund.assert_called_once_with(self.booking.id, self.booking.payment_amount, 'upi')
+
+        confirm_payment(self.booking, 'card')
+        self.booking.refresh_from_db()
+        self.assertTrue(self.booking.is_paid)
+        self.assertEqual(self.booking.payment_method, 'card')
+
+class ShardedInventoryTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='testuser@example.com',
+            password='testpassword'
+        )
+        self.event_manager = User.objects.create_user(
+            username='eventmanager',
+            email='eventmanager@example.com',
+            password='managerpassword',
+            role='event_manager'
+        )
+        self.event = Event.objects.create(
+            title='Music Concert',
+            description='A grand music concert.',
+            date='2024-12-15',
+            time='18:00:00',
+            location='bengaluru',
+            category='music',
+            payment_options='card, net banking',
+            available_tickets=100,
+            price=500.00,
+            created_by=self.event_manager
+        )
+        self.event = shard_inventory(self.event, 4)
+        self.booking_url = reverse('book-ticket')
+        self.client.force_authenticate(user=self.user)
+
+    def test_shard_inventory_splits_stock(self):
+        shards = list(EventInventoryShard.objects.filter(event=self.event).values_list('available_tickets', flat=True))
+        self.assertEqual(sorted(shards), [25, 25, 25, 25])
+        self.assertEqual(self.event.available_tickets, 0)
+        self.assertEqual(self.event.total_available_tickets, 100)
+
+    def test_booking_takes_from_shards(self):
+        response = self.client.post(self.booking_url, {'event_id': self.event.id, 'number_of_tickets': 10})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.get(reverse('mod-event', args=[self.event.id]))
+        self.assertEqual(response.data['available_tickets'], 90)
+        response = self.client.get(reverse('create-event'))
+        self.assertEqual(response.data['results'][0]['available_tickets'], 90)
+
+    def test_booking_gathers_across_shards(self):
+        response = self.client.post(self.booking_url, {'event_id': self.event.id, 'number_of_tickets': 60})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.event.total_available_tickets, 40)
+
+        response = self.client.post(self.booking_url, {'event_id': self.event.id, 'number_of_tickets': 41})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.event.total_available_tickets, 40)
+
+    def test_cancel_booking_releases_to_shards(self):
+        booking_id = self.client.post(self.booking_url, {'event_id': self.event.id, 'number_of_tickets': 30}).data['booking_id']
+        self.client.post(reverse('cancel-booking'), {'booking_id': booking_id})
+        self.assertEqual(self.event.total_available_tickets, 100)
+
+    def test_update_redistributes_shards(self):
+        self.client.force_authenticate(user=self.event_manager)
+        response = self.client.patch(reverse('mod-event', args=[self.event.id]), {'available_tickets': 40})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.shard_count, 4)
+        self.assertEqual(self.event.total_available_tickets, 40)
+
+class EventListingTests(APITestCase):
+    def setUp(self):
+        self.event_url = reverse('create-event')
+        self.event_manager = User.objects.create_user(
+            username='eventmanager',
+            email='eventmanager@example.com',
+            password='managerpassword',
+            role='event_manager'
+        )
+        # Several events share a date and time so the id tiebreaker is exercised
+        for index in range(25):
+            Event.objects.create(
+                title=f'Event {index}',
+                description='An event.',
+                date=f'2024-12-{10 + index % 5}',
+                time='18:00:00' if index % 2 else '20:00:00',
+                location='bengaluru' if index % 3 else 'chennai',
+                category='music',
+                payment_options='card',
+                available_tickets=100,
+                price=500.00,
+                created_by=self.event_manager
+            )
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(event['id'] for event in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_pages_follow_date_time_id_order(self):
+        ids = self.walk(f'{self.event_url}?page_size=7')
+        expected = list(Event.objects.order_by('date', 'time', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_pagination_respects_filters(self):
+        ids = self.walk(f'{self.event_url}?location=chennai&page_size=3')
+        expected = list(Event.objects.filter(location='chennai').order_by('date', 'time', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_default_and_capped_page_size(self):
+        response = self.client.get(self.event_url)
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertIsNotNone(response.data['next'])
+
+        response = self.client.get(f'{self.event_url}?page_size=1000')
+        self.assertEqual(len(response.data['results']), 25)
+        self.assertIsNone(response.data['next'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(f'{self.event_url}?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class EventCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.event_url = reverse('create-event')
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='testuser@example.com',
+            password='testpassword'
+        )
+        self.event_manager = User.objects.create_user(
+            username='eventmanager',
+            email='eventmanager@example.com',
+            password='managerpassword',
+            role='event_manager'
+        )
+        self.event = self.create_event('chennai')
+
+    def create_event(self, location):
+        return Event.objects.create(
+            title='Music Concert',
+            description='A grand music concert.',
+            date='2024-12-15',
+            time='18:00:00',
+            location=location,
+            category='music',
+            payment_options='card, net banking',
+            available_tickets=100,
+            price=500.00,
+            created_by=self.event_manager
+        )
+
+    def test_detail_is_cached_until_event_changes(self):
+        detail_url = reverse('mod-event', args=[self.event.id])
+        self.assertEqual(self.client.get(detail_url)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(detail_url)['X-Cache'], 'HIT')
+
+        self.client.force_authenticate(user=self.event_manager)
+        self.client.patch(detail_url, {'title': 'Renamed Concert'})
+        response = self.client.get(detail_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['title'], 'Renamed Concert')
+
+    def test_booking_invalidates_detail(self):
+        detail_url = reverse('mod-event', args=[self.event.id])
+        self.client.get(detail_url)
+
+        self.client.force_authenticate(user=self.user)
+        self.client.post(reverse('book-ticket'), {'event_id': self.event.id, 'number_of_tickets': 5})
+        response = self.client.get(detail_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['available_tickets'], 95)
+
+    def test_booking_leaves_listings_cached(self):
+        self.client.get(self.event_url)
+
+        self.client.force_authenticate(user=self.user)
+        self.client.post(reverse('book-ticket'), {'event_id': self.event.id, 'number_of_tickets': 5})
+        response = self.client.get(self.event_url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.data['results'][0]['available_tickets'], 100)
+
+        self.assertEqual(self.client.get(reverse('mod-event', args=[self.event.id])).data['available_tickets'], 95)
+
+        # Listing pages expire sooner than other entries
+        with mock.patch.object(caching.cache, 'set') as cache_set:
+            self.client.get(f'{self.event_url}?location=chennai')
+        self.assertEqual(cache_set.call_args.kwargs['timeout'], settings.EVENT_LISTING_CACHE_TIMEOUT)
+
+    def test_listing_invalidation_is_per_filter(self):
+        chennai_url = f'{self.event_url}?location=chennai'
+        self.client.get(chennai_url)
+
+        # A write in another city leaves the chennai page cached
+        self.create_event('pune')
+        self.assertEqual(self.client.get(chennai_url)['X-Cache'], 'HIT')
+
+        # Moving the chennai event away invalidates the page it left
+        self.client.force_authenticate(user=self.event_manager)
+        self.client.patch(reverse('mod-event', args=[self.event.id]), {'location': 'delhi'})
+        response = self.client.get(chennai_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'], [])
+
+    def test_hit_and_miss_counters(self):
+        before = caching.stats()
+        self.client.get(self.event_url)
+        self.client.get(self.event_url)
+        after = caching.stats()
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+
+class FastSerializerTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='testuser@example.com',
+            password='testpassword'
+        )
+        self.event_manager = User.objects.create_user(
+            username='eventmanager',
+            email='eventmanager@example.com',
+            password='managerpassword',
+            role='event_manager'
+        )
+        for index, price in enumerate(['500.00', '499.5', '0', '12345678.99']):
+            event = Event.objects.create(
+                title=f'Event {index}',
+                description='An event with "quotes" and ünïcode.',
+                date='2024-12-15',
+                time='18:30:15' if index % 2 else '09:00:00',
+                location='bengaluru',
+                category='music',
+                payment_options='card, net banking',
+                available_tickets=100,
+                price=price,
+                created_by=self.event_manager
+            )
+            Booking.objects.create(user=self.user, event=event, number_of_tickets=2, price_per_ticket=price)
+        shard_inventory(event, 3)
+        Booking.objects.create(user=self.user, event=None, number_of_tickets=1, price_per_ticket='10.00',
+                               payment_amount='10.00', is_paid=True, payment_method='card')
+
+    def test_fast_event_serializer_matches(self):
+        events = Event.objects.with_inventory().order_by('id')
+        expected = JSONRenderer().render(EventSerializer(events, many=True).data)
+        actual = JSONRenderer().render(FastEventSerializer(FastEventSerializer.values(events)).data)
+        self.assertEqual(actual, expected)
+
+    def test_fast_booking_serializer_matches(self):
+        bookings = Booking.objects.order_by('id')
+        expected = JSONRenderer().render(BookingSerializer(bookings, many=True).data)
+        actual = JSONRenderer().render(FastBookingSerializer(FastBookingSerializer.values(bookings)).data)
+        self.assertEqual(actual, expected)
+
+class BookingListTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('my-bookings')
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='testuser@example.com',
+            password='testpassword'
+        )
+        self.event_manager = User.objects.create_user(
+            username='eventmanager',
+            email='eventmanager@example.com',
+            password='managerpassword',
+            role='event_manager'
+        )
+        self.events = [
+            Event.objects.create(
+                title=f'Event {index}',
+                description='An event.',
+                date='2024-12-15',
+                time='18:00:00',
+                location='bengaluru',
+                category='music',
+                payment_options='card',
+                available_tickets=100,
+                price=500.00,
+                created_by=self.event_manager
+            )
+            for index in range(3)
+        ]
+        self.client.force_authenticate(user=self.user)
+
+    def book(self, count):
+        # Bookings share a created_at so the id tiebreaker is exercised
+        created_at = timezone.now()
+        bookings = Booking.objects.bulk_create([
+            Booking(user=self.user, event=self.events[index % 3], number_of_tickets=1, price_per_ticket='500.00')
+            for index in range(count)
+        ])
+        Booking.objects.filter(id__in=[booking.id for booking in bookings]).update(created_at=created_at)
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(booking['id'] for booking in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_pages_follow_newest_first(self):
+        self.book(5)
+        self.book(6)
+        Booking.objects.create(user=self.event_manager, event=self.events[0], number_of_tickets=1, price_per_ticket='500.00')
+
+        expected = list(Booking.objects.filter(user=self.user).order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk(f'{self.url}?page_size=4'), expected)
+        self.assertEqual(self.walk(f'{self.url}?page_size=4&expand=event'), expected)
+
+    def test_expand_event_embeds_summary(self):
+        self.book(1)
+        response = self.client.get(f'{self.url}?expand=event')
+        event = response.data['results'][0]['event']
+        self.assertEqual(event['id'], self.events[0].id)
+        self.assertEqual(event['title'], 'Event 0')
+        self.assertEqual(event['price'], '500.00')
+
+        self.events[0].delete()
+        response = self.client.get(f'{self.url}?expand=event')
+        self.assertIsNone(response.data['results'][0]['event'])
+
+    def test_query_count_does_not_grow_with_bookings(self):
+        for count in (2, 40):
+            Booking.objects.all().delete()
+            self.book(count)
+            for query in ('', '?expand=event'):
+                with self.assertNumQueries(1):
+                    response = self.client.get(f'{self.url}{query}')
+                self.assertEqual(len(response.data['results']), min(count, 20))
+
+class EventSearchTests(APITestCase):
+    def setUp(self):
+        search.index.clear()
+        self.search_url = reverse('search-events')
+        self.event_manager = User.objects.create_user(
+            username='eventmanager',
+            email='eventmanager@example.com',
+            password='managerpassword',
+            role='event_manager'
+        )
+        self.rock = self.create_event('Rock Concert', 'Live music under the stars.')
+        self.jazz = self.create_event('Jazz Night', 'A smooth concert of jazz standards.')
+        self.cricket = self.create_event('Cricket Final', 'The season finale at the stadium.')
+
+    def create_event(self, title, description):
+        return Event.objects.create(
+            title=title,
+            description=description,
+            date='2024-12-15',
+            time='18:00:00',
+            location='bengaluru',
+            category='music',
+            payment_options='card',
+            available_tickets=100,
+            price=500.00,
+            created_by=self.event_manager
+        )
+
+    def search(self, query):
+        response = self.client.get(self.search_url, {'q': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [event['id'] for event in response.data['results']]
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.search('concert'), [self.rock.id, self.jazz.id])
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.search('jazz concert'), [self.jazz.id])
+        self.assertEqual(self.search('cricket concert'), [])
+
+    def test_prefix_and_accent_insensitive(self):
+        self.assertEqual(self.search('Conc'), [self.rock.id, self.jazz.id])
+        self.assertEqual(self.search('crícket fin'), [self.cricket.id])
+
+    def test_index_follows_writes(self):
+        self.search('warmup')
+        self.client.force_authenticate(user=self.event_manager)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('mod-event', args=[self.rock.id]), {'title': 'Blues Evening'}, format='json')
+            opera = self.create_event('Opera Gala', 'An evening of arias.')
+            self.client.delete(reverse('mod-event', args=[self.cricket.id]))
+
+        self.assertEqual(self.search('rock'), [])
+        self.assertEqual(self.search('evening'), [self.rock.id, opera.id])
+        self.assertEqual(self.search('cricket'), [])
+
+    def test_query_required(self):
+        response = self.client.get(self.search_url, {'q': '  '})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class AsyncReadViewTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='testuser@example.com',
+            password='testpassword'
+        )
+        self.event_manager = User.objects.create_user(
+            username='eventmanager',
+            email='eventmanager@example.com',
+            password='managerpassword',
+            role='event_manager'
+        )
+        for index in range(5):
+            event = Event.objects.create(
+                title=f'Event {index}',
+                description='An event.',
+                date=f'2024-12-{10 + index}',
+                time='18:00:00',
+                location='bengaluru' if index % 2 else 'chennai',
+                category='music',
+                payment_options='card',
+                available_tickets=100,
+                price=500.00,
+                created_by=self.event_manager
+            )
+            Booking.objects.create(user=self.user, event=event, number_of_tickets=2, price_per_ticket='500.00')
+        shard_inventory(event, 3)
+        self.factory = AsyncRequestFactory()
+
+    def fetch(self, view, path, token=None, **kwargs):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        return async_to_sync(view)(self.factory.get(path, headers=headers), **kwargs)
+
+    def assertSameResponse(self, response, path, token=None):
+        # Compare against the APIView with a cold cache
+        cache.clear()
+        if token:
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        expected = self.client.get(path)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+
+    def test_event_reads_match_sync(self):
+        view = AsyncEventView.as_view()
+        event_id = Event.objects.latest('id').id
+        for path, kwargs in [
+            (reverse('mod-event', args=[event_id]), {'event_id': event_id}),
+            (reverse('mod-event', args=[0]), {'event_id': 0}),
+            (f"{reverse('create-event')}?page_size=2", {}),
+            (f"{reverse('create-event')}?location=bengaluru", {}),
+            (f"{reverse('create-event')}?cursor=not-a-cursor", {}),
+        ]:
+            response = self.fetch(view, path, **kwargs)
+            self.assertSameResponse(response, path)
+
+        first_page = self.fetch(view, f"{reverse('create-event')}?page_size=2")
+        next_page = json.loads(first_page.content)['next']
+        self.assertSameResponse(self.fetch(view, next_page), next_page)
+
+    def test_event_reads_are_cached(self):
+        view = AsyncEventView.as_view()
+        path = reverse('create-event')
+        self.assertEqual(self.fetch(view, path)['X-Cache'], 'MISS')
+        self.assertEqual(self.fetch(view, path)['X-Cache'], 'HIT')
+
+    def test_booking_list_matches_sync(self):
+        view = AsyncBookingListView.as_view()
+        token = str(AccessToken.for_user(self.user))
+        url = reverse('my-bookings')
+        for path in [f'{url}?page_size=2', f'{url}?expand=event']:
+            self.assertSameResponse(self.fetch(view, path, token), path, token)
+
+        self.client.credentials()
+        response = self.fetch(view, url)
+        self.assertSameResponse(response, url)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+        self.assertSameResponse(self.fetch(view, url, 'not-a-token'), url, 'not-a-token')
+
+    def test_writes_go_to_sync_view(self):
+        view = with_async_reads(EventView.as_view(), AsyncEventView.as_view())
+        request = self.factory.post(
+            reverse('create-event'),
+            {'title': 'Async Gala', 'description': 'An event.', 'date': '2024-12-20', 'time': '18:00:00',
+             'location': 'pune', 'category': 'music', 'payment_options': 'card', 'available_tickets': 10,
+             'price': '100.00'},
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {AccessToken.for_user(self.event_manager)}'},
+        )
+        response = async_to_sync(view)(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Event.objects.filter(title='Async Gala').exists())
+
+class AvailabilityStreamTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='testuser@example.com',
+            password='testpassword'
+        )
+        self.event_manager = User.objects.create_user(
+            username='eventmanager',
+            email='eventmanager@example.com',
+            password='managerpassword',
+            role='event_manager'
+        )
+        self.events = [
+            Event.objects.create(
+                title=f'Event {index}',
+                description='An event.',
+                date='2024-12-15',
+                time='18:00:00',
+                location='bengaluru',
+                category='music',
+                payment_options='card',
+                available_tickets=100,
+                price=500.00,
+                created_by=self.event_manager
+            )
+            for index in range(2)
+        ]
+        shard_inventory(self.events[1], 3)
+        self.url = reverse('event-availability')
+        self.factory = AsyncRequestFactory()
+
+    def test_stream_reports_coalesced_changes(self):
+        first, second = self.events
+        # Deleting an event clears its id
+        first_id, second_id = first.id, second.id
+        path = f'{self.url}?events={first_id},{second_id}'
+
+        def book():
+            with self.captureOnCommitCallbacks(execute=True):
+                reserve_tickets(self.user, first, 2)
+                reserve_tickets(self.user, first, 3)
+
+        def delete():
+            with self.captureOnCommitCallbacks(execute=True):
+                cancel_event(first)
+                cancel_event(second)
+
+        async def read():
+            response = await AvailabilityStreamView.as_view()(self.factory.get(path))
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            messages = response.streaming_content
+            received = [await anext(messages), await anext(messages)]
+            await sync_to_async(book)()
+            received.append(await anext(messages))
+            await sync_to_async(delete)()
+            # The stream ends once every event it follows is deleted
+            received += [message async for message in messages]
+            return [message.decode() for message in received]
+
+        with self.settings(AVAILABILITY_STREAM_INTERVAL=0.01):
+            retry, snapshot, booked, *deleted = async_to_sync(read)()
+
+        self.assertEqual(retry, 'retry: 3000\n\n')
+        self.assertEqual(snapshot, 'event: availability\ndata: %s\n\n' % json.dumps([
+            {'event_id': first_id, 'available_tickets': 100},
+            {'event_id': second_id, 'available_tickets': 100},
+        ]))
+        self.assertEqual(booked, 'event: availability\ndata: %s\n\n' % json.dumps([
+            {'event_id': first_id, 'available_tickets': 95},
+        ]))
+        deleted_ids = [event_id for message in deleted for event_id in json.loads(message.split('data: ')[1])]
+        self.assertTrue(all(message.startswith('event: deleted\n') for message in deleted))
+        self.assertCountEqual(deleted_ids, [first_id, second_id])
+        self.assertEqual(availability.broker.subscriptions, {})
+
+    def test_fanout_picks_up_other_processes_writes(self):
+        event = self.events[0]
+
+        async def flush_after(write):
+            subscription = availability.broker.subscribe([event.id])
+            try:
+                await availability.broker.flush()
+                # A write from another process only bumps the shared cache version
+                await sync_to_async(write)()
+                await availability.broker.flush()
+                return subscription.changes
+            finally:
+                availability.broker.unsubscribe(subscription)
+
+        def write():
+            Event.objects.filter(id=event.id).update(available_tickets=40)
+            caching.bump([f'event:{event.id}'])
+
+        with self.settings(AVAILABILITY_STREAM_FANOUT=True):
+            self.assertEqual(async_to_sync(flush_after)(write), {event.id: 40})
+        self.assertEqual(async_to_sync(flush_after)(write), {})
+
+    def test_asgi_handler_ends_stream_on_disconnect(self):
+        event_id = self.events[0].id
+        sent, passed_on = [], []
+
+        async def serve(query):
+            disconnect = asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+                # Leave after the response start, retry field and snapshot
+                if len(sent) == 3:
+                    disconnect.set()
+
+            async def django_application(scope, receive, send):
+                passed_on.append(scope['query_string'])
+
+            scope = {
+                'type': 'http', 'method': 'GET', 'path': self.url, 'query_string': query.encode(),
+                'headers': [(b'host', b'testserver')],
+            }
+            await availability.StreamHandler(django_application)(scope, receive, send)
+
+        async_to_sync(serve)(f'events={event_id}')
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), sent[0]['headers'])
+        self.assertEqual(sent[2]['body'].decode(), 'event: availability\ndata: %s\n\n' % json.dumps([
+            {'event_id': event_id, 'available_tickets': 100},
+        ]))
+        self.assertEqual(availability.broker.subscriptions, {})
+
+        # Invalid requests are left to Django
+        async_to_sync(serve)('events=two')
+        self.assertEqual(passed_on, [b'events=two'])
+        self.assertEqual(len(sent), 3)
+
+    def test_wsgi_gets_snapshot_only(self):
+        response = self.client.get(f'{self.url}?events={self.events[0].id},0')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content.decode(), 'retry: 3000\n\nevent: availability\ndata: %s\n\nevent: deleted\ndata: [0]\n\n' % json.dumps([
+            {'event_id': self.events[0].id, 'available_tickets': 100},
+        ]))
+
+    def test_invalid_event_ids(self):
+        for query in ['', '?events=', '?events=1,two', '?events=' + ','.join(map(str, range(51)))]:
+            response = self.client.get(f'{self.url}{query}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+@mock.patch.object(APIView, 'authentication_classes', [ClaimsJWTAuthentication])
+class ClaimsAuthenticationTests(APITestCase):
+    def setUp(self):
+        blacklist.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='testuser@example.com',
+            password='testpassword'
+        )
+        self.admin = User.objects.create_superuser(
+            username='adminuser',
+            email='adminuser@example.com',
+            password='adminpassword'
+        )
+        self.event = Event.objects.create(
+            title='Music Concert',
+            description='A grand music concert.',
+            date='2024-12-15',
+            time='18:00:00',
+            location='bengaluru',
+            category='music',
+            payment_options='card',
+            available_tickets=100,
+            price=500.00,
+            created_by=self.admin
+        )
+
+    def login(self, username, password):
+        tokens = self.client.post(reverse('login'), {'username': username, 'password': password}).data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        return tokens
+
+    def user_queries(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data)
+        return response, [query['sql'] for query in queries if '"users_user"' in query['sql']]
+
+    def test_requests_skip_the_user_query(self):
+        tokens = self.login('testuser', 'testpassword')
+        access = AccessToken(tokens['access'])
+        self.assertEqual((access['role'], access['is_staff']), ('user', False))
+
+        response, user_queries = self.user_queries('post', reverse('book-ticket'), {'event_id': self.event.id, 'number_of_tickets': 2})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(user_queries, [])
+        self.assertEqual(Booking.objects.get().user, self.user)
+
+        response, user_queries = self.user_queries('get', reverse('my-bookings'))
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(user_queries, [])
+
+        # Sessions missing from the blacklist filter need no query
+        with self.assertNumQueries(1):
+            self.client.get(reverse('my-bookings'))
+
+    def test_owner_checks_use_token_id(self):
+        self.login('testuser', 'testpassword')
+        booking = Booking.objects.create(user=self.user, event=self.event, number_of_tickets=1, price_per_ticket='500.00')
+        response = self.client.post(reverse('cancel-booking'), {'booking_id': booking.id})
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_owner_can_pay_and_revert_payment(self):
+        self.login('testuser', 'testpassword')
+        booking_id = self.client.post(reverse('book-ticket'), {'event_id': self.event.id, 'number_of_tickets': 1}).data['booking_id']
+        response = self.client.post(reverse('make-payment'), {'booking_id': booking_id, 'payment_method': 'card'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse('cancel-payment'), {'booking_id': booking_id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Another user's token still can't
+        self.login('adminuser', 'adminpassword')
+        response = self.client.post(reverse('cancel-booking'), {'booking_id': booking_id})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_logout_revokes_access_token(self):
+        tokens = self.login('testuser', 'testpassword')
+        self.assertEqual(self.client.get(reverse('my-bookings')).status_code, status.HTTP_200_OK)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('logout'), {'refresh': tokens['refresh']})
+        self.assertEqual(self.client.get(reverse('my-bookings')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # A process building its filter afresh finds it in the table
+        blacklist.clear()
+        self.assertEqual(self.client.get(reverse('my-bookings')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logouts_elsewhere_apply_after_sync(self):
+        tokens = self.login('testuser', 'testpassword')
+        self.assertEqual(self.client.get(reverse('my-bookings')).status_code, status.HTTP_200_OK)
+        # Blacklisted by another process, so this one's filter hasn't seen it
+        RefreshToken(tokens['refresh']).blacklist()
+        self.assertEqual(self.client.get(reverse('my-bookings')).status_code, status.HTTP_200_OK)
+
+        with mock.patch('users.authentication.time.monotonic', return_value=time.monotonic() + settings.AUTH_BLACKLIST_SYNC_INTERVAL + 1):
+            self.assertEqual(self.client.get(reverse('my-bookings')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_role_change_revokes_sessions(self):
+        self.login('testuser', 'testpassword')
+        self.assertEqual(self.client.get(reverse('my-bookings')).status_code, status.HTTP_200_OK)
+
+        admin = APIClient()
+        admin.credentials(HTTP_AUTHORIZATION=f"Bearer {admin.post(reverse('login'), {'username': 'adminuser', 'password': 'adminpassword'}).data['access']}")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = admin.post(reverse('manage-role'), {'username': 'testuser', 'action': 'promote'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(reverse('my-bookings')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.login('testuser', 'testpassword')
+        self.assertEqual(self.client.put(reverse('mod-event', args=[self.event.id]), {}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_tokens_without_claims_load_the_user(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        response, user_queries = self.user_queries('get', reverse('my-bookings'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(user_queries), 1)
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(capacity=5000)
+        members = [f'member-{index}' for index in range(5000)]
+        for member in members:
+            bloom.add(member)
+        self.assertTrue(all(member in bloom for member in members))
+        false_positives = sum(f'other-{index}' in bloom for index in range(5000))
+        self.assertLess(false_positives, 25)
+
+    def test_compact_tokens_deletes_expired(self):
+        now = timezone.now()
+        for index in range(5):
+            token = OutstandingToken.objects.create(
+                user=self.user, jti=f'jti-{index}', token='token', created_at=now,
+                expires_at=now + timedelta(days=-1 if index < 3 else 1),
+            )
+            if index % 2 == 0:
+                BlacklistedToken.objects.create(token=token)
+
+        self.assertEqual(compact_tokens(batch_size=2), 3)
+        self.assertEqual(set(OutstandingToken.objects.values_list('jti', flat=True)), {'jti-3', 'jti-4'})
+        self.assertEqual(list(BlacklistedToken.objects.values_list('token__jti', flat=True)), ['jti-4'])
+
+class EventCancellationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='testuser@example.com',
+            password='testpassword'
+        )
+        self.event_manager = User.objects.create_user(
+            username='eventmanager',
+            email='eventmanager@example.com',
+            password='managerpassword',
+            role='event_manager'
+        )
+        self.client.force_authenticate(user=self.event_manager)
+
+    def create_event_with_bookings(self, count):
+        event = Event.objects.create(
+            title='Music Concert',
+            description='A grand music concert.',
+            date='2024-12-15',
+            time='18:00:00',
+            location='bengaluru',
+            category='music',
+            payment_options='card, net banking',
+            available_tickets=1000,
+            price=500.00,
+            created_by=self.event_manager
+        )
+        Booking.objects.bulk_create([
+            Booking(user=self.user, event=event, number_of_tickets=1, price_per_ticket=500, payment_amount=500,
+                    is_paid=bool(index % 2), is_confirmed=bool(index % 2), payment_method='card' if index % 2 else None)
+            for index in range(count)
+        ])
+        return event
+
+    def delete_event(self, event):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(reverse('mod-event', args=[event.id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        return len(queries)
+
+    def test_delete_cancels_bookings_and_flags_refunds(self):
+        event = self.create_event_with_bookings(6)
+        self.delete_event(event)
+
+        self.assertFalse(Event.objects.filter(id=event.id).exists())
+        self.assertEqual(Booking.objects.filter(is_cancelled=True, event=None).count(), 6)
+        self.assertFalse(Booking.objects.filter(is_paid=True).exists())
+        self.assertEqual(Booking.objects.filter(refund_pending=True).count(), 3)
+
+        self.assertEqual(process_pending_refunds(batch_size=2), 3)
+        self.assertFalse(Booking.objects.filter(refund_pending=True).exists())
+        self.assertFalse(Booking.objects.exclude(payment_method=None).exists())
+
+    def test_failed_refund_does_not_resend_earlier_ones(self):
+        self.delete_event(self.create_event_with_bookings(6))
+        sent = []
+
+        def refund(booking_id, amount, payment_method):
+            if len(sent) == 2 and not hasattr(refund, 'failed'):
+                refund.failed = True
+                raise ConnectionError('provider down')
+            sent.append(booking_id)
+
+        with mock.patch('users.payments.issue_refund', side_effect=refund):
+            with self.assertRaises(ConnectionError):
+                process_pending_refunds()
+            self.assertEqual(process_pending_refunds(), 1)
+
+        self.assertEqual(len(sent), 3)
+        self.assertEqual(len(set(sent)), 3)
+        self.assertFalse(Booking.objects.filter(refund_pending=True).exists())
+
+    def test_delete_query_count_is_independent_of_bookings(self):
+        small = self.delete_event(self.create_event_with_bookings(2))
+        large = self.delete_event(self.create_event_with_bookings(200))
+        self.assertEqual(small, large)
+
+class JobQueueTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='testuser@example.com',
+            password='testpassword'
+        )
+        self.event_manager = User.objects.create_user(
+            username='eventmanager',
+            email='eventmanager@example.com',
+            password='managerpassword',
+            role='event_manager'
+        )
+        self.event = Event.objects.create(
+            title='Music Concert',
+            description='A grand music concert.',
+            date='2024-12-15',
+            time='18:00:00',
+            location='bengaluru',
+            category='music',
+            payment_options='card, net banking',
+            available_tickets=100,
+            price=500.00,
+            created_by=self.event_manager
+        )
+        self.booking = Booking.objects.create(
+            user=self.user,
+            event=self.event,
+            number_of_tickets=2,
+            price_per_ticket=500.00,
+            payment_amount=1000.00
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_payment_queues_confirmation(self):
+        self.client.post(reverse('make-payment'), {'booking_id': self.booking.id, 'payment_method': 'card'})
+        job = Job.objects.get()
+        self.assertEqual((job.job_type, job.payload), ('booking_confirmed', {'booking_id': self.booking.id}))
+
+        self.assertEqual(jobs.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+
+    def test_cancelled_payment_is_refunded_by_worker(self):
+        self.client.post(reverse('make-payment'), {'booking_id': self.booking.id, 'payment_method': 'card'})
+        response = self.client.post(reverse('cancel-payment'), {'booking_id': self.booking.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.booking.refresh_from_db()
+        self.assertTrue(self.booking.refund_pending)
+        self.assertEqual(self.booking.payment_method, 'card')
+
+        jobs.run_pending()
+        self.booking.refresh_from_db()
+        self.assertFalse(self.booking.refund_pending)
+        self.assertIsNone(self.booking.payment_method)
+        self.assertFalse(Job.objects.exclude(status=Job.DONE).exists())
+
+    def test_cancelling_paid_booking_queues_refund(self):
+        self.client.post(reverse('make-payment'), {'booking_id': self.booking.id, 'payment_method': 'card'})
+        self.client.post(reverse('cancel-booking'), {'booking_id': self.booking.id})
+        self.assertTrue(Job.objects.filter(job_type='refund_booking', payload={'booking_id': self.booking.id}).exists())
+
+    def test_idempotency_key_deduplicates(self):
+        first = jobs.enqueue('process_refunds', idempotency_key='event-refunds:1')
+        second = jobs.enqueue('process_refunds', idempotency_key='event-refunds:1')
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_failed_job_retries_with_backoff_then_fails(self):
+        calls = []
+
+        @jobs.handler('test_flaky')
+        def flaky():
+            calls.append(1)
+            raise RuntimeError('provider unavailable')
+
+        job = jobs.enqueue('test_flaky')
+        Job.objects.filter(id=job.id).update(max_attempts=2)
+
+        jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIn('provider unavailable', job.last_error)
+
+        Job.objects.filter(id=job.id).update(run_after=timezone.now())
+        jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertEqual(len(calls), 2)
+        self.assertGreaterEqual(jobs.metrics.snapshot()['test_flaky']['failed'], 1)
+
+class IdempotencyTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='testuser@example.com',
+            password='testpassword'
+        )
+        self.event_manager = User.objects.create_user(
+            username='eventmanager',
+            email='eventmanager@example.com',
+            password='managerpassword',
+            role='event_manager'
+        )
+        self.event = Event.objects.create(
+            title='Music Concert',
+            description='A grand music concert.',
+            date='2024-12-15',
+            time='18:00:00',
+            location='bengaluru',
+            category='music',
+            payment_options='card, net banking',
+            available_tickets=100,
+            price=500.00,
+            created_by=self.event_manager
+        )
+        self.booking_url = reverse('book-ticket')
+        self.client.force_authenticate(user=self.user)
+
+    def book(self, key, number_of_tickets=2):
+        return self.client.post(self.booking_url, {'event_id': self.event.id, 'number_of_tickets': number_of_tickets},
+                                HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retried_booking_is_replayed(self):
+        first = self.book('retry-1')
+        second = self.book('retry-1')
+
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.data['booking_id'], first.data['booking_id'])
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Booking.objects.count(), 1)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.available_tickets, 98)
+
+    def test_distinct_keys_book_separately(self):
+        self.book('order-1')
+        self.book('order-2')
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_key_reused_with_different_body(self):
+        self.book('order-1')
+        response = self.book('order-1', number_of_tickets=3)
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_keys_are_scoped_per_user(self):
+        self.book('shared-key')
+        self.client.force_authenticate(user=self.event_manager)
+        self.book('shared-key')
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_retried_payment_is_replayed(self):
+        booking_id = self.book('order-1').data['booking_id']
+        payment = {'booking_id': booking_id, 'payment_method': 'card'}
+        first = self.client.post(reverse('make-payment'), payment, HTTP_IDEMPOTENCY_KEY='pay-1')
+        second = self.client.post(reverse('make-payment'), payment, HTTP_IDEMPOTENCY_KEY='pay-1')
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(Job.objects.filter(job_type='booking_confirmed').count(), 1)
+
+    def test_retry_later_responses_are_not_stored(self):
+        outcomes = [status.HTTP_429_TOO_MANY_REQUESTS, status.HTTP_503_SERVICE_UNAVAILABLE, status.HTTP_201_CREATED]
+
+        class BusyView(APIView):
+            permission_classes = [AllowAny]
+
+            @idempotent
+            def post(self, request):
+                return Response({}, status=outcomes.pop(0))
+
+        view = BusyView.as_view()
+        factory = APIRequestFactory()
+
+        def send():
+            request = factory.post('/busy/', {'a': 1}, format='json', HTTP_IDEMPOTENCY_KEY='later')
+            force_authenticate(request, user=self.user)
+            return view(request).status_code
+
+        self.assertEqual([send() for _ in range(4)], [429, 503, 201, 201])
+        self.assertEqual(outcomes, [])
+
+    def test_concurrent_duplicates_run_once(self):
+        calls = []
+
+        class SlowView(APIView):
+            permission_classes = [AllowAny]
+
+            @idempotent
+            def post(self, request):
+                calls.append(1)
+                time.sleep(0.2)
+                return Response({'call': len(calls)}, status=status.HTTP_201_CREATED)
+
+        view = SlowView.as_view()
+        factory = APIRequestFactory()
+
+        def send(_):
+            request = factory.post('/slow/', {'a': 1}, format='json', HTTP_IDEMPOTENCY_KEY='burst')
+            force_authenticate(request, user=self.user)
+            return view(request)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            responses = list(pool.map(send, range(8)))
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(response.status_code == 201 and response.data == {'call': 1} for response in responses))
+
+class HoldExpiryTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='testuser@example.com',
+            password='testpassword'
+        )
+        self.event_manager = User.objects.create_user(
+            username='eventmanager',
+            email='eventmanager@example.com',
+            password='managerpassword',
+            role='event_manager'
+        )
+        self.event = Event.objects.create(
+            title='Music Concert',
+            description='A grand music concert.',
+            date='2024-12-15',
+            time='18:00:00',
+            location='bengaluru',
+            category='music',
+            payment_options='card, net banking',
+            available_tickets=100,
+            price=500.00,
+            created_by=self.event_manager
+        )
+        self.booking_url = reverse('book-ticket')
+        self.client.force_authenticate(user=self.user)
+
+    def book(self, number_of_tickets, expired=False):
+        response = self.client.post(self.booking_url, {'event_id': self.event.id, 'number_of_tickets': number_of_tickets})
+        booking_id = response.data['booking_id']
+        if expired:
+            Booking.objects.filter(id=booking_id).update(
+                created_at=timezone.now() - timedelta(seconds=settings.BOOKING_HOLD_TTL + 1)
+            )
+        return booking_id
+
+    def test_booking_reports_hold_expiry(self):
+        response = self.client.post(self.booking_url, {'event_id': self.event.id, 'number_of_tickets': 1})
+        booking = Booking.objects.get(id=response.data['booking_id'])
+        self.assertEqual(response.data['hold_expires_at'], booking.hold_expires_at)
+
+    def test_expired_hold_cannot_be_paid(self):
+        booking_id = self.book(2, expired=True)
+        response = self.client.post(reverse('make-payment'), {'booking_id': booking_id, 'payment_method': 'card'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('expired', response.data['error'])
+        self.assertFalse(Booking.objects.get(id=booking_id).is_paid)
+
+    def test_sweeper_releases_only_expired_unpaid_holds(self):
+        expired = [self.book(5, expired=True) for _ in range(3)]
+        paid = self.book(7)
+        self.client.post(reverse('make-payment'), {'booking_id': paid, 'payment_method': 'card'})
+        Booking.objects.filter(id=paid).update(created_at=timezone.now() - timedelta(days=1))
+        fresh = self.book(11)
+
+        self.assertEqual(release_expired_holds(batch_size=2), 3)
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.available_tickets, 100 - 7 - 11)
+        self.assertEqual(Booking.objects.filter(id__in=expired, is_cancelled=True, hold_expired=True).count(), 3)
+        self.assertFalse(Booking.objects.filter(id__in=[paid, fresh], is_cancelled=True).exists())
+        self.assertEqual(release_expired_holds(), 0)
+
+    def test_overlapping_sweeps_release_each_hold_once(self):
+        self.event.available_tickets = 10
+        self.event.save()
+        self.book(4, expired=True)
+        atomic = reservations.transaction.atomic
+        overlapped = []
+
+        def racing_atomic(*args, **kwargs):
+            # Another sweep commits as this one starts its batch
+            if not overlapped:
+                overlapped.append(None)
+                overlapped[0] = release_expired_holds()
+            return atomic(*args, **kwargs)
+
+        with mock.patch.object(reservations, 'transaction', mock.Mock(atomic=racing_atomic)):
+            self.assertEqual(release_expired_holds(), 0)
+        self.assertEqual(overlapped, [1])
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.available_tickets, 10)
+
+    def test_sweep_releases_only_what_it_cancelled(self):
+        self.event.available_tickets = 10
+        self.event.save()
+        booking_id = self.book(4, expired=True)
+        update = QuerySet.update
+        raced = []
+
+        def racing_update(queryset, **fields):
+            # Without row locks, another sweep cancels the hold between this one's read and its write
+            if fields.get('hold_expired') and not raced:
+                raced.append(update(Booking.objects.filter(id=booking_id), is_cancelled=True, hold_expired=True))
+                release_tickets(self.event, 4)
+            return update(queryset, **fields)
+
+        with mock.patch.object(QuerySet, 'update', racing_update):
+            released = release_expired_holds()
+        self.event.refresh_from_db()
+        self.assertEqual(raced, [1])
+        # The tickets it gave back are those of the holds it reports
+        self.assertEqual(self.event.available_tickets, 10 - 4 + 4 * released)
+
+    def test_sweeper_releases_sharded_inventory(self):
+        self.event = shard_inventory(self.event, 4)
+        self.book(10, expired=True)
+        release_expired_holds()
+        self.assertEqual(self.event.total_available_tickets, 100)
+
+    def test_sweep_job_reschedules_itself(self):
+        first = schedule_hold_sweep()
+        self.assertEqual(schedule_hold_sweep().id, first.id)
+
+        # Run the sweep when its slot starts, as a worker would
+        Job.objects.filter(id=first.id).update(run_after=timezone.now())
+        with mock.patch('users.tasks.time.time', return_value=time.time() + settings.HOLD_SWEEP_INTERVAL):
+            jobs.run_pending()
+        first.refresh_from_db()
+        self.assertEqual(first.status, Job.DONE)
+        self.assertEqual(Job.objects.filter(job_type='release_expired_holds', status=Job.QUEUED).count(), 1)
+
+
+class BulkEventTests(APITestCase):
+    def setUp(self):
+        self.event_manager = User.objects.create_user(
+            username='eventmanager',
+            email='eventmanager@example.com',
+            password='managerpassword',
+            role='event_manager'
+        )
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def row(self, index, **fields):
+        row = {
+            'title': f'Imported {index}', 'description': 'An event.', 'price': '250.00', 'category': 'music',
+            'date': '2024-12-15', 'time': '18:00:00', 'location': 'pune', 'payment_options': 'card',
+            'available_tickets': 50,
+        }
+        row.update(fields)
+        return row
+
+    def write_jsonl(self, name, rows):
+        with open(self.path(name), 'w') as file:
+            file.writelines(json.dumps(row) + '\n' for row in rows)
+        return self.path(name)
+
+    def import_events(self, path, *args):
+        call_command('import_events', path, '--created-by', 'eventmanager', *args, stdout=io.StringIO())
+
+    def test_export_imports_back(self):
+        for index in range(3):
+            Event.objects.create(created_by=self.event_manager, **self.row(index, title=f'Exported, "{index}"\nline two'))
+        shard_inventory(Event.objects.first(), 2)
+        expected = FastEventSerializer(FastEventSerializer.values(Event.objects.with_inventory().order_by('id'))).data
+
+        for name in ('events.csv', 'events.jsonl'):
+            call_command('export_events', '--output', self.path(name), stderr=io.StringIO())
+        for name in ('events.csv', 'events.jsonl'):
+            self.import_events(self.path(name))
+
+        imported = FastEventSerializer(FastEventSerializer.values(Event.objects.with_inventory().order_by('id'))).data[3:]
+        self.assertEqual([{**item, 'id': None} for item in imported], [{**item, 'id': None} for item in expected * 2])
+
+    def test_empty_csv_cells(self):
+        path = self.path('events.csv')
+        with open(path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=[*self.row(0), 'admission_rate'])
+            writer.writeheader()
+            writer.writerow(self.row(1, admission_rate=''))
+            writer.writerow(self.row(2, description='', admission_rate='5'))
+
+        self.import_events(path)
+        self.assertEqual(list(Event.objects.values_list('title', 'admission_rate')), [('Imported 1', None)])
+        with open(f'{path}.errors.jsonl') as file:
+            rejected = json.loads(file.readline())
+        # A blank description stays blank rather than becoming null
+        self.assertEqual(rejected['errors'], {'description': ['This field may not be blank.']})
+
+    def test_invalid_rows_are_rejected(self):
+        path = self.write_jsonl('events.jsonl', [self.row(1), self.row(2, category='opera'), self.row(3)])
+        with open(path, 'a') as file:
+            file.write('not json\n')
+
+        self.import_events(path, '--batch-size', '2')
+        self.assertEqual(Event.objects.count(), 2)
+        with open(f'{path}.errors.jsonl') as file:
+            rejected = [json.loads(line) for line in file]
+        self.assertEqual([failure['row'] for failure in rejected], [2, 4])
+        self.assertIn('category', rejected[0]['errors'])
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_resume_after_failure(self):
+        path = self.write_jsonl('events.jsonl', [self.row(index) for index in range(7)])
+        bulk_create = Event.objects.bulk_create
+        calls = []
+
+        def fail_on_third_batch(events):
+            calls.append(len(events))
+            if len(calls) == 3:
+                raise RuntimeError('database went away')
+            return bulk_create(events)
+
+        with mock.patch.object(Event.objects, 'bulk_create', side_effect=fail_on_third_batch):
+            with self.assertRaises(RuntimeError):
+                self.import_events(path, '--batch-size', '2')
+        self.assertEqual(Event.objects.count(), 4)
+        self.assertEqual(ImportCheckpoint.objects.get().rows_done, 4)
+
+        self.import_events(path, '--batch-size', '2', '--resume')
+        self.assertEqual(sorted(Event.objects.values_list('title', flat=True)), [f'Imported {index}' for index in range(7)])
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_import_needs_an_event_manager(self):
+        path = self.write_jsonl('events.jsonl', [self.row(1)])
+        User.objects.filter(username='eventmanager').update(role='user')
+        with self.assertRaises(CommandError):
+            self.import_events(path)
+
+
+class BatchBookingTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('book-tickets-batch')
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='testuser@example.com',
+            password='testpassword'
+        )
+        self.event_manager = User.objects.create_user(
+            username='eventmanager',
+            email='eventmanager@example.com',
+            password='managerpassword',
+            role='event_manager'
+        )
+        self.events = [
+            Event.objects.create(
+                title=f'Event {index}',
+                description='An event.',
+                date='2024-12-15',
+                time='18:00:00',
+                location='bengaluru',
+                category='music',
+                payment_options='card',
+                available_tickets=10,
+                price=500.00,
+                created_by=self.event_manager
+            )
+            for index in range(3)
+        ]
+        self.client.force_authenticate(user=self.user)
+
+    def tickets_left(self):
+        return [Event.objects.get(id=event.id).total_available_tickets for event in self.events]
+
+    def test_batch_books_every_item(self):
+        items = [{'event_id': event.id, 'number_of_tickets': 2} for event in self.events]
+        items.append({'event_id': self.events[0].id, 'number_of_tickets': 3})
+        response = self.client.post(self.url, {'items': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(all(result['booked'] for result in response.data['results']))
+        self.assertEqual(self.tickets_left(), [5, 8, 8])
+        booking = Booking.objects.get(id=response.data['results'][3]['booking_id'])
+        self.assertEqual((booking.event_id, booking.number_of_tickets, booking.payment_amount), (self.events[0].id, 3, 1500))
+
+    def test_batch_query_count_is_bounded(self):
+        items = [{'event_id': event.id, 'number_of_tickets': 1} for event in self.events]
+        with CaptureQueriesContext(connection) as few:
+            self.client.post(self.url, {'items': items[:1]}, format='json')
+        with CaptureQueriesContext(connection) as many:
+            self.client.post(self.url, {'items': items * 3}, format='json')
+        self.assertLessEqual(len(many), len(few))
+
+    def test_atomic_batch_books_nothing_if_an_item_fails(self):
+        items = [
+            {'event_id': self.events[0].id, 'number_of_tickets': 2},
+            {'event_id': self.events[1].id, 'number_of_tickets': 11},
+            {'event_id': 999999, 'number_of_tickets': 1},
+        ]
+        response = self.client.post(self.url, {'items': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([result['error'] for result in response.data['results']], [
+            'Not booked because another item was refused.', 'Not enough tickets available.', 'Event not found.',
+        ])
+        self.assertEqual(self.tickets_left(), [10, 10, 10])
+        self.assertFalse(Booking.objects.exists())
+
+    def test_partial_batch_books_what_it_can(self):
+        items = [
+            {'event_id': self.events[0].id, 'number_of_tickets': 6},
+            {'event_id': self.events[0].id, 'number_of_tickets': 6},
+            {'event_id': self.events[1].id, 'number_of_tickets': 'two'},
+            {'event_id': self.events[2].id, 'number_of_tickets': 4},
+        ]
+        response = self.client.post(self.url, {'items': items, 'atomic': False}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([result['booked'] for result in response.data['results']], [True, False, False, True])
+        self.assertEqual(response.data['results'][2]['error'], 'Invalid event or number of tickets.')
+        self.assertEqual(self.tickets_left(), [4, 10, 6])
+
+    def test_batch_takes_from_shards(self):
+        shard_inventory(self.events[1], 4)
+        items = [{'event_id': event.id, 'number_of_tickets': 4} for event in self.events]
+        response = self.client.post(self.url, {'items': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.tickets_left(), [6, 6, 6])
+
+    def test_batch_size_is_limited(self):
+        items = [{'event_id': self.events[0].id, 'number_of_tickets': 1}] * (settings.BATCH_BOOKING_MAX_ITEMS + 1)
+        response = self.client.post(self.url, {'items': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, {'items': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SalesStatsTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('organizer-stats')
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='testuser@example.com',
+            password='testpassword'
+        )
+        self.event_manager = User.objects.create_user(
+            username='eventmanager',
+            email='eventmanager@example.com',
+            password='managerpassword',
+            role='event_manager'
+        )
+        self.events = [
+            Event.objects.create(
+                title=f'Event {index}',
+                description='An event.',
+                date='2024-12-15',
+                time='18:00:00',
+                location='bengaluru',
+                category='music',
+                payment_options='card',
+                available_tickets=100,
+                price=100.00,
+                created_by=self.event_manager
+            )
+            for index in range(2)
+        ]
+        self.client.force_authenticate(user=self.event_manager)
+
+    def book_and_change(self):
+        first, second = self.events
+        bookings = [reserve_tickets(self.user, first, count) for count in (1, 2, 3, 4)]
+        bookings += reserve_batch(self.user, [(first.id, 5), (second.id, 6)])
+        confirm_payment(bookings[0], 'card')
+        confirm_payment(bookings[1], 'card')
+        confirm_payment(bookings[5], 'card')
+        cancel_booking(Booking.objects.get(id=bookings[1].id))
+        cancel_payment(bookings[0])
+        Booking.objects.filter(id=bookings[2].id).update(created_at=timezone.now() - timedelta(days=1))
+        release_expired_holds()
+        return bookings
+
+    def test_stats_follow_booking_changes(self):
+        self.book_and_change()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['totals'], {
+            'bookings': 4, 'paid_bookings': 1, 'unpaid_bookings': 3, 'cancelled_bookings': 2,
+            'tickets_sold': 16, 'paid_tickets': 6, 'cancelled_tickets': 5, 'revenue': '600.00',
+        })
+        first, second = response.data['results']
+        self.assertEqual((first['event_id'], first['bookings'], first['tickets_sold'], first['paid_bookings']), (self.events[0].id, 3, 10, 0))
+        self.assertEqual((second['event_id'], second['revenue']), (self.events[1].id, '600.00'))
+
+    def test_rebuild_matches_incremental_totals(self):
+        self.book_and_change()
+        incremental = [dict(row) for row in self.client.get(self.url).data['results']]
+        EventSales.objects.update(bookings=0, revenue=0)
+        call_command('rebuild_sales', stdout=io.StringIO())
+        self.assertEqual(EventSales.objects.count(), 2)
+        self.assertEqual([dict(row) for row in self.client.get(self.url).data['results']], incremental)
+
+    def test_stats_reads_dont_grow_with_bookings(self):
+        reserve_tickets(self.user, self.events[0], 1)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+        reserve_batch(self.user, [(self.events[1].id, 1)] * 50)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(self.url)
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(response.data['totals']['bookings'], 51)
+
+    def test_stats_need_an_event_manager(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class DatabaseSettingsTests(APITestCase):
+    def load_settings(self, **environ):
+        with mock.patch.dict(os.environ, environ):
+            return runpy.run_path(os.path.join(settings.BASE_DIR, 'bookmyevent', 'settings.py'))['DATABASES']['default']
+
+    def test_postgresql_profile_from_environment(self):
+        database = self.load_settings(DB_ENGINE='postgresql', DB_NAME='events', DB_HOST='db', DB_CONN_MAX_AGE='0', DB_PGBOUNCER='1')
+        self.assertEqual(database['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((database['NAME'], database['HOST'], database['CONN_MAX_AGE']), ('events', 'db', 0))
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        self.assertTrue(database['DISABLE_SERVER_SIDE_CURSORS'])
+
+    def test_sqlite_is_the_default(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop('DB_ENGINE', None)
+            database = self.load_settings()
+        self.assertEqual(database['ENGINE'], 'bookmyevent.sqlite3')
+        self.assertEqual(database['OPTIONS']['pragmas']['journal_mode'], 'WAL')
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite backend only')
+    def test_sqlite_connections_are_tuned(self):
+        path = tempfile.mkstemp(suffix='.sqlite3')[1]
+        self.addCleanup(lambda: [os.remove(name) for name in (path, f'{path}-wal', f'{path}-shm') if os.path.exists(name)])
+        options = {**connection.settings_dict['OPTIONS'], 'timeout': 0.1}
+        first, second = [
+            DatabaseWrapper({**connection.settings_dict, 'NAME': path, 'OPTIONS': options}, alias=f'probe-{index}')
+            for index in range(2)
+        ]
+        self.addCleanup(first.close)
+        self.addCleanup(second.close)
+        with first.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 100)
+
+        # IMMEDIATE transactions take the write lock as they begin, so the second waits and gives up
+        first._start_transaction_under_autocommit()
+        second.ensure_connection()
+        with self.assertRaises(OperationalError):
+            second._start_transaction_under_autocommit()
+        first.connection.rollback()
+
+
+@skipUnless(connection.vendor == 'postgresql', 'PostgreSQL only; run with DB_ENGINE=postgresql')
+class PostgresConcurrencyTests(TransactionTestCase):
+    """The booking paths from many connections at once, where rows are locked one by one."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', email='testuser@example.com', password='testpassword')
+        self.event_manager = User.objects.create_user(
+            username='eventmanager', email='eventmanager@example.com', password='managerpassword', role='event_manager'
+        )
+
+    def create_event(self, available_tickets):
+        return Event.objects.create(
+            title='Music Concert', description='A grand music concert.', date='2024-12-15', time='18:00:00',
+            location='mumbai', category='music', payment_options='card', available_tickets=available_tickets,
+            price=500.00, created_by=self.event_manager
+        )
+
+    def run_concurrently(self, call, arguments):
+        def run(argument):
+            try:
+                return call(argument)
+            except Exception as exc:
+                return exc
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            return list(pool.map(run, arguments))
+
+    def test_concurrent_bookings_never_oversell(self):
+        event = self.create_event(50)
+        results = self.run_concurrently(lambda _: reserve_tickets(self.user, event, 3), range(40))
+        self.assertEqual([type(result) for result in results if not isinstance(result, Booking)], [NotEnoughTickets] * 24)
+        event.refresh_from_db()
+        self.assertEqual(event.available_tickets, 50 - 16 * 3)
+
+    def test_gathering_from_shards_does_not_deadlock(self):
+        event = shard_inventory(self.create_event(64), 8)
+        # No single shard covers 12 tickets, so every booking gathers from several
+        results = self.run_concurrently(lambda _: reserve_tickets(self.user, event, 12), range(8))
+        self.assertEqual(sum(isinstance(result, Booking) for result in results), 5)
+        self.assertTrue(all(isinstance(result, (Booking, NotEnoughTickets)) for result in results))
+        self.assertEqual(event.total_available_tickets, 64 - 5 * 12)
+
+    def test_batches_in_opposite_orders_do_not_deadlock(self):
+        events = [self.create_event(100) for _ in range(4)]
+        orders = [events, events[::-1]] * 10
+        results = self.run_concurrently(lambda order: reserve_batch(self.user, [(event.id, 1) for event in order]), orders)
+        self.assertTrue(all(isinstance(result, list) for result in results), results)
+        self.assertEqual(list(Event.objects.filter(id__in=[event.id for event in events]).values_list('available_tickets', flat=True)), [80] * 4)
+
+    def test_overlapping_sweeps_release_each_hold_once(self):
+        event = self.create_event(0)
+        Booking.objects.bulk_create([
+            Booking(user=self.user, event=event, number_of_tickets=1, price_per_ticket=500, payment_amount=500)
+            for _ in range(200)
+        ])
+        Booking.objects.update(created_at=timezone.now() - timedelta(seconds=settings.BOOKING_HOLD_TTL + 1))
+
+        released = self.run_concurrently(lambda _: release_expired_holds(batch_size=10), range(4))
+        self.assertEqual(sum(released), 200)
+        event.refresh_from_db()
+        self.assertEqual(event.available_tickets, 200)
+
+
+class RequestMetricsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.registry.clear()
+        self.addCleanup(metrics._sampled_at.clear)
+        self.user = User.objects.create_user(username='testuser', email='testuser@example.com', password='testpassword')
+        self.event_manager = User.objects.create_user(
+            username='eventmanager', email='eventmanager@example.com', password='managerpassword', role='event_manager'
+        )
+        self.event = Event.objects.create(
+            title='Music Concert', description='A grand music concert.', date='2024-12-15', time='18:00:00',
+            location='chennai', category='music', payment_options='card', available_tickets=100, price=500.00,
+            created_by=self.event_manager
+        )
+
+    def scrape(self):
+        with self.settings(METRICS_TOKEN='scraper-token'):
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scraper-token')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return response.content.decode()
+
+    def test_requests_are_recorded_by_view(self):
+        self.client.get(reverse('create-event'))
+        self.client.get(reverse('create-event'))
+        self.client.get('/users/no-such-page/')
+
+        view = metrics.registry.views['create-event', 'GET']
+        self.assertEqual(view.responses, {200: 2})
+        self.assertGreater(view.queries.sum, 0)
+        self.assertGreater(view.db_seconds, 0)
+        self.assertGreater(view.render_seconds, 0)
+        self.assertEqual(metrics.registry.views['unmatched', 'GET'].responses, {404: 1})
+
+        text = self.scrape()
+        self.assertIn('bookmyevent_http_requests_total{view="create-event",method="GET",status="200"} 2', text)
+        self.assertIn('bookmyevent_http_request_duration_seconds_bucket{view="create-event",method="GET",le="+Inf"} 2', text)
+        self.assertIn('bookmyevent_http_db_queries_count{view="create-event",method="GET"} 2', text)
+        self.assertIn('# TYPE bookmyevent_cache_requests_total counter', text)
+
+    def test_metrics_need_the_scrape_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_404_NOT_FOUND)
+        with self.settings(METRICS_TOKEN='scraper-token'):
+            for headers in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong-token'}):
+                response = self.client.get(reverse('metrics'), **headers)
+                self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+                self.assertNotIn(b'bookmyevent_', response.content)
+        self.assertIn('bookmyevent_http_requests_total', self.scrape())
+
+    def test_async_requests_leave_query_figures_alone(self):
+        async def respond(request):
+            return HttpResponse('ok')
+
+        async_to_sync(metrics.MetricsMiddleware(respond))(AsyncRequestFactory().get('/users/events/'))
+        view = metrics.registry.views['unmatched', 'GET']
+        self.assertEqual(view.latency.count, 1)
+        self.assertEqual((view.queries.count, view.db_seconds), (0, 0))
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram((1, 5))
+        for value in (0, 1, 3, 9):
+            histogram.observe(value)
+        self.assertEqual(list(histogram.cumulative()), [(1, 2), (5, 3), ('+Inf', 4)])
+        self.assertEqual((histogram.sum, histogram.count), (13, 4))
+
+    def test_label_values_are_escaped(self):
+        self.assertEqual(metrics.labels(view='a"b\\c\nd'), 'view="a\\"b\\\\c\\nd"')
+
+    def test_slow_requests_are_logged_with_plans_once_per_interval(self):
+        with self.settings(METRICS_SLOW_REQUEST_THRESHOLD=0), self.assertLogs('users.metrics', 'WARNING') as logs:
+            self.client.get(reverse('create-event'))
+            self.client.get(reverse('create-event'))
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('Slow request: GET /users/events/ (create-event)', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+        if connection.vendor == 'sqlite':
+            self.assertIn('SCAN', logs.output[0])
+
+    def test_fast_requests_are_not_logged(self):
+        with mock.patch.object(metrics, 'log_slow_request') as log:
+            self.client.get(reverse('create-event'))
+        log.assert_not_called()
+
+    def test_query_wrappers_are_removed_after_each_request(self):
+        self.client.get(reverse('create-event'))
+        self.assertFalse(any(isinstance(wrapper, metrics.QueryTimer) for wrapper in connection.execute_wrappers))
+
+
+class WaitingRoomTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('waiting-room')
+        self.users = [
+            User.objects.create_user(username=f'user{index}', email=f'user{index}@example.com', password='testpassword')
+            for index in range(3)
+        ]
+        self.event_manager = User.objects.create_user(
+            username='eventmanager', email='eventmanager@example.com', password='managerpassword', role='event_manager'
+        )
+        self.event = self.create_event(admission_rate=2)
+        # The controller's clock, moved on by tick()
+        self.now = 1000.0
+        clock = mock.patch.object(waiting_room, 'time', mock.Mock(time=lambda: self.now))
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def create_event(self, admission_rate=None):
+        return Event.objects.create(
+            title='Stadium Concert', description='A big on-sale.', date='2024-12-15', time='18:00:00',
+            location='mumbai', category='music', payment_options='card', available_tickets=100, price=500.00,
+            created_by=self.event_manager, admission_rate=admission_rate
+        )
+
+    def tick(self):
+        self.now += settings.WAITING_ROOM_TICK
+        cache.delete(waiting_room._key(self.event.id, 'step'))
+
+    def join(self, user, event=None):
+        self.client.force_authenticate(user=user)
+        response = self.client.post(self.url, {'event_id': (event or self.event).id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def book(self, user, token, event=None, **headers):
+        self.client.force_authenticate(user=user)
+        payload = {'event_id': (event or self.event).id, 'number_of_tickets': 1, 'queue_token': token}
+        return self.client.post(reverse('book-ticket'), payload, format='json', **headers)
+
+    def test_users_are_let_through_in_order_at_the_admission_rate(self):
+        places = [self.join(user).data for user in self.users]
+        self.assertEqual([place['position'] for place in places], [1, 2, 3])
+        # The first user goes straight in and the others are told when their place comes up
+        self.assertEqual([place['admitted'] for place in places], [True, False, False])
+        self.assertEqual(places[2]['ahead'], 2)
+        self.assertEqual([place['retry_after'] for place in places], [0, 0.5, 1])
+
+        waiting = self.join(self.users[2])
+        self.assertEqual(waiting.data['position'], 3)
+        self.assertEqual(waiting['Retry-After'], '1')
+
+        self.tick()
+        self.client.force_authenticate(user=self.users[2])
+        response = self.client.get(self.url, {'queue_token': places[2]['queue_token']})
+        self.assertTrue(response.data['admitted'])
+        self.assertFalse(response.has_header('Retry-After'))
+
+    def test_booking_needs_an_admitted_queue_token(self):
+        tokens = [self.join(user).data['queue_token'] for user in self.users]
+
+        self.assertEqual(self.book(self.users[0], None).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.book(self.users[0], tokens[1]).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.book(self.users[0], tokens[0][:-1] + 'x').status_code, status.HTTP_403_FORBIDDEN)
+
+        # Not let through yet; the refusal isn't replayed to the same Idempotency-Key later
+        response = self.book(self.users[2], tokens[2], HTTP_IDEMPOTENCY_KEY='retry-me')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+        self.tick()
+        self.assertEqual(self.book(self.users[2], tokens[2], HTTP_IDEMPOTENCY_KEY='retry-me').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.book(self.users[0], tokens[0]).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(cache.get(waiting_room._key(self.event.id, 'completed')), 2)
+
+    def test_tokens_are_checked_without_queries(self):
+        token = self.join(self.users[0]).data['queue_token']
+        self.join(self.users[1])
+        with self.assertNumQueries(0):
+            self.join(self.users[2])
+            self.client.get(self.url, {'queue_token': token})
+
+    def test_queue_token_only_admits_to_its_event(self):
+        other = self.create_event(admission_rate=5)
+        token = self.join(self.users[0]).data['queue_token']
+        response = self.book(self.users[0], token, event=other)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        batch = {'items': [{'event_id': other.id, 'number_of_tickets': 1, 'queue_token': token}]}
+        self.assertEqual(self.client.post(reverse('book-tickets-batch'), batch, format='json').status_code, status.HTTP_403_FORBIDDEN)
+        batch['items'][0].update(event_id=self.event.id)
+        self.assertEqual(self.client.post(reverse('book-tickets-batch'), batch, format='json').status_code, status.HTTP_201_CREATED)
+
+    def test_events_without_a_waiting_room_book_directly(self):
+        event = self.create_event()
+        response = self.join(self.users[0], event=event)
+        self.assertEqual(response.data, {'queue_token': None, 'admitted': True})
+        self.assertEqual(self.book(self.users[0], None, event=event).status_code, status.HTTP_201_CREATED)
+
+    def test_bookings_backing_up_slow_admissions(self):
+        for user in self.users:
+            self.join(user)
+        with waiting_room.booking(self.event.id):
+            pass
+        # One booking a second gets through, and two are under way
+        with waiting_room.booking(self.event.id), waiting_room.booking(self.event.id):
+            self.tick()
+            self.assertEqual(waiting_room.advance(self.event.id, 2), (3, 1))
+
+        # Once they are through, it climbs back a tenth per step
+        self.tick()
+        admitted, rate = waiting_room.advance(self.event.id, 2)
+        self.assertAlmostEqual(rate, 1.1)
+
+
+class ThrottlingTests(APITestCase):
+    def setUp(self):
+        throttling.get_store().clear()
+        throttling.rejections.clear()
+        rates = self.settings(THROTTLE_RATES={
+            'login': {'anon': (1, 0.5)},
+            'book-ticket': {'user': (2, 1), 'event_manager': (3, 1)},
+            'events': {'anon': (1, 1)},
+        })
+        rates.enable()
+        self.addCleanup(rates.disable)
+        # The buckets' clock
+        self.now = 1000.0
+        clock = mock.patch.object(throttling, 'time', mock.Mock(monotonic=lambda: self.now, time=lambda: self.now))
+        clock.start()
+        self.addCleanup(clock.stop)
+
+        self.user = User.objects.create_user(username='testuser', email='testuser@example.com', password='testpassword')
+        self.event_manager = User.objects.create_user(
+            username='eventmanager', email='eventmanager@example.com', password='managerpassword', role='event_manager'
+        )
+        self.event = Event.objects.create(
+            title='Music Concert', description='A great music concert.', date='2024-12-15', time='18:00:00',
+            location='mumbai', category='music', payment_options='card', available_tickets=100, price=500.00,
+            created_by=self.event_manager
+        )
+
+    def book(self, user):
+        self.client.force_authenticate(user=user)
+        return self.client.post(reverse('book-ticket'), {'event_id': self.event.id, 'number_of_tickets': 1}, format='json')
+
+    def test_bookings_are_limited_per_role(self):
+        for user, burst in ((self.user, 2), (self.event_manager, 3)):
+            responses = [self.book(user) for _ in range(burst + 1)]
+            self.assertEqual([response.status_code for response in responses], [201] * burst + [429])
+        self.assertEqual(responses[-1]['Retry-After'], '1')
+
+        # book-tickets/batch/ draws on the same bucket
+        self.client.force_authenticate(user=self.user)
+        batch = {'items': [{'event_id': self.event.id, 'number_of_tickets': 1}]}
+        self.assertEqual(self.client.post(reverse('book-tickets-batch'), batch, format='json').status_code, 429)
+        self.now += 1
+        self.assertEqual(self.book(self.user).status_code, 201)
+
+        self.assertEqual(throttling.rejections.snapshot(), {('book-ticket', 'user'): 2, ('book-ticket', 'event_manager'): 1})
+        with self.settings(METRICS_TOKEN='scraper-token'):
+            scraped = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scraper-token').content.decode()
+        self.assertIn('bookmyevent_throttled_requests_total{scope="book-ticket",client="user"} 2', scraped)
+
+    def test_anonymous_clients_are_limited_by_address(self):
+        def login(address, **headers):
+            credentials = {'username': 'testuser', 'password': 'testpassword'}
+            return self.client.post(reverse('login'), credentials, REMOTE_ADDR=address, **headers)
+
+        self.assertEqual(login('10.0.0.1').status_code, status.HTTP_200_OK)
+        # A forwarded address the client made up doesn't get it a new bucket
+        response = login('10.0.0.1', HTTP_X_FORWARDED_FOR='10.9.9.9')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '2')
+        self.assertEqual(login('10.0.0.2').status_code, status.HTTP_200_OK)
+
+    def test_async_event_reads_are_throttled(self):
+        view, request = AsyncEventView.as_view(), AsyncRequestFactory().get(reverse('create-event'))
+        self.assertEqual(async_to_sync(view)(request).status_code, status.HTTP_200_OK)
+        response = async_to_sync(view)(request)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_async_event_reads_throttle_signed_in_users_by_user(self):
+        view, factory = AsyncEventView.as_view(), AsyncRequestFactory()
+
+        def fetch(user=None):
+            headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'} if user else {}
+            return async_to_sync(view)(factory.get(reverse('create-event'), headers=headers)).status_code
+
+        with self.settings(THROTTLE_RATES={'events': {'anon': (1, 1), 'user': (1, 1)}}):
+            # All from one address, as behind NAT
+            self.assertEqual([fetch(), fetch()], [200, 429])
+            self.assertEqual([fetch(self.user), fetch(self.user)], [200, 429])
+            self.assertEqual(fetch(User.objects.create_user(username='other', password='otherpassword')), 200)
+
+    def test_cache_store_shares_buckets_across_processes(self):
+        cache.clear()
+        first, second = throttling.CacheBucketStore(), throttling.CacheBucketStore()
+        self.assertEqual([first.take('key', 2, 1), second.take('key', 2, 1)], [0, 0])
+        self.assertEqual(first.take('key', 2, 1), 1)
+        # The refused request took nothing
+        self.now += 0.5
+        self.assertEqual(second.take('key', 2, 1), 0.5)
+        self.now += 0.5
+        self.assertEqual(second.take('key', 2, 1), 0)
+
+
+class SeatingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', email='testuser@example.com', password='testpassword')
+        self.event_manager = User.objects.create_user(
+            username='eventmanager', email='eventmanager@example.com', password='managerpassword', role='event_manager'
+        )
+        self.event = Event.objects.create(
+            title='Cricket Final', description='The final.', date='2024-12-15', time='18:00:00',
+            location='mumbai', category='sports', payment_options='card', available_tickets=100, price=500.00,
+            created_by=self.event_manager
+        )
+        self.url = reverse('event-seats', args=[self.event.id])
+        self.layout = {'sections': [
+            {'name': 'Pavilion', 'rows': [{'name': 'A', 'seats': 10}, {'name': 'B', 'seats': 10}]},
+            {'name': 'North Stand', 'rows': [{'name': 'A', 'seats': 20}]},
+        ]}
+
+    def seat_event(self):
+        self.client.force_authenticate(user=self.event_manager)
+        response = self.client.put(self.url, self.layout, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(user=self.user)
+
+    def book(self, count):
+        return self.client.post(reverse('book-ticket'), {'event_id': self.event.id, 'number_of_tickets': count}, format='json')
+
+    def test_find_block_picks_the_block_nearest_the_middle(self):
+        self.assertEqual(seating.find_block(0, 10, 4), 3)
+        # Seats 0-1 and 6-9 free
+        self.assertEqual(seating.find_block(0b0000111100, 10, 2), 6)
+        self.assertEqual(seating.find_block(0b0000111100, 10, 4), 6)
+        self.assertIsNone(seating.find_block(0b0000111100, 10, 5))
+        self.assertEqual(seating.find_block(0, 1000, 1000), 0)
+        self.assertIsNone(seating.find_block((1 << 1000) - 1, 1000, 1))
+
+    def test_bookings_get_adjacent_seats_in_the_best_rows(self):
+        self.seat_event()
+        self.event.refresh_from_db()
+        self.assertTrue(self.event.seated)
+        self.assertEqual(self.event.available_tickets, 40)
+
+        response = self.book(4)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['seats'], {'section': 'Pavilion', 'row': 'A', 'seats': [4, 5, 6, 7]})
+        # Row A has three free seats either side now, so four go in row B
+        self.assertEqual(self.book(4).data['seats'], {'section': 'Pavilion', 'row': 'B', 'seats': [4, 5, 6, 7]})
+        self.assertEqual(self.book(3).data['seats'], {'section': 'Pavilion', 'row': 'A', 'seats': [1, 2, 3]})
+        self.assertEqual(self.book(12).data['seats'], {'section': 'North Stand', 'row': 'A', 'seats': list(range(5, 17))})
+
+        booking = Booking.objects.get(id=self.book(1).data['booking_id'])
+        self.assertEqual(seating.describe(booking), {'section': 'Pavilion', 'row': 'A', 'seats': [8]})
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.available_tickets, 40 - 24)
+
+    def test_fragmented_rows_refuse_blocks_they_cannot_seat(self):
+        self.seat_event()
+        self.book(4)
+        self.book(4)
+        self.book(12)
+        # 14 seats are left, but no row has 5 together
+        response = self.book(5)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'Not enough adjacent seats available.')
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.available_tickets, 20)
+
+        batch = {'items': [{'event_id': self.event.id, 'number_of_tickets': 5}], 'all_or_nothing': False}
+        result = self.client.post(reverse('book-tickets-batch'), batch, format='json').data['results'][0]
+        self.assertEqual(result['error'], 'Not enough adjacent seats available.')
+
+    def test_cancelled_and_expired_bookings_free_their_seats(self):
+        self.seat_event()
+        booking = Booking.objects.get(id=self.book(10).data['booking_id'])
+        expired = Booking.objects.get(id=self.book(10).data['booking_id'])
+        cancel_booking(booking)
+        Booking.objects.filter(id=expired.id).update(created_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(release_expired_holds(), 1)
+
+        rows = SeatRow.objects.filter(event=self.event).order_by('rank')
+        self.assertEqual([(row.available, seating.to_bitmap(row.taken)) for row in rows], [(10, 0), (10, 0), (20, 0)])
+        self.assertEqual(self.book(10).data['seats']['row'], 'A')
+
+    def test_seat_map_snapshot_is_cached_until_a_booking(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+        self.seat_event()
+        self.book(4)
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        row = response.data['sections'][0]['rows'][0]
+        self.assertEqual(row, {'name': 'A', 'seats': 10, 'available': 6, 'taken': 'eAA='})
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'HIT')
+
+        self.book(1)
+        response = self.client.get(self.url)
+        self.assertEqual((response['X-Cache'], response.data['available_tickets']), ('MISS', 35))
+
+    def test_only_managers_may_set_seat_maps_before_any_booking(self):
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.put(self.url, self.layout, format='json').status_code, status.HTTP_403_FORBIDDEN)
+        self.seat_event()
+        self.book(1)
+
+        self.client.force_authenticate(user=self.event_manager)
+        self.assertEqual(self.client.put(self.url, self.layout, format='json').status_code, status.HTTP_409_CONFLICT)
+        response = self.client.patch(reverse('mod-event', args=[self.event.id]), {'available_tickets': 500}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('available_tickets', response.data)
+        with self.assertRaises(ValueError):
+            shard_inventory(self.event, 4)
+
+
+class TicketTierTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', email='testuser@example.com', password='testpassword')
+        self.event_manager = User.objects.create_user(
+            username='eventmanager', email='eventmanager@example.com', password='managerpassword', role='event_manager'
+        )
+        self.event, self.other = [
+            Event.objects.create(
+                title=title, description='A great music concert.', date='2024-12-15', time='18:00:00',
+                location='mumbai', category='music', payment_options='card', available_tickets=100, price=500.00,
+                created_by=self.event_manager
+            )
+            for title in ('Music Concert', 'Jazz Night')
+        ]
+        self.client.force_authenticate(user=self.event_manager)
+        self.tiers = [
+            self.client.post(reverse('event-tiers', args=[self.event.id]), tier, format='json').data['id']
+            for tier in (
+                {'name': 'Early Bird', 'price': '300.00', 'available_tickets': 50},
+                {'name': 'General', 'price': '500.00', 'available_tickets': 100},
+                {'name': 'VIP', 'price': '2000.00', 'available_tickets': 10},
+            )
+        ]
+        self.client.force_authenticate(user=self.user)
+
+    def book(self, count, tier_id=None, event=None):
+        data = {'event_id': (event or self.event).id, 'number_of_tickets': count}
+        if tier_id is not None:
+            data['tier_id'] = tier_id
+        return self.client.post(reverse('book-ticket'), data, format='json')
+
+    def tickets_left(self):
+        tiers = dict(TicketTier.objects.values_list('id', 'available_tickets'))
+        return Event.objects.get(id=self.event.id).available_tickets, [tiers[tier_id] for tier_id in self.tiers]
+
+    def test_listing_shows_the_price_range_from_the_event_row(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('create-event'))
+        self.assertFalse(any('users_tickettier' in query['sql'] for query in queries.captured_queries))
+        ranges = {item['title']: (item['min_price'], item['max_price'], item['available_tickets']) for item in response.data['results']}
+        self.assertEqual(ranges, {'Music Concert': ('300.00', '2000.00', 160), 'Jazz Night': ('500.00', '500.00', 100)})
+
+        self.client.force_authenticate(user=self.event_manager)
+        response = self.client.patch(reverse('event-tier', args=[self.event.id, self.tiers[2]]), {'price': '2500.00'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        detail = self.client.get(reverse('mod-event', args=[self.event.id])).data
+        self.assertEqual((detail['min_price'], detail['max_price']), ('300.00', '2500.00'))
+
+    def test_bookings_take_tickets_from_their_tier_at_its_price(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.book(2, self.tiers[2])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # The tier and its event are read in one query
+        reads = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('SELECT') and 'users_event' in query['sql']]
+        self.assertEqual(len(reads), 1)
+        self.assertIn('users_tickettier', reads[0])
+
+        booking = Booking.objects.get(id=response.data['booking_id'])
+        self.assertEqual((booking.tier_id, booking.price_per_ticket, booking.payment_amount), (self.tiers[2], 2000, 4000))
+        self.assertEqual(self.tickets_left(), (158, [50, 100, 8]))
+
+        response = self.book(9, self.tiers[2])
+        self.assertEqual(response.data['error'], 'Not enough tickets available.')
+        self.assertEqual(self.book(1).data['error'], 'This event sells tickets by tier; choose one with tier_id.')
+        self.assertEqual(self.book(1, self.tiers[0], event=self.other).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.tickets_left(), (158, [50, 100, 8]))
+
+    def test_cancelled_expired_and_batched_bookings_use_their_tiers(self):
+        booking = Booking.objects.get(id=self.book(5, self.tiers[0]).data['booking_id'])
+        expired = self.book(3, self.tiers[2]).data['booking_id']
+        cancel_booking(booking)
+        Booking.objects.filter(id=expired).update(created_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(release_expired_holds(), 1)
+        self.assertEqual(self.tickets_left(), (160, [50, 100, 10]))
+
+        items = [
+            {'event_id': self.event.id, 'number_of_tickets': 4, 'tier_id': self.tiers[1]},
+            {'event_id': self.event.id, 'number_of_tickets': 1},
+            {'event_id': self.other.id, 'number_of_tickets': 1, 'tier_id': self.tiers[1]},
+            {'event_id': self.other.id, 'number_of_tickets': 2},
+        ]
+        response = self.client.post(reverse('book-tickets-batch'), {'items': items, 'atomic': False}, format='json')
+        self.assertEqual([result.get('error') for result in response.data['results']], [
+            None, 'This event sells tickets by tier; choose one with tier_id.', 'Ticket tier not found.', None,
+        ])
+        self.assertEqual(Booking.objects.get(id=response.data['results'][0]['booking_id']).payment_amount, 2000)
+        self.assertEqual(self.tickets_left(), (156, [50, 96, 10]))
+
+    def test_tiers_are_cached_and_guarded(self):
+        url = reverse('event-tiers', args=[self.event.id])
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual([(tier['name'], tier['price']) for tier in response.data], [
+            ('Early Bird', '300.00'), ('General', '500.00'), ('VIP', '2000.00'),
+        ])
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        self.assertEqual(self.client.post(url, {'name': 'Box', 'price': '9000.00', 'available_tickets': 4}).status_code, status.HTTP_403_FORBIDDEN)
+        self.book(1, self.tiers[2])
+        response = self.client.get(url)
+        self.assertEqual((response['X-Cache'], response.data[2]['available_tickets']), ('MISS', 9))
+
+        self.client.force_authenticate(user=self.event_manager)
+        self.assertEqual(self.client.post(url, {'name': 'VIP', 'price': '1.00', 'available_tickets': 1}).status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.delete(reverse('event-tier', args=[self.event.id, self.tiers[2]]))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.client.delete(reverse('event-tier', args=[self.event.id, self.tiers[0]])).status_code, status.HTTP_204_NO_CONTENT)
+        response = self.client.patch(reverse('mod-event', args=[self.event.id]), {'available_tickets': 500}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Event.objects.get(id=self.event.id).min_price, 500)
+
+        # Bookings made without a tier would have none to go back to
+        reserve_tickets(self.user, self.other, 1)
+        response = self.client.post(reverse('event-tiers', args=[self.other.id]), {'name': 'VIP', 'price': '1.00', 'available_tickets': 1})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+
+class EventCalendarTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.event_manager = User.objects.create_user(
+            username='eventmanager', email='eventmanager@example.com', password='managerpassword', role='event_manager'
+        )
+        # A week of events: Friday and Saturday in Mumbai, Saturday in Pune
+        self.events = [
+            self.create(title, date, location, category)
+            for title, date, location, category in (
+                ('Thursday Jazz', '2024-12-12', 'mumbai', 'music'),
+                ('Friday Play', '2024-12-13', 'mumbai', 'theatre'),
+                ('Saturday Gig', '2024-12-14', 'mumbai', 'music'),
+                ('Saturday Match', '2024-12-14', 'pune', 'sports'),
+                ('Next Week', '2024-12-21', 'mumbai', 'music'),
+            )
+        ]
+
+    def create(self, title, date, location, category):
+        return Event.objects.create(
+            title=title, description='An event.', date=date, time='18:00:00', location=location, category=category,
+            payment_options='card', available_tickets=100, price=500.00, created_by=self.event_manager
+        )
+
+    def counts(self):
+        return {
+            (date.isoformat(), location, category): events
+            for date, location, category, events in EventDayCount.objects.filter(events__gt=0).values_list('date', 'location', 'category', 'events')
+        }
+
+    def expected(self):
+        rows = Event.objects.values('date', 'location', 'category').annotate(events=Count('id')).order_by()
+        return {(row['date'].isoformat(), row['location'], row['category']): row['events'] for row in rows}
+
+    def test_listing_filters_by_date_range(self):
+        weekend = {'location': 'mumbai', 'date_from': '2024-12-13', 'date_to': '2024-12-15'}
+        response = self.client.get(reverse('create-event'), weekend)
+        self.assertEqual([item['title'] for item in response.data['results']], ['Friday Play', 'Saturday Gig'])
+        self.assertEqual(self.client.get(reverse('create-event'), weekend)['X-Cache'], 'HIT')
+        # Open-ended
+        response = self.client.get(reverse('create-event'), {'date_from': '2024-12-14'})
+        self.assertEqual([item['title'] for item in response.data['results']], ['Saturday Gig', 'Saturday Match', 'Next Week'])
+
+        # Moving an event into the range drops the cached page
+        self.client.force_authenticate(user=self.event_manager)
+        self.client.patch(reverse('mod-event', args=[self.events[4].id]), {'date': '2024-12-15'}, format='json')
+        response = self.client.get(reverse('create-event'), weekend)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual([item['title'] for item in response.data['results']], ['Friday Play', 'Saturday Gig', 'Next Week'])
+
+        response = self.client.get(reverse('create-event'), {'date_from': '14/12/2024'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('date_from', response.data)
+
+    def test_range_listings_are_versioned_by_their_dates(self):
+        self.assertEqual(
+            caching.listing_version_names({'location': 'pune', 'date_from': '2024-12-13', 'date_to': '2024-12-14'}),
+            ['location:pune', 'date:2024-12-13', 'date:2024-12-14'],
+        )
+        self.assertEqual(caching.listing_version_names({'date_from': '2024-01-01', 'date_to': '2024-12-31'}), ['all'])
+        self.assertEqual(caching.listing_version_names({'date_from': '2024-12-13'}), ['all'])
+
+    def test_calendar_reads_the_day_counts(self):
+        url = reverse('event-calendar')
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'date_from': '2024-12-12', 'date_to': '2024-12-18'})
+        self.assertEqual(response.data, {'date_from': '2024-12-12', 'date_to': '2024-12-18', 'days': [
+            {'date': '2024-12-12', 'location': 'mumbai', 'category': 'music', 'events': 1},
+            {'date': '2024-12-13', 'location': 'mumbai', 'category': 'theatre', 'events': 1},
+            {'date': '2024-12-14', 'location': 'mumbai', 'category': 'music', 'events': 1},
+            {'date': '2024-12-14', 'location': 'pune', 'category': 'sports', 'events': 1},
+        ]})
+        response = self.client.get(url, {'date_from': '2024-12-01', 'date_to': '2024-12-31', 'location': 'mumbai', 'category': 'music'})
+        self.assertEqual([(day['date'], day['events']) for day in response.data['days']], [('2024-12-12', 1), ('2024-12-14', 1), ('2024-12-21', 1)])
+
+        self.create('Saturday Late Gig', '2024-12-14', 'mumbai', 'music')
+        response = self.client.get(url, {'date_from': '2024-12-14', 'date_to': '2024-12-14', 'location': 'mumbai'})
+        self.assertEqual((response['X-Cache'], response.data['days'][0]['events']), ('MISS', 2))
+
+        for params in ({'date_from': '2024-12-14'}, {'date_from': '2024-12-14', 'date_to': '2024-12-13'}, {'date_from': '2024-01-01', 'date_to': '2025-12-31'}):
+            self.assertEqual(self.client.get(url, params).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_counts_follow_every_event_write(self):
+        self.assertEqual(self.counts(), self.expected())
+        event = self.events[0]
+        event.date, event.location = '2024-12-20', 'pune'
+        event.save()
+        # Saved twice from the same instance: the second save moves it from where the first put it
+        event.category = 'dance'
+        event.save()
+        Event.objects.get(id=self.events[1].id).delete()
+        self.client.force_authenticate(user=self.event_manager)
+        self.client.delete(reverse('mod-event', args=[self.events[2].id]))
+        self.assertEqual(self.counts(), self.expected())
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'events.jsonl')
+        with open(path, 'w') as file:
+            file.writelines(json.dumps({
+                'title': f'Imported {index}', 'description': 'An event.', 'price': '250.00', 'category': 'music',
+                'date': f'2024-12-{10 + index % 3}', 'time': '18:00:00', 'location': 'delhi', 'payment_options': 'card',
+                'available_tickets': 50,
+            }) + '\n' for index in range(7))
+        call_command('import_events', path, '--created-by', 'eventmanager', '--batch-size', '3', stdout=io.StringIO())
+        self.assertEqual(self.counts(), self.expected())
+
+        EventDayCount.objects.update(events=99)
+        call_command('rebuild_calendar', stdout=io.StringIO())
+        self.assertEqual(self.counts(), self.expected())
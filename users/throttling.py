@@ -0,0 +1,158 @@
+"""
+Token-bucket request throttling.
+
+Views name a `throttle_scope`, and THROTTLE_RATES gives each client a
+bucket per scope: its size, the burst it may send at once, and the tokens
+added back per second. Clients are signed-in users, limited by their role,
+or IP addresses when anonymous. Every request takes a token. With none left
+it is refused with 429 and a Retry-After header saying when there will be,
+and counted in `rejections`, which metrics/ exports.
+
+A bucket is kept as the one number that describes it, the time it will be
+full again: taking a token moves that on by 1/rate, and the bucket is empty
+once it is size/rate ahead. LocalBucketStore keeps these in a dict in each
+process, so each process allows the full rate. CacheBucketStore keeps them
+in the THROTTLE_CACHE cache and moves them on with incr, so processes
+sharing the backend share the limit; requests racing to take the first
+token from an idle bucket may let one extra through.
+"""
+import math
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+KEY_PREFIX = 'throttle'
+# Buckets a LocalBucketStore holds before dropping the full ones, which are the same as none
+LOCAL_STORE_MAX_KEYS = 100000
+
+
+class LocalBucketStore:
+    """Buckets in this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key -> time.monotonic() at which the bucket is full again
+        self.full_at = {}
+        self.max_keys = LOCAL_STORE_MAX_KEYS
+
+    def take(self, key, size, rate):
+        """Take a token from `key`'s bucket. Returns 0, or the seconds until it has one."""
+        now = time.monotonic()
+        with self.lock:
+            full_at = max(self.full_at.get(key, now), now) + 1 / rate
+            wait = full_at - now - size / rate
+            if wait > 0:
+                return wait
+            if len(self.full_at) >= self.max_keys and key not in self.full_at:
+                self.prune(now)
+            self.full_at[key] = full_at
+            return 0
+
+    def prune(self, now):
+        self.full_at = {key: full_at for key, full_at in self.full_at.items() if full_at > now}
+        # Busy clients alone may fill it; don't sweep again on every new one
+        self.max_keys = max(LOCAL_STORE_MAX_KEYS, 2 * len(self.full_at))
+
+    def clear(self):
+        with self.lock:
+            self.full_at = {}
+
+
+class CacheBucketStore:
+    """Buckets in the THROTTLE_CACHE cache, shared by every process using it."""
+
+    def __init__(self):
+        self.cache = caches[settings.THROTTLE_CACHE]
+
+    def take(self, key, size, rate):
+        """Take a token from `key`'s bucket. Returns 0, or the seconds until it has one."""
+        # Whole microseconds of the wall clock, which processes share, so incr can move them on
+        now, interval = int(time.time() * 10 ** 6), int(10 ** 6 / rate)
+        key, window = f'{KEY_PREFIX}:{key}', size * interval
+        # Buckets left alone expire once full, the same as missing ones
+        timeout = math.ceil(window / 10 ** 6) + 1
+        try:
+            full_at = self.cache.incr(key, interval)
+        except ValueError:
+            full_at = None
+        if full_at is None or full_at - interval < now:
+            # New, or full again since it was last used
+            self.cache.set(key, now + interval, timeout)
+            return 0
+        wait = full_at - now - window
+        if wait > 0:
+            # Nothing taken after all
+            self.cache.decr(key, interval)
+            return wait / 10 ** 6
+        if full_at - now > window / 2:
+            # A busy bucket would otherwise expire from when it was set, half empty or worse
+            self.cache.touch(key, timeout)
+        return 0
+
+    def clear(self):
+        self.cache.clear()
+
+
+_stores = {}
+
+
+def get_store():
+    """The THROTTLE_STORE in use, created on first use."""
+    path = settings.THROTTLE_STORE
+    store = _stores.get(path)
+    if store is None:
+        store = _stores.setdefault(path, import_string(path)())
+    return store
+
+
+class Rejections:
+    """Requests refused per scope and client kind, for metrics/."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = defaultdict(int)
+
+    def record(self, scope, client):
+        with self.lock:
+            self.counts[scope, client] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def clear(self):
+        with self.lock:
+            self.counts.clear()
+
+
+rejections = Rejections()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttles views with a `throttle_scope` by THROTTLE_RATES."""
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope is None:
+            return True
+        user = request.user
+        signed_in = user is not None and user.is_authenticated
+        # Tokens carry the role, so this needs no query for ClaimsJWTAuthentication users
+        client = user.role if signed_in else 'anon'
+        bucket = settings.THROTTLE_RATES.get(scope, {}).get(client)
+        if bucket is None:
+            return True
+        ident = f'user:{user.pk}' if signed_in else self.get_ident(request)
+        self.wait_seconds = get_store().take(f'{scope}:{ident}', *bucket)
+        if self.wait_seconds:
+            rejections.record(scope, client)
+            return False
+        return True
+
+    def wait(self):
+        return self.wait_seconds
@@ -0,0 +1,71 @@
+"""
+Ticket tiers: price bands of an event, each with tickets of its own.
+
+An event with tiers sells only through them. Its available_tickets is kept
+at the sum of its tiers' and taken along with theirs, so listings, sales and
+the availability stream count tier tickets without knowing about them, as
+with seats. A booking takes from its tier with a conditional UPDATE like the
+event's, in the same transaction (see users/reservations.py), and the tier
+is read together with its event in the one query the booking makes for it.
+
+Every tier write recomputes the event's min_price and max_price from its
+tiers, so listings show the price range straight off the event row rather
+than aggregating tiers for each event they list.
+"""
+from django.db import transaction
+from django.db.models import Max, Min, Sum
+
+from .models import Booking, Event, TicketTier
+
+
+class TierConflict(Exception):
+    """Raised when a tier change would leave the event's tickets inconsistent."""
+
+
+def create_tier(event, **fields):
+    """Add a tier with `fields` (name, price, available_tickets) to `event`."""
+    with transaction.atomic():
+        event = _lock(event.id)
+        if event.seated or event.shard_count:
+            raise TierConflict("Seated and sharded events can't have ticket tiers.")
+        if not event.tiered and Booking.objects.filter(event=event, is_cancelled=False).exists():
+            # Their tickets would come back to no tier when cancelled
+            raise TierConflict("Tiers can't be added once tickets are booked without one.")
+        tier = TicketTier.objects.create(event=event, **fields)
+        _refresh(event)
+    return tier
+
+
+def update_tier(tier, **fields):
+    """Change the tier's name, price or tickets left."""
+    with transaction.atomic():
+        event = _lock(tier.event_id)
+        TicketTier.objects.filter(id=tier.id).update(**fields)
+        _refresh(event)
+    tier.refresh_from_db()
+    return tier
+
+
+def delete_tier(tier):
+    with transaction.atomic():
+        event = _lock(tier.event_id)
+        if Booking.objects.filter(tier=tier, is_cancelled=False).exists():
+            raise TierConflict("Tiers with bookings can't be deleted; set their tickets to 0 instead.")
+        tier.delete()
+        _refresh(event)
+
+
+def _lock(event_id):
+    # Bookings take the event's row before the tier's, and so does every tier write
+    return Event.objects.select_for_update().get(id=event_id)
+
+
+def _refresh(event):
+    totals = TicketTier.objects.filter(event=event).aggregate(
+        min_price=Min('price'), max_price=Max('price'), tickets=Sum('available_tickets'),
+    )
+    event.min_price, event.max_price = totals['min_price'], totals['max_price']
+    event.available_tickets = totals['tickets'] or 0
+    # The signal handlers invalidate the event's cache entries and publish its availability
+    event.save(update_fields=['available_tickets', 'min_price', 'max_price'])
+
@@ -1,16 +1,35 @@
+from django.conf import settings
 from django.urls import path
-from .views import RegisterView, LoginView, LogoutView, ManageUserRoleView, EventView, BookTicketView, BookingListView, CancelBookingView, MakePaymentView, CancelPaymentView
+from .views import RegisterView, LoginView, LogoutView, ManageUserRoleView, EventView, EventSearchView, EventCalendarView, SeatMapView, TicketTierView, OrganizerStatsView, WaitingRoomView, BookTicketView, BatchBookTicketView, BookingListView, CancelBookingView, MakePaymentView, CancelPaymentView
+from .views import AsyncEventView, AsyncBookingListView, AvailabilityStreamView, MetricsView, with_async_reads
+
+event_view = EventView.as_view()
+booking_list_view = BookingListView.as_view()
+if settings.ASYNC_READ_VIEWS:
+    # Reads go to the async views; writes still go through the APIViews
+    event_view = with_async_reads(event_view, AsyncEventView.as_view())
+    booking_list_view = AsyncBookingListView.as_view()
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', LoginView.as_view(), name='login'),
     path('logout/', LogoutView.as_view(), name='logout'),
     path('manage-role/', ManageUserRoleView.as_view(), name='manage-role'),
-    path('events/', EventView.as_view(), name='create-event'),
-    path('events/<int:event_id>/', EventView.as_view(), name='mod-event'),
+    path('events/', event_view, name='create-event'),
+    path('events/search/', EventSearchView.as_view(), name='search-events'),
+    path('events/availability/', AvailabilityStreamView.as_view(), name='event-availability'),
+    path('events/calendar/', EventCalendarView.as_view(), name='event-calendar'),
+    path('events/<int:event_id>/', event_view, name='mod-event'),
+    path('events/<int:event_id>/seats/', SeatMapView.as_view(), name='event-seats'),
+    path('events/<int:event_id>/tiers/', TicketTierView.as_view(), name='event-tiers'),
+    path('events/<int:event_id>/tiers/<int:tier_id>/', TicketTierView.as_view(), name='event-tier'),
+    path('organizer/stats/', OrganizerStatsView.as_view(), name='organizer-stats'),
+    path('waiting-room/', WaitingRoomView.as_view(), name='waiting-room'),
     path('book-ticket/', BookTicketView.as_view(), name='book-ticket'),
-    path('my-bookings/', BookingListView.as_view(), name='my-bookings'),
+    path('book-tickets/batch/', BatchBookTicketView.as_view(), name='book-tickets-batch'),
+    path('my-bookings/', booking_list_view, name='my-bookings'),
     path('cancel-booking/', CancelBookingView.as_view(), name='cancel-booking'),
     path('make-payment/', MakePaymentView.as_view(), name='make-payment'),
     path('cancel-payment/', CancelPaymentView.as_view(), name='cancel-payment'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
@@ -1,12 +1,32 @@
+import datetime
+import hmac
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.views import View
 from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated, Throttled, ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
 from rest_framework.response import Response
-from rest_framework.views import APIView
+from rest_framework.views import APIView, exception_handler
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.views import TokenObtainPairView
-from .models import User, Event, Booking
-from .serializers import RegisterSerializer, EventSerializer, BookingSerializer
+from .models import User, Event, Booking, TicketTier
+from .serializers import RegisterSerializer, LoginSerializer, EventSerializer, ExpandedBookingSerializer, FastEventSerializer, FastBookingSerializer, SalesTotalsSerializer, EventSalesSerializer, SeatMapSerializer, TicketTierSerializer
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.shortcuts import get_object_or_404
+from . import authentication, availability, caching, calendar_index, metrics, sales, search, seating, throttling, tiers, waiting_room
+from .authentication import ClaimsJWTAuthentication
+from .idempotency import idempotent
+from .pagination import KeysetPagination
+from .payments import PaymentRejected, confirm_payment, cancel_payment
+from .reservations import BatchRejected, NotEnoughAdjacentSeats, NotEnoughTickets, TierRequired, reserve_batch, reserve_tickets, cancel_booking, cancel_event
 
 
 class RegisterView(APIView):
@@ -21,6 +41,8 @@ class RegisterView(APIView):
 
 class LoginView(TokenObtainPairView):
     permission_classes = [AllowAny]
+    throttle_scope = 'login'
+    serializer_class = LoginSerializer
 
 
 class LogoutView(APIView):
@@ -31,6 +53,7 @@ class LogoutView(APIView):
             refresh_token = request.data['refresh']
             token = RefreshToken(refresh_token)
             token.blacklist()
+            authentication.revoke_session(token['jti'])
 
             return Response({"message": "Logout successful."}, status=status.HTTP_200_OK)
         except Exception as e:
@@ -47,10 +70,13 @@ class ManageUserRoleView(APIView):
             if action == "promote":
                 user.role = User.EVENT_MANAGER
                 user.save()
+                # Tokens carry the role, so the user has to log in again to get the new one
+                authentication.revoke_user_sessions(user)
                 return Response({"message": "User promoted to Event Manager successfully."}, status=status.HTTP_200_OK)
             elif action == "demote":
                 user.role = User.USER
                 user.save()
+                authentication.revoke_user_sessions(user)
                 return Response({"message": "User demoted to regular User successfully."}, status=status.HTTP_200_OK)
             else:
                 return Response({"error": "Invalid action. Use 'promote' or 'demote'."}, status=status.HTTP_400_BAD_REQUEST)
@@ -59,35 +85,75 @@ class ManageUserRoleView(APIView):
             return Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
     
 
+def _date_param(params, name):
+    """The date in query parameter `name`, or None if it isn't given."""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({name: ["Enter a date as YYYY-MM-DD."]})
+
+
+def event_detail(event_id):
+    """The serialized event, from the detail cache. Returns (data, hit)."""
+    return caching.read_through(
+        'detail', event_id, caching.event_version_names(event_id),
+        lambda: EventSerializer(get_object_or_404(Event.objects.with_inventory(), id=event_id)).data,
+    )
+
+
 class EventView(APIView):
 
     # Allow unauthenticated users to view the events too
     permission_classes = [AllowAny]
+    throttle_scope = 'events'
 
     def get(self, request, event_id=None):
         """Retrieve a list of events or a single event for all users."""
         if event_id is not None:
             # Retrieve a specific event by ID (if provided)
-            event = get_object_or_404(Event, id=event_id)
-            serializer = EventSerializer(event)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-
-        # Otherwise retrieve all events
-        events = Event.objects.all()
+            data, hit = event_detail(event_id)
+            return Response(data, status=status.HTTP_200_OK, headers={'X-Cache': 'HIT' if hit else 'MISS'})
+
+        # Listing pages are cached per query string, under the versions of the filters used. Bookings
+        # don't invalidate them, so they expire sooner (see users/caching.py)
+        data, hit = caching.read_through(
+            'listing', request.build_absolute_uri(), caching.listing_version_names(request.query_params),
+            lambda: self.list_events(request), timeout=settings.EVENT_LISTING_CACHE_TIMEOUT,
+        )
+        return Response(data, status=status.HTTP_200_OK, headers={'X-Cache': 'HIT' if hit else 'MISS'})
+
+    def list_events(self, request):
+        # Keyset pagination over (date, time, id), backed by the composite indexes on Event
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(FastEventSerializer.values(self.filter_events(request)), request, view=self)
+        serializer = FastEventSerializer(page)
+        return paginator.get_paginated_response(serializer.data).data
+
+    @staticmethod
+    def filter_events(request):
+        # Otherwise retrieve all events, with sharded inventory summed in the same query
+        events = Event.objects.with_inventory()
 
         location = request.query_params.get('location')
         date = request.query_params.get('date')
         category = request.query_params.get('category')
+        date_from = _date_param(request.query_params, 'date_from')
+        date_to = _date_param(request.query_params, 'date_to')
 
         if location:
             events = events.filter(location=location)
         if date:
             events = events.filter(date=date)
+        if date_from:
+            events = events.filter(date__gte=date_from)
+        if date_to:
+            events = events.filter(date__lte=date_to)
         if category:
             events = events.filter(category=category)
-
-        serializer = EventSerializer(events, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return events
     
     # Helper function to check authentication and event_manager role
     def is_event_manager(self, user):
@@ -99,132 +165,425 @@ class EventView(APIView):
 
         serializer = EventSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(created_by=request.user)
+            serializer.save(created_by_id=request.user.id)
             return Response({"message": "Event created successfully"}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def put(self, request, event_id):
-        event = get_object_or_404(Event, id=event_id)
+        return self.update_event(request, event_id)
 
-        if not self.is_event_manager(request.user):
-            return Response({"error": "You do not have permission to edit this event."}, status=status.HTTP_403_FORBIDDEN)
+    def patch(self, request, event_id):
+        return self.update_event(request, event_id, partial=True)
 
-        serializer = EventSerializer(event, data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response({"message": "Event updated successfully"}, status=status.HTTP_200_OK)
+    def update_event(self, request, event_id, partial=False):
+        with transaction.atomic():
+            # Locked so bookings can't change the tickets between validating and saving
+            event = get_object_or_404(Event.objects.select_for_update(), id=event_id)
+
+            if not self.is_event_manager(request.user):
+                return Response({"error": "You do not have permission to edit this event."}, status=status.HTTP_403_FORBIDDEN)
+
+            serializer = EventSerializer(event, data=request.data, partial=partial)
+            if serializer.is_valid():
+                serializer.save()
+                return Response({"message": "Event updated successfully"}, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    def patch(self, request, event_id):
+    def delete(self, request, event_id):
         event = get_object_or_404(Event, id=event_id)
 
         if not self.is_event_manager(request.user):
+            return Response({"error": "You do not have permission to delete this event."}, status=status.HTTP_403_FORBIDDEN)
+
+        # Bookings are cancelled in bulk; refunds are issued by a background job
+        cancel_event(event)
+        return Response({"message": "Event deleted successfully. All associated bookings have been cancelled and refund has been initiated"}, status=status.HTTP_204_NO_CONTENT)
+    
+class EventCalendarView(APIView):
+    permission_classes = [AllowAny]
+    throttle_scope = 'events'
+
+    def get(self, request):
+        """How many events each day from date_from to date_to has, by city and category."""
+        date_from = _date_param(request.query_params, 'date_from')
+        date_to = _date_param(request.query_params, 'date_to')
+        if date_from is None or date_to is None:
+            return Response({"error": "date_from and date_to are required."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 <= (date_to - date_from).days < settings.CALENDAR_MAX_DAYS:
+            return Response(
+                {"error": f"date_to must be on or after date_from, at most {settings.CALENDAR_MAX_DAYS} days in all."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Read from the precomputed day counts, under the same cache versions as the listing
+        location, category = request.query_params.get('location'), request.query_params.get('category')
+        data, hit = caching.read_through(
+            'calendar', request.build_absolute_uri(), caching.listing_version_names(request.query_params),
+            lambda: {
+                "date_from": date_from.isoformat(),
+                "date_to": date_to.isoformat(),
+                "days": [
+                    {"date": date.isoformat(), "location": location, "category": category, "events": events}
+                    for date, location, category, events in calendar_index.histogram(date_from, date_to, location, category)
+                ],
+            },
+        )
+        return Response(data, status=status.HTTP_200_OK, headers={'X-Cache': 'HIT' if hit else 'MISS'})
+
+class SeatMapView(APIView):
+    permission_classes = [AllowAny]
+    throttle_scope = 'events'
+
+    def get(self, request, event_id):
+        """The event's seats, with a bitmap of the taken ones in each row."""
+        data, hit = seating.snapshot(event_id)
+        return Response(data, status=status.HTTP_200_OK, headers={'X-Cache': 'HIT' if hit else 'MISS'})
+
+    def put(self, request, event_id):
+        """Sell the event by the seat, from the seat map in the payload."""
+        event = get_object_or_404(Event, id=event_id)
+        if not (request.user.is_authenticated and request.user.role == 'event_manager'):
             return Response({"error": "You do not have permission to edit this event."}, status=status.HTTP_403_FORBIDDEN)
 
-        serializer = EventSerializer(event, data=request.data, partial=True)
-        if serializer.is_valid():
-            serializer.save()
-            return Response({"message": "Event updated successfully"}, status=status.HTTP_200_OK)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        serializer = SeatMapSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            event = seating.create_seat_map(event, serializer.validated_data['sections'])
+        except seating.SeatMapLocked as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response({"message": "Seat map saved.", "available_tickets": event.available_tickets}, status=status.HTTP_200_OK)
 
-    def delete(self, request, event_id):
+class MetricsView(View):
+    def get(self, request):
+        """This process's request, cache and job metrics, for Prometheus to scrape."""
+        # They name views, clients and traffic, so only a scraper holding METRICS_TOKEN reads them
+        if not settings.METRICS_TOKEN:
+            raise Http404()
+        expected = f'Bearer {settings.METRICS_TOKEN}'
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected.encode()):
+            return HttpResponse(status=status.HTTP_401_UNAUTHORIZED, headers={'WWW-Authenticate': 'Bearer realm="metrics"'})
+        return HttpResponse(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+class EventSearchView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        """Events matching the `q` query, best match first."""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"error": "Query parameter 'q' is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        ids = search.index.search(query, limit=KeysetPagination().get_page_size(request))
+        rows = {row['id']: row for row in FastEventSerializer.values(Event.objects.with_inventory().filter(id__in=ids))}
+        # Keep the index's ranking; ids deleted by another process are dropped
+        serializer = FastEventSerializer([rows[event_id] for event_id in ids if event_id in rows])
+        return Response({"results": serializer.data}, status=status.HTTP_200_OK)
+
+class TicketTierView(APIView):
+    permission_classes = [AllowAny]
+    throttle_scope = 'events'
+
+    def get(self, request, event_id):
+        """The event's ticket tiers, cheapest first, with the tickets left in each."""
+        data, hit = caching.read_through('tiers', event_id, [f'event:{event_id}'], lambda: TicketTierSerializer(
+            get_object_or_404(Event.objects.only('id'), id=event_id).tiers.order_by('price', 'id'), many=True,
+        ).data)
+        return Response(data, status=status.HTTP_200_OK, headers={'X-Cache': 'HIT' if hit else 'MISS'})
+
+    def post(self, request, event_id):
         event = get_object_or_404(Event, id=event_id)
+        if not (request.user.is_authenticated and request.user.role == 'event_manager'):
+            return Response({"error": "You do not have permission to edit this event."}, status=status.HTTP_403_FORBIDDEN)
 
-        if not self.is_event_manager(request.user):
-            return Response({"error": "You do not have permission to delete this event."}, status=status.HTTP_403_FORBIDDEN)
+        serializer = TicketTierSerializer(data=request.data, context={'event': event})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            tier = tiers.create_tier(event, **serializer.validated_data)
+        except tiers.TierConflict as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response(TicketTierSerializer(tier).data, status=status.HTTP_201_CREATED)
+
+    def patch(self, request, event_id, tier_id):
+        tier = get_object_or_404(TicketTier.objects.select_related('event'), id=tier_id, event_id=event_id)
+        if not (request.user.is_authenticated and request.user.role == 'event_manager'):
+            return Response({"error": "You do not have permission to edit this event."}, status=status.HTTP_403_FORBIDDEN)
 
-        bookings = Booking.objects.filter(event=event)
+        serializer = TicketTierSerializer(tier, data=request.data, partial=True, context={'event': tier.event})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        tier = tiers.update_tier(tier, **serializer.validated_data)
+        return Response(TicketTierSerializer(tier).data, status=status.HTTP_200_OK)
 
-        for booking in bookings:
-            if booking.is_paid:
-                booking.is_paid = False
-                booking.is_confirmed = False
-                booking.payment_method = None
-                booking.save()
-            booking.is_cancelled = True
-            booking.save()
+    def delete(self, request, event_id, tier_id):
+        tier = get_object_or_404(TicketTier, id=tier_id, event_id=event_id)
+        if not (request.user.is_authenticated and request.user.role == 'event_manager'):
+            return Response({"error": "You do not have permission to edit this event."}, status=status.HTTP_403_FORBIDDEN)
 
-        event.delete()
-        return Response({"message": "Event deleted successfully. All associated bookings have been cancelled and refund has been initiated"}, status=status.HTTP_204_NO_CONTENT)
-    
-class BookTicketView(APIView):
+        try:
+            tiers.delete_tier(tier)
+        except tiers.TierConflict as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class OrganizerStatsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Sales totals for the requesting event manager's events, and across all of them."""
+        if request.user.role != 'event_manager':
+            return Response({"error": "You do not have permission to view sales."}, status=status.HTTP_403_FORBIDDEN)
+
+        # Read from the precomputed EventSales rows, never the bookings themselves
+        paginator = KeysetPagination()
+        events = sales.organizer_events(request.user).values('id', 'title', 'date', 'time', *sales.FIELDS)
+        page = paginator.paginate_queryset(events, request, view=self)
+        return Response({
+            "totals": SalesTotalsSerializer(sales.organizer_totals(request.user)).data,
+            "next": paginator.get_next_link(),
+            "results": EventSalesSerializer(page, many=True).data,
+        }, status=status.HTTP_200_OK)
+
+class WaitingRoomView(APIView):
     permission_classes = [IsAuthenticated]
+    # Claims-only authentication, so joining and polling never touch the database (see users/authentication.py)
+    authentication_classes = [ClaimsJWTAuthentication]
 
     def post(self, request):
-        event_id = request.data.get("event_id")
-        number_of_tickets = int(request.data.get("number_of_tickets"))
+        """Join the event's waiting room, or get back the place already held."""
+        try:
+            event_id = int(request.data.get("event_id"))
+        except (TypeError, ValueError):
+            return Response({"error": "Invalid event_id."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # If the event exists
-        event = get_object_or_404(Event, id=event_id)
+        # From the event cache, so a crowd joining costs no queries
+        admission_rate = event_detail(event_id)[0]['admission_rate']
+        if not admission_rate:
+            return Response({"queue_token": None, "admitted": True}, status=status.HTTP_200_OK)
+        token, place = waiting_room.join(request.user, event_id, admission_rate)
+        return self.place_response({"queue_token": token, **place})
 
-        # Checking for enough tickets
-        if number_of_tickets > event.available_tickets:
-            return Response({"error": "Not enough tickets available."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        amount = event.price*number_of_tickets
-        booking = Booking.objects.create(user=request.user, event=event, number_of_tickets=number_of_tickets, price_per_ticket=event.price,payment_amount=amount)
+    def get(self, request):
+        """Where `?queue_token=` stands in line."""
+        try:
+            event_id, position = waiting_room.read_token(request.query_params.get("queue_token"), request.user)
+        except waiting_room.InvalidQueueToken as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        admission_rate = event_detail(event_id)[0]['admission_rate']
+        if not admission_rate:
+            # The waiting room was switched off since
+            return Response({"admitted": True}, status=status.HTTP_200_OK)
+        return self.place_response(waiting_room.place(event_id, position, admission_rate))
+
+    @staticmethod
+    def place_response(data):
+        return Response(data, status=status.HTTP_200_OK, headers=None if data['admitted'] else _retry_after(data))
+
+
+def _retry_after(place):
+    # The header only takes whole seconds; the body's retry_after is exact
+    return {'Retry-After': str(math.ceil(place['retry_after']))}
+
+
+def admission_refusal(request, token, event_id, admission_rate):
+    """None if `token` lets the user book `event_id`, otherwise the response refusing them."""
+    try:
+        token_event_id, position = waiting_room.read_token(token, request.user)
+    except waiting_room.InvalidQueueToken as e:
+        return Response({"error": f"{e} Join the waiting room for this event first."}, status=status.HTTP_403_FORBIDDEN)
+    if token_event_id != event_id:
+        return Response({"error": "This queue token is for another event."}, status=status.HTTP_403_FORBIDDEN)
+
+    place = waiting_room.place(event_id, position, admission_rate)
+    if not place["admitted"]:
+        return Response(
+            {"error": "You have not been admitted from the waiting room yet.", **place},
+            status=status.HTTP_429_TOO_MANY_REQUESTS, headers=_retry_after(place),
+        )
+    return None
+
+
+class BookTicketView(APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'book-ticket'
+
+    # Retried requests carrying the same Idempotency-Key replay the first response
+    @idempotent
+    def post(self, request):
+        event_id = request.data.get("event_id")
+        try:
+            number_of_tickets = int(request.data.get("number_of_tickets"))
+        except (TypeError, ValueError):
+            number_of_tickets = 0
+        if number_of_tickets < 1:
+            return Response({"error": "Invalid number of tickets."}, status=status.HTTP_400_BAD_REQUEST)
+
+        tier_id = request.data.get("tier_id")
+        if tier_id is None:
+            # If the event exists
+            event, tier = get_object_or_404(Event, id=event_id), None
+        else:
+            try:
+                tier_id = int(tier_id)
+            except (TypeError, ValueError):
+                return Response({"error": "Invalid tier_id."}, status=status.HTTP_400_BAD_REQUEST)
+            # The tier's price and tickets come in the same query as its event
+            tier = get_object_or_404(TicketTier.objects.select_related('event'), id=tier_id, event_id=event_id)
+            event = tier.event
+
+        # Events on sale through a waiting room only take users it has let through
+        if event.admission_rate:
+            refusal = admission_refusal(request, request.data.get("queue_token"), event.id, event.admission_rate)
+            if refusal is not None:
+                return refusal
+
+        # Tickets are taken with a conditional update, so concurrent bookings can't oversell.
+        # Bookings under way set how fast the waiting room lets users through
+        try:
+            with waiting_room.booking(*([event.id] if event.admission_rate else [])):
+                booking = reserve_tickets(request.user, event, number_of_tickets, tier)
+        except (NotEnoughTickets, TierRequired) as e:
+            return Response({"error": BATCH_ERRORS[type(e)]}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = {"message": "Tickets booked successfully.", "booking_id": booking.id, "hold_expires_at": booking.hold_expires_at}
+        if booking.seat_row_id is not None:
+            data["seats"] = seating.describe(booking)
+        return Response(data, status=status.HTTP_201_CREATED)
+
+BATCH_ERRORS = {
+    Event.DoesNotExist: "Event not found.",
+    NotEnoughTickets: "Not enough tickets available.",
+    NotEnoughAdjacentSeats: "Not enough adjacent seats available.",
+    TicketTier.DoesNotExist: "Ticket tier not found.",
+    TierRequired: "This event sells tickets by tier; choose one with tier_id.",
+}
+
+
+def _parse_batch_item(item):
+    """(event_id, number_of_tickets, tier_id or None) for a valid batch item, or None."""
+    if not isinstance(item, dict):
+        return None
+    try:
+        event_id, number_of_tickets = int(item.get("event_id")), int(item.get("number_of_tickets"))
+        tier_id = None if item.get("tier_id") is None else int(item.get("tier_id"))
+    except (TypeError, ValueError):
+        return None
+    return (event_id, number_of_tickets, tier_id) if number_of_tickets >= 1 else None
+
+
+class BatchBookTicketView(APIView):
+    permission_classes = [IsAuthenticated]
+    # Shares a bucket with book-ticket/
+    throttle_scope = 'book-ticket'
 
-        # Update available tickets for the event
-        event.available_tickets -= number_of_tickets
-        event.save()
+    @idempotent
+    def post(self, request):
+        items = request.data.get("items")
+        if not isinstance(items, list) or not items:
+            return Response({"error": "items must be a non-empty list."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.BATCH_BOOKING_MAX_ITEMS:
+            return Response({"error": f"A batch can book at most {settings.BATCH_BOOKING_MAX_ITEMS} items."}, status=status.HTTP_400_BAD_REQUEST)
+        all_or_nothing = request.data.get("atomic", True) not in (False, "false", "0", 0)
+
+        parsed = [_parse_batch_item(item) for item in items]
+        valid = [item for item in parsed if item is not None]
+
+        # Items for events behind a waiting room each carry a queue token that has been let through
+        gated = dict(Event.objects.filter(id__in={fields[0] for fields in valid}, admission_rate__gt=0).values_list('id', 'admission_rate'))
+        for item, fields in zip(items, parsed):
+            if fields is not None and fields[0] in gated:
+                refusal = admission_refusal(request, item.get("queue_token"), fields[0], gated[fields[0]])
+                if refusal is not None:
+                    return refusal
+        results = iter([])
+        if not all_or_nothing or len(valid) == len(parsed):
+            # Every item is booked in one transaction, whatever happens to the others
+            try:
+                with waiting_room.booking(*gated):
+                    results = iter(reserve_batch(request.user, valid, all_or_nothing=all_or_nothing))
+            except BatchRejected as e:
+                results = iter(e.results)
+            except NotEnoughTickets:
+                results = iter([NotEnoughTickets()] * len(valid))
+
+        response, booked = [], 0
+        for item, fields in zip(items, parsed):
+            result = next(results, None) if fields is not None else None
+            entry = {"event_id": fields[0], "number_of_tickets": fields[1]} if fields else {"item": item}
+            if fields and fields[2] is not None:
+                entry.update(tier_id=fields[2])
+            if isinstance(result, Booking):
+                booked += 1
+                entry.update(booked=True, booking_id=result.id, hold_expires_at=result.hold_expires_at)
+                if result.seat_row_id is not None:
+                    entry.update(seats=seating.describe(result))
+            elif fields is None:
+                entry.update(booked=False, error="Invalid event or number of tickets.")
+            elif result is None:
+                entry.update(booked=False, error="Not booked because another item was refused.")
+            else:
+                entry.update(booked=False, error=BATCH_ERRORS[type(result)])
+            response.append(entry)
 
-        return Response({"message": "Tickets booked successfully.", "booking_id": booking.id}, status=status.HTTP_201_CREATED)
+        if not booked:
+            return Response({"error": "No tickets were booked.", "results": response}, status=status.HTTP_400_BAD_REQUEST)
+        message = "Tickets booked successfully." if booked == len(items) else f"{booked} of {len(items)} items booked."
+        return Response({"message": message, "results": response}, status=status.HTTP_201_CREATED)
 
 class BookingListView(APIView):
     permission_classes = [IsAuthenticated]
 
+    # Newest first, backed by the (user, created_at, id) index
+    ordering = ('-created_at', '-id')
+
     def get(self, request):
-        bookings = Booking.objects.filter(user=request.user)
-        serializer = BookingSerializer(bookings, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        bookings = Booking.objects.filter(user_id=request.user.id)
+        paginator = KeysetPagination(ordering=self.ordering)
+
+        if request.query_params.get('expand') == 'event':
+            # Events come in the same query as the bookings, however many there are
+            page = paginator.paginate_queryset(bookings.select_related('event'), request, view=self)
+            serializer = ExpandedBookingSerializer(page, many=True)
+        else:
+            page = paginator.paginate_queryset(FastBookingSerializer.values(bookings), request, view=self)
+            serializer = FastBookingSerializer(page)
+        return paginator.get_paginated_response(serializer.data)
 
 class CancelBookingView(APIView):
     permission_classes = [IsAuthenticated]
 
-    def post(self, request, booking_id):
+    def post(self, request, booking_id=None):
+        booking_id = booking_id or request.data.get("booking_id")
         booking = get_object_or_404(Booking, id=booking_id)
 
-        if booking.user != request.user:
+        if booking.user_id != request.user.id:
             return Response({"error": "You do not have permission to cancel this booking."}, status=status.HTTP_403_FORBIDDEN)
 
-        event = booking.event
-
-        event.available_tickets += booking.number_of_tickets
-        event.save()
-
-        if booking.is_paid:
-            booking.is_paid = False
-            booking.is_confirmed = False
-            booking.payment_method = None
-            booking.save()
-
-            # We can add payment refund processing logic here
-        
-        booking.is_cancelled = True
-        booking.save()
+        # Paid bookings get a refund job queued in the same transaction
+        if not cancel_booking(booking):
+            return Response({"error": "Booking is already cancelled."}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response({"message": "Booking canceled successfully. Refund has been initiated"}, status=status.HTTP_204_NO_CONTENT)
 
 class MakePaymentView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     def post(self, request):
         booking_id = request.data.get("booking_id")
         payment_method = request.data.get("payment_method")
 
         booking = get_object_or_404(Booking, id=booking_id)
 
-        if booking.user != request.user:
+        if booking.user_id != request.user.id:
             return Response({"error": "You do not have permission to pay for this booking."}, status=status.HTTP_403_FORBIDDEN)
 
-        if booking.is_paid:
-            return Response({"error": "Booking is already paid."}, status=status.HTTP_400_BAD_REQUEST)
-
-
-        booking.is_paid = True
-        booking.payment_method = payment_method
-        booking.is_confirmed = True
-        booking.save()
+        # Confirmation side effects run as a background job
+        try:
+            confirm_payment(booking, payment_method)
+        except PaymentRejected as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response({"message": "Payment successful. Booking confirmed.", "amount_paid": booking.payment_amount}, status=status.HTTP_200_OK)
 
@@ -235,15 +594,142 @@ class CancelPaymentView(APIView):
         booking_id = request.data.get('booking_id')
         booking = get_object_or_404(Booking, id=booking_id)
 
-        if booking.user != request.user:
+        if booking.user_id != request.user.id:
             return Response({"error": "You do not have permission to cancel this payment."}, status=status.HTTP_403_FORBIDDEN)
 
-        if not booking.is_paid:
+        # The refund is issued by a background job
+        if not cancel_payment(booking):
             return Response({"error": "Payment has not been made."}, status=status.HTTP_400_BAD_REQUEST)
 
-        booking.is_paid = False
-        booking.payment_method = None
-        booking.is_confirmed = False
-        booking.save()
-
         return Response({"message": "Payment canceled successfully. Refund has been initiated"}, status=status.HTTP_200_OK)
+
+
+# Async variants of the read-heavy endpoints, for ASGI deployments. Under
+# ASGI every sync view runs on one shared thread, so a page waiting on the
+# database holds up all the others; these views only hand the queries
+# themselves to the async ORM and do everything else on the event loop.
+# They render the same JSON as the APIViews they mirror.
+
+def _json(data, status_code=status.HTTP_200_OK, headers=None):
+    return HttpResponse(JSONRenderer().render(data), status=status_code, headers=headers, content_type='application/json')
+
+
+def _error(exc):
+    """Render `exc` the way APIView's exception handling would."""
+    response = exception_handler(exc, {})
+    headers = {name: response[name] for name in ('WWW-Authenticate', 'Retry-After') if response.has_header(name)}
+    if response.status_code == status.HTTP_401_UNAUTHORIZED:
+        headers['WWW-Authenticate'] = JWTAuthentication().authenticate_header(None)
+    return _json(response.data, response.status_code, headers)
+
+
+async def _authenticate(request, optional=False):
+    """
+    The JWT-authenticated user, or raise. With `optional`, a request without
+    a token gets None instead. Only the user lookup leaves the event loop.
+    """
+    # The configured JWT backend, as the APIViews would use
+    authenticator = BookingListView.authentication_classes[0]()
+    header = authenticator.get_header(request)
+    raw_token = authenticator.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        if optional:
+            return None
+        raise NotAuthenticated()
+    token = authenticator.get_validated_token(raw_token)
+    return await sync_to_async(authenticator.get_user)(token)
+
+
+class AsyncEventView(View):
+    """Async `EventView.get`."""
+
+    throttle_scope = 'events'
+
+    async def get(self, request, event_id=None):
+        request = Request(request)
+        # Signed-in clients are throttled by user, as by EventView, and the rest by IP address
+        try:
+            request.user = await _authenticate(request, optional=True) or AnonymousUser()
+        except APIException as exc:
+            return _error(exc)
+        throttle = throttling.TokenBucketThrottle()
+        if not throttle.allow_request(request, self):
+            return _error(Throttled(throttle.wait()))
+        try:
+            if event_id is not None:
+                data, hit = await caching.aread_through(
+                    'detail', event_id, caching.event_version_names(event_id),
+                    lambda: self.event_detail(event_id),
+                )
+            else:
+                data, hit = await caching.aread_through(
+                    'listing', request.build_absolute_uri(), caching.listing_version_names(request.query_params),
+                    lambda: self.list_events(request), timeout=settings.EVENT_LISTING_CACHE_TIMEOUT,
+                )
+        except (APIException, Http404) as exc:
+            return _error(exc)
+        return _json(data, headers={'X-Cache': 'HIT' if hit else 'MISS'})
+
+    async def event_detail(self, event_id):
+        event = await Event.objects.with_inventory().filter(id=event_id).afirst()
+        if event is None:
+            raise Http404(f'No {Event._meta.object_name} matches the given query.')
+        return EventSerializer(event).data
+
+    async def list_events(self, request):
+        paginator = KeysetPagination()
+        page = await paginator.apaginate_queryset(FastEventSerializer.values(EventView.filter_events(request)), request)
+        return paginator.get_paginated_response(FastEventSerializer(page).data).data
+
+
+class AsyncBookingListView(View):
+    """Async `BookingListView.get`."""
+
+    async def get(self, request):
+        request = Request(request)
+        try:
+            user = await _authenticate(request)
+            bookings = Booking.objects.filter(user_id=user.id)
+            paginator = KeysetPagination(ordering=BookingListView.ordering)
+
+            if request.query_params.get('expand') == 'event':
+                page = await paginator.apaginate_queryset(bookings.select_related('event'), request)
+                serializer = ExpandedBookingSerializer(page, many=True)
+            else:
+                page = await paginator.apaginate_queryset(FastBookingSerializer.values(bookings), request)
+                serializer = FastBookingSerializer(page)
+        except APIException as exc:
+            return _error(exc)
+        return _json(paginator.get_paginated_response(serializer.data).data)
+
+
+class AvailabilityStreamView(View):
+    """Server-sent events reporting ticket availability for `?events=1,2,...`."""
+
+    async def get(self, request):
+        try:
+            event_ids = availability.parse_event_ids(request.GET.get('events', ''))
+        except ValueError as exc:
+            return _json({"error": str(exc)}, status.HTTP_400_BAD_REQUEST)
+
+        if not hasattr(request, 'scope'):
+            # WSGI can't hold a stream open without a worker per client, so
+            # send the snapshot and let the client reconnect after `retry`
+            snapshot = await sync_to_async(availability.current_availability)(event_ids)
+            content = availability.retry_field() + availability.render(snapshot)
+            return HttpResponse(content, headers=availability.HEADERS, content_type='text/event-stream')
+        return StreamingHttpResponse(availability.stream(event_ids), headers=availability.HEADERS, content_type='text/event-stream')
+
+
+def with_async_reads(sync_view, async_view):
+    """One view serving GET with `async_view` and every other method with `sync_view`."""
+    sync_view = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if request.method == 'GET':
+            return await async_view(request, *args, **kwargs)
+        return await sync_view(request, *args, **kwargs)
+
+    # Like APIView.as_view(); DRF enforces CSRF itself for session-authenticated requests
+    view.csrf_exempt = True
+    return view
@@ -0,0 +1,136 @@
+"""
+Virtual waiting room for on-sale spikes.
+
+An event with `admission_rate` set only takes bookings from users its
+waiting room has let through. A user joins at waiting-room/ and gets a
+queue token holding their place in line, then polls with it until the
+admission point passes that place. book-ticket/ takes the token as
+`queue_token`. Joining again returns the same place.
+
+Tokens are signed with SECRET_KEY (an HMAC), so checking one costs no
+query: the signature and age, then a cache read of the admission point.
+The line itself is a few counters per event in the cache, which spans
+processes only with a shared cache backend, as with idempotency keys.
+
+The admission point moves on steadily at the controller's rate, and each
+waiting user is told when their place should come up, so admitted users
+reach book-ticket/ spread out at that rate rather than all at once. Every
+WAITING_ROOM_TICK seconds the first request to arrive takes a controller
+step. The rate starts at the event's admission_rate. Bookings count
+themselves while under way, and when more are under way than the booking
+path got through in WAITING_ROOM_TARGET_LATENCY at its last step's pace,
+the rate drops below that pace until the backlog clears. While bookings
+keep up it climbs back a tenth per step, up to admission_rate. So the
+booking path sees no more users than it keeps up with, however many wait.
+"""
+import contextlib
+import math
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+KEY_PREFIX = 'waiting'
+SALT = 'users.waiting_room'
+# Share of itself the rate climbs by per step while bookings keep up
+RECOVERY = 0.1
+
+
+class InvalidQueueToken(Exception):
+    """Raised for a queue token that is forged, expired or someone else's."""
+
+
+def _key(event_id, name):
+    return f'{KEY_PREFIX}:{event_id}:{name}'
+
+
+def _incr(key, delta=1):
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        if cache.add(key, delta, timeout=None):
+            return delta
+        # Another request created it first
+        return cache.incr(key, delta)
+
+
+def join(user, event_id, admission_rate):
+    """`user`'s queue token for `event_id` and where they stand, taking a place in line if they have none."""
+    user_key = _key(event_id, f'user:{user.pk}')
+    position = cache.get(user_key)
+    if position is None:
+        position = _incr(_key(event_id, 'issued'))
+        if not cache.add(user_key, position, timeout=settings.WAITING_ROOM_TOKEN_TTL):
+            # The same user joined twice at once; the place taken first stands
+            position = cache.get(user_key, position)
+    token = signing.TimestampSigner(salt=SALT).sign_object([event_id, user.pk, position])
+    return token, place(event_id, position, admission_rate)
+
+
+def read_token(token, user):
+    """The (event_id, position) in `user`'s queue token."""
+    try:
+        event_id, user_id, position = signing.TimestampSigner(salt=SALT).unsign_object(
+            token or '', max_age=settings.WAITING_ROOM_TOKEN_TTL
+        )
+    except (signing.BadSignature, TypeError, ValueError):
+        raise InvalidQueueToken('Invalid or expired queue token.')
+    if user_id != user.pk:
+        raise InvalidQueueToken('This queue token belongs to another user.')
+    return event_id, position
+
+
+def place(event_id, position, admission_rate):
+    """Where `position` stands in the event's line."""
+    admitted, rate = advance(event_id, admission_rate)
+    if position <= admitted:
+        return {'position': position, 'ahead': 0, 'admitted': True, 'retry_after': 0}
+    return {
+        'position': position,
+        'ahead': math.ceil(position - admitted),
+        'admitted': False,
+        # Seconds until this place should come up at the current rate; clients check back then
+        'retry_after': min(math.ceil((position - admitted) / rate * 100) / 100, settings.WAITING_ROOM_POLL_INTERVAL),
+    }
+
+
+@contextlib.contextmanager
+def booking(*event_ids):
+    """Count a booking for `event_ids` as under way while the block runs, for their controllers."""
+    for event_id in event_ids:
+        _incr(_key(event_id, 'started'))
+    try:
+        yield
+    finally:
+        for event_id in event_ids:
+            _incr(_key(event_id, 'completed'))
+
+
+def advance(event_id, admission_rate):
+    """The event's admission point and current rate, taking a controller step if one is due."""
+    now = time.time()
+    values = cache.get_many([_key(event_id, name) for name in ('controller', 'issued', 'started', 'completed')])
+    issued, started, completed = (values.get(_key(event_id, name), 0) for name in ('issued', 'started', 'completed'))
+    # The first user goes straight in, and the rest follow at full rate
+    state = values.get(_key(event_id, 'controller')) or {
+        'at': now, 'admitted': 1, 'rate': admission_rate, 'completed': completed,
+    }
+    # Steps missed while nobody polled don't bank admissions for a burst, nor does an empty line
+    admitted = min(state['admitted'] + state['rate'] * min(now - state['at'], 2 * settings.WAITING_ROOM_TICK), issued)
+    if not cache.add(_key(event_id, 'step'), True, timeout=settings.WAITING_ROOM_TICK):
+        return admitted, state['rate']
+
+    throughput = (completed - state['completed']) / max(now - state['at'], settings.WAITING_ROOM_TICK)
+    # Bookings under way beyond what the booking path gets through in the target latency
+    excess = started - completed - throughput * settings.WAITING_ROOM_TARGET_LATENCY
+    if excess > 0:
+        # Admit less than gets through, by enough to clear the excess within a tick. Not
+        # under half of it though, or everyone waiting is sent away for a full poll interval
+        rate = max(throughput - excess / settings.WAITING_ROOM_TICK, throughput / 2, settings.WAITING_ROOM_MIN_RATE)
+    else:
+        rate = min(state['rate'] * (1 + RECOVERY), admission_rate)
+    cache.set(_key(event_id, 'controller'), {
+        'at': now, 'admitted': admitted, 'rate': rate, 'completed': completed,
+    }, timeout=None)
+    return admitted, rate